@@ -0,0 +1,279 @@
+"""
+Контроль допуска: ограничение частоты по клиентам и сброс нагрузки
+
+Все sync-эндпоинты делят один пул потоков и один файл SQLite, поэтому
+зациклившийся агент может занять их целиком. Middleware перед роутингом:
+- token bucket на клиента отдельно для чтения (GET/HEAD/OPTIONS),
+  записи и записей аудита (решения агента, feedback — агент пишет их на
+  каждом шаге, поэтому лимит выше); пустой bucket — 429 и Retry-After.
+  Клиент — X-API-Key из RATE_LIMIT_API_KEYS, иначе IP: произвольные
+  ключи не дают ни обойти лимит, ни вытеснить bucket'ы настоящих
+  клиентов;
+- ограничение одновременных запросов к тяжёлым (работающим с БД)
+  путям: сверх ADMISSION_MAX_CONCURRENT запрос ждёт в очереди не больше
+  ADMISSION_QUEUE_TIMEOUT_SECONDS, очередь ограничена ADMISSION_MAX_QUEUE;
+  иначе — 503 и Retry-After, а не бесконечное ожидание;
+- таймаут запросов к БД в рамках HTTP-запроса (database.statement_timeout):
+  прерванный запрос — тоже 503, как и не дождавшийся очереди записи
+  (database.WriteQueueTimeout).
+
+Состояние — в памяти процесса: при WORKERS > 1 лимиты действуют на
+каждый воркер. Снимок — GET /api/metrics/admission.
+"""
+import asyncio
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import get_settings
+from .database import statement_timeout, write_queue
+
+settings = get_settings()
+
+READ = "read"
+WRITE = "write"
+AUDIT = "audit"
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+AUDIT_PATH = re.compile(r"^/api/posts/(agent/decision|\d+/feedback)$")
+API_KEY_HEADER = "x-api-key"
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше burst"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+
+    def take(self, now: float) -> float:
+        """0 — токен взят, иначе секунды до следующего токена"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Bucket'ы по (клиент, класс запроса); редкие клиенты вытесняются (LRU)"""
+
+    def __init__(self, limits: dict, max_clients: int):
+        self.limits = limits  # класс -> (rate, burst)
+        self.max_clients = max_clients
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = {kind: 0 for kind in limits}
+        self.limited = {kind: 0 for kind in limits}
+        self._limited_clients: OrderedDict = OrderedDict()  # клиент -> отказов
+
+    def check(self, client: str, kind: str) -> float:
+        """0 — пропустить, иначе Retry-After в секундах"""
+        now = time.monotonic()
+        with self._lock:
+            key = (client, kind)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate, burst = self.limits[kind]
+                bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+
+            wait = bucket.take(now)
+            if wait:
+                self.limited[kind] += 1
+                self._limited_clients[client] = self._limited_clients.pop(client, 0) + 1
+                while len(self._limited_clients) > self.max_clients:
+                    self._limited_clients.popitem(last=False)
+            else:
+                self.allowed[kind] += 1
+            return wait
+
+    def snapshot(self, top: int = 10) -> dict:
+        with self._lock:
+            worst = sorted(self._limited_clients.items(), key=lambda item: -item[1])[:top]
+            return {
+                "limits": {
+                    kind: {"rate_per_second": rate, "burst": burst}
+                    for kind, (rate, burst) in self.limits.items()
+                },
+                "clients": len({client for client, _ in self._buckets}),
+                "allowed": dict(self.allowed),
+                "limited": dict(self.limited),
+                "top_limited_clients": [{"client": c, "limited": n} for c, n in worst],
+            }
+
+
+class ConcurrencyLimiter:
+    """
+    Не больше max_concurrent запросов одновременно; остальные ждут в
+    очереди длиной max_queue не дольше queue_timeout.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> bool:
+        """False — запрос сброшен (очередь полна или ожидание истекло)"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.shed += 1
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+        }
+
+
+rate_limiter = RateLimiter(
+    {
+        READ: (settings.RATE_LIMIT_READ_PER_SECOND, settings.RATE_LIMIT_READ_BURST),
+        WRITE: (settings.RATE_LIMIT_WRITE_PER_SECOND, settings.RATE_LIMIT_WRITE_BURST),
+        AUDIT: (settings.RATE_LIMIT_AUDIT_PER_SECOND, settings.RATE_LIMIT_AUDIT_BURST),
+    },
+    settings.RATE_LIMIT_MAX_CLIENTS,
+)
+concurrency_limiter = ConcurrencyLimiter(
+    settings.ADMISSION_MAX_CONCURRENT,
+    settings.ADMISSION_MAX_QUEUE,
+    settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+statement_timeouts = 0  # прерванных запросов к БД
+
+
+def client_id(scope: Scope) -> str:
+    """Известный API-ключ (в снимке — его хэш), иначе IP клиента"""
+    api_key = Headers(scope=scope).get(API_KEY_HEADER)
+    if api_key and api_key in settings.RATE_LIMIT_API_KEYS:
+        return f"key:{hashlib.sha256(api_key.encode()).hexdigest()[:12]}"
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+def request_kind(scope: Scope) -> str:
+    if scope["method"] in READ_METHODS:
+        return READ
+    return AUDIT if AUDIT_PATH.match(scope["path"]) else WRITE
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionMiddleware:
+    """ASGI middleware: rate limit, ограничение параллельности, таймаут БД"""
+
+    def __init__(self, app: ASGIApp, heavy_paths: tuple = (), exempt_paths: tuple = ()):
+        self.app = app
+        self.heavy_paths = tuple(heavy_paths)
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if settings.RATE_LIMIT_ENABLED:
+            kind = request_kind(scope)
+            wait = rate_limiter.check(client_id(scope), kind)
+            if wait:
+                await _reject(429, f"Rate limit exceeded for {kind} requests", wait)(scope, receive, send)
+                return
+
+        # Значение копируется в контекст потоков, где выполняются sync-эндпоинты
+        token = statement_timeout.set(settings.DB_STATEMENT_TIMEOUT_SECONDS or None)
+        try:
+            if not scope["path"].startswith(self.heavy_paths):
+                await self.app(scope, receive, send)
+                return
+
+            if not await concurrency_limiter.acquire():
+                await _reject(503, "Server is overloaded, retry later", concurrency_limiter.queue_timeout)(
+                    scope, receive, send
+                )
+                return
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                concurrency_limiter.release()
+        finally:
+            statement_timeout.reset(token)
+
+
+def on_statement_timeout(request, exc) -> JSONResponse:
+    """Обработчик OperationalError: прерванный по таймауту запрос — 503"""
+    global statement_timeouts
+    if "interrupted" not in str(exc.orig):
+        raise exc
+    statement_timeouts += 1
+    return _reject(503, "Database query timed out, retry later", 1)
+
+
+def on_write_queue_timeout(request, exc) -> JSONResponse:
+    """Обработчик WriteQueueTimeout: очередь записи перегружена — 503"""
+    return _reject(503, "Database is busy, retry later", 1)
+
+
+def snapshot() -> dict:
+    """Состояние лимитов процесса (для /api/metrics/admission)"""
+    return {
+        "enabled": settings.RATE_LIMIT_ENABLED,
+        "rate_limit": rate_limiter.snapshot(),
+        "concurrency": concurrency_limiter.snapshot(),
+        "db_statement_timeout_seconds": settings.DB_STATEMENT_TIMEOUT_SECONDS,
+        "db_statement_timeouts": statement_timeouts,
+        "db_write_queue": write_queue.snapshot(),
+    }
@@ -0,0 +1,36 @@
+"""
+Ключи agent_state (key -> JSON)
+
+Небольшое персистентное состояние агента: указатель активного промпта,
+история активаций, learned rules, уровень автономии. Функции не делают
+commit — изменения коммитятся вместе с остальной транзакцией; каждая
+запись попадает в журнал изменений.
+"""
+import json
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from . import changes
+from .models import AgentState
+
+ACTIVE_PROMPT = "active_prompt_version"
+PROMPT_HISTORY = "prompt_history"
+LEARNED_RULES = "learned_rules"
+AUTONOMY_LEVEL = "autonomy_level"
+
+DEFAULT_AUTONOMY = 2  # DRAFT
+
+
+def get_value(db: Session, key: str, default: Any = None) -> Any:
+    row = db.get(AgentState, key)
+    if row is None or row.value is None:
+        return default
+    return json.loads(row.value)
+
+
+def set_value(db: Session, key: str, value: Any) -> None:
+    # flush сразу: сессия без autoflush, а UPDATE мимо ORM делают expire_all
+    db.merge(AgentState(key=key, value=json.dumps(value, ensure_ascii=False)))
+    db.flush()
+    changes.record(db, changes.AGENT_STATE, key, changes.UPDATED)
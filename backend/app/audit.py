@@ -0,0 +1,276 @@
+"""
+Журнал решений агента: постраничный просмотр и агрегаты
+
+Страницы — keyset по (created_at, id) от новых к старым: next_cursor
+указывает на последнюю строку страницы, следующая начинается строго
+после неё. В отличие от offset, стоимость страницы не растёт с
+глубиной, а новые решения не сдвигают уже выданные страницы.
+
+Горячая часть и архив (retention) читаются отдельными запросами с одним
+условием и LIMIT: каждый идёт по своему индексу (created_at или
+(decision_type | outcome, created_at)), результаты сливаются в Python.
+UNION ALL с ORDER BY заставил бы SQLite отсортировать всё окно. Архив
+читается, если начало окна не задано или заходит за границу горячей
+части. Незаписанные строки буфера аудита попадают на страницы и в
+агрегаты наравне с записанными.
+
+Агрегаты — число решений, успехи, неудачи, доля неудач среди решений с
+исходом и средняя уверенность по часам или дням и типам — считаются
+GROUP BY в SQL по каждой части. Для bucket=day без фильтров по уровню
+автономии, уверенности и action_taken перенесённые строки берутся из
+дневных свёрток decision_daily_rollups: они переживают очистку архива
+(ARCHIVE_RETENTION_DAYS), но средней уверенности в них нет.
+"""
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.orm import Session
+
+from .audit_buffer import audit_buffer
+from .database import archive_enabled
+from .models import AgentDecision, DecisionDailyRollup
+from .retention import archive_tables, hot_cutoff
+
+NO_OUTCOME = "none"  # значение фильтра outcome для решений без исхода
+BUCKETS = {"hour": "%Y-%m-%dT%H:00", "day": "%Y-%m-%d"}
+
+
+# ───────────────────────────────────────────────
+# Курсор keyset-пагинации
+# ───────────────────────────────────────────────
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return f"{created_at.isoformat()}_{row_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """ValueError — курсор не из next_cursor"""
+    created_at, _, row_id = cursor.rpartition("_")
+    moment = datetime.fromisoformat(created_at)
+    if moment.tzinfo is not None:
+        raise ValueError("cursor time must be naive UTC")
+    return moment, int(row_id)
+
+
+def before(columns, after: Optional[Tuple[datetime, int]]) -> list:
+    """Условие «строго после курсора» (decode_cursor) при сортировке (created_at, id) DESC"""
+    if after is None:
+        return []
+    return [tuple_(*columns) < tuple_(*after)]
+
+
+def page(rows: list, limit: int) -> Tuple[list, Optional[str]]:
+    """Строки, выбранные с LIMIT limit + 1 -> (страница, next_cursor)"""
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(last.created_at, last.id)
+
+
+# ───────────────────────────────────────────────
+# Фильтры
+# ───────────────────────────────────────────────
+
+class DecisionFilter(NamedTuple):
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    decision_type: Optional[str] = None
+    outcome: Optional[str] = None  # success, failure, pending, ... или NO_OUTCOME
+    autonomy_level: Optional[int] = None
+    min_confidence: Optional[float] = None
+    max_confidence: Optional[float] = None
+    action_taken: Optional[bool] = None
+
+    def conditions(self, table) -> list:
+        """Условия WHERE для таблицы журнала (горячей или архивной)"""
+        c = table.c
+        result = []
+        if self.since is not None:
+            result.append(c.created_at >= self.since)
+        if self.until is not None:
+            result.append(c.created_at < self.until)
+        if self.decision_type:
+            result.append(c.decision_type == self.decision_type)
+        if self.outcome == NO_OUTCOME:
+            result.append(c.outcome.is_(None))
+        elif self.outcome:
+            result.append(c.outcome == self.outcome)
+        if self.autonomy_level is not None:
+            result.append(c.autonomy_level == self.autonomy_level)
+        if self.min_confidence is not None:
+            result.append(c.confidence >= self.min_confidence)
+        if self.max_confidence is not None:
+            result.append(c.confidence <= self.max_confidence)
+        if self.action_taken is not None:
+            result.append(c.action_taken == int(self.action_taken))
+        return result
+
+    def matches(self, d: AgentDecision) -> bool:
+        """То же условие для строки буфера аудита"""
+        if self.since is not None and d.created_at < self.since:
+            return False
+        if self.until is not None and d.created_at >= self.until:
+            return False
+        if self.decision_type and d.decision_type != self.decision_type:
+            return False
+        if self.outcome and d.outcome != (None if self.outcome == NO_OUTCOME else self.outcome):
+            return False
+        if self.autonomy_level is not None and d.autonomy_level != self.autonomy_level:
+            return False
+        if self.min_confidence is not None and (d.confidence is None or d.confidence < self.min_confidence):
+            return False
+        if self.max_confidence is not None and (d.confidence is None or d.confidence > self.max_confidence):
+            return False
+        if self.action_taken is not None and bool(d.action_taken) != self.action_taken:
+            return False
+        return True
+
+    def rollup_compatible(self) -> bool:
+        """В дневных свёртках есть только тип и исход"""
+        return (
+            self.autonomy_level is None and self.action_taken is None
+            and self.min_confidence is None and self.max_confidence is None
+        )
+
+
+def _partitions(since: Optional[datetime]) -> list:
+    tables = [AgentDecision.__table__]
+    if archive_enabled and (since is None or since < hot_cutoff()):
+        tables.append(archive_tables[AgentDecision])
+    return tables
+
+
+# ───────────────────────────────────────────────
+# Страницы
+# ───────────────────────────────────────────────
+
+def decision_page(
+    db: Session, filters: DecisionFilter, after: Optional[Tuple[datetime, int]], limit: int
+) -> dict:
+    """Страница решений от новых к старым (после курсора after) и курсор следующей"""
+    rows = {}
+    for table in _partitions(filters.since):
+        stmt = (
+            select(table)
+            .where(*filters.conditions(table), *before((table.c.created_at, table.c.id), after))
+            .order_by(table.c.created_at.desc(), table.c.id.desc())
+            .limit(limit + 1)
+        )
+        for row in db.execute(stmt):
+            rows.setdefault(row.id, row)
+
+    for d in audit_buffer.pending(
+        AgentDecision, lambda d: filters.matches(d) and (after is None or (d.created_at, d.id) < after)
+    ):
+        rows.setdefault(d.id, d)
+
+    ordered = sorted(rows.values(), key=lambda row: (row.created_at, row.id), reverse=True)
+    items, next_cursor = page(ordered[:limit + 1], limit)
+    return {"decisions": [decision_dict(row) for row in items], "next_cursor": next_cursor}
+
+
+def decision_dict(d) -> dict:
+    """Решение (ORM-объект или строка таблицы) для ответа API"""
+    return {
+        "id": d.id,
+        "type": d.decision_type,
+        "autonomy_level": d.autonomy_level,
+        "confidence": d.confidence,
+        "action_taken": bool(d.action_taken),
+        "outcome": d.outcome,
+        "outcome_details": d.outcome_details,
+        "reason": d.reason,
+        "created_at": d.created_at.isoformat()
+    }
+
+
+# ───────────────────────────────────────────────
+# Агрегаты
+# ───────────────────────────────────────────────
+
+def decision_stats(db: Session, filters: DecisionFilter, bucket: str = "hour") -> dict:
+    """Решения по корзинам времени и типам: число, исходы, доля неудач, уверенность"""
+    fmt = BUCKETS[bucket]
+    use_rollups = bucket == "day" and filters.rollup_compatible()
+    tables = [AgentDecision.__table__] if use_rollups else _partitions(filters.since)
+
+    # (корзина, тип) -> [решений, успехов, неудач, сумма уверенности, с уверенностью]
+    groups = {}
+
+    def add(key, values) -> None:
+        totals = groups.setdefault(key, [0, 0, 0, 0.0, 0])
+        for i, value in enumerate(values):
+            totals[i] += value or 0
+
+    # Незаписанные строки буфера считаются в Python; уже записанные из них
+    # (сброс идёт прямо сейчас) исключаются из SQL, чтобы не посчитать дважды
+    pending = audit_buffer.pending(AgentDecision, filters.matches)
+    pending_ids = [d.id for d in pending]
+
+    for table in tables:
+        c = table.c
+        slot = func.strftime(fmt, c.created_at)
+        stmt = select(
+            slot, c.decision_type, func.count(),
+            func.sum(case((c.outcome == "success", 1), else_=0)),
+            func.sum(case((c.outcome == "failure", 1), else_=0)),
+            func.sum(c.confidence), func.count(c.confidence),
+        ).where(*filters.conditions(table)).group_by(slot, c.decision_type)
+        if pending_ids and table is AgentDecision.__table__:
+            stmt = stmt.where(c.id.notin_(pending_ids))
+        for slot_value, decision_type, *values in db.execute(stmt):
+            add((slot_value, decision_type), values)
+
+    for d in pending:
+        add((d.created_at.strftime(fmt), d.decision_type), [
+            1, d.outcome == "success", d.outcome == "failure", d.confidence, d.confidence is not None,
+        ])
+
+    if use_rollups:
+        r = DecisionDailyRollup
+        stmt = select(
+            r.day, r.decision_type, func.sum(r.count),
+            func.sum(case((r.outcome == "success", r.count), else_=0)),
+            func.sum(case((r.outcome == "failure", r.count), else_=0)),
+        ).group_by(r.day, r.decision_type)
+        if filters.since is not None:
+            stmt = stmt.where(r.day >= filters.since.date().isoformat())
+        if filters.until is not None:
+            # until не включается: свёртка дня входит, если окно захватывает хотя бы его начало
+            last = filters.until - timedelta(microseconds=1)
+            stmt = stmt.where(r.day < (last.date() + timedelta(days=1)).isoformat())
+        if filters.decision_type:
+            stmt = stmt.where(r.decision_type == filters.decision_type)
+        if filters.outcome:
+            stmt = stmt.where(r.outcome == ("" if filters.outcome == NO_OUTCOME else filters.outcome))
+        for day, decision_type, *values in db.execute(stmt):
+            add((day, decision_type), values)
+
+    totals = {}
+    for (_, decision_type), values in groups.items():
+        type_totals = totals.setdefault(decision_type, [0, 0, 0, 0.0, 0])
+        for i, value in enumerate(values):
+            type_totals[i] += value
+
+    return {
+        "bucket": bucket,
+        "source": "rollups" if use_rollups else ("archive" if len(tables) > 1 else "hot"),
+        "buckets": [
+            dict(bucket=slot_value, type=decision_type, **_stats(values))
+            for (slot_value, decision_type), values in sorted(groups.items())
+        ],
+        "totals": [dict(type=decision_type, **_stats(values)) for decision_type, values in sorted(totals.items())],
+    }
+
+
+def _stats(values: List) -> dict:
+    count, successes, failures, confidence_sum, confidence_n = values
+    resolved = successes + failures
+    return {
+        "count": count,
+        "successes": successes,
+        "failures": failures,
+        "failure_rate": round(failures / resolved, 4) if resolved else None,
+        "avg_confidence": round(confidence_sum / confidence_n, 4) if confidence_n else None,
+    }
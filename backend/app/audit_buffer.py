@@ -0,0 +1,308 @@
+"""
+Write-behind буфер для журнала решений агента
+
+AgentDecision и LearningEvent пишутся на каждом шаге агента, и коммит
+на каждую запись стоит fsync. Буфер копит записи в памяти и вставляет
+их пачкой — по достижении AUDIT_BUFFER_MAX_ROWS или раз в
+AUDIT_BUFFER_FLUSH_SECONDS. При остановке приложения буфер сбрасывается.
+
+ID присваиваются в момент добавления, поэтому ответ API сразу содержит
+id, а чтения (последние решения, circuit breaker) видят ещё не
+записанные строки через pending().
+
+При WORKERS > 1 (shared) буфер выключен: процессы не видят буферы друг
+друга, поэтому каждая запись сразу коммитится, а id выделяется из БД
+под файловой блокировкой.
+
+Журнал изменений пополняется в транзакции сброса: решение появляется в
+/api/changes, когда оно записано в БД.
+
+Если строку с тем же idempotency_key уже записал другой воркер, вставка
+пропускается, а add() возвращает записанную строку вместо переданной.
+Строки, на которые клиент уже получил id, не выбрасываются: неудачный
+сброс возвращает их в очередь, и сброс повторяется. Пока сбросы не
+проходят, буфер растёт; начиная с AUDIT_BUFFER_MAX_PENDING строк add()
+пишет синхронно. Неудачная синхронная запись (в том числе durable)
+убирает строку вызывающего из буфера и возвращает 503
+(AuditWriteError) — клиент знает, что решение не записано, и
+повторяет запрос. Состояние буфера — в /api/metrics/health.
+"""
+import json
+import logging
+import threading
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.dialects.sqlite import insert
+
+from . import changes
+from .config import get_settings
+from .database import SessionLocal
+from .models import AgentDecision, LearningEvent
+from .retention import max_id
+from .workers import file_lock, multi_worker
+
+logger = logging.getLogger(__name__)
+
+BUFFERED_MODELS = (AgentDecision, LearningEvent)
+CHANGE_ENTITIES = {AgentDecision: changes.DECISION, LearningEvent: changes.LEARNING_EVENT}
+AUDIT_LOCK = "audit"
+_STORED = "_audit_stored"  # атрибут объекта: строка, записанная другим воркером с тем же ключом
+
+
+class AuditWriteError(HTTPException):
+    """Синхронная запись журнала не удалась (503): строка не сохранена"""
+
+
+class AuditBuffer:
+    """Буфер вставок с периодическим сбросом в фоновом потоке"""
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        max_rows: int = 200,
+        flush_seconds: float = 2.0,
+        enabled: bool = True,
+        shared: bool = False,
+        max_pending: int = 5000,
+    ):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.shared = shared
+        self.enabled = enabled and not shared
+
+        self._lock = threading.Lock()        # pending / inflight / счётчики id
+        self._flush_lock = threading.Lock()  # один flush за раз
+        self._pending: list = []
+        self._inflight: list = []
+        self._next_ids: dict = {}
+        self.failed_flushes = 0  # подряд; 0 — последний сброс прошёл
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ───────────────────────────────────────────────
+    # Запись
+    # ───────────────────────────────────────────────
+
+    def add(self, obj, durable: bool = False):
+        """
+        Добавить запись в буфер.
+        durable=True — дождаться коммита в БД (синхронная запись).
+        Возвращает записанную строку: obj или, если тот же
+        idempotency_key уже записан другим воркером, его строку.
+        AuditWriteError — синхронная запись не удалась, строка не сохранена.
+        """
+        model = type(obj)
+        if model not in BUFFERED_MODELS:
+            raise TypeError(f"{model.__name__} is not buffered")
+
+        _apply_defaults(obj)
+        # shared: выделение id и коммит — атомарно между процессами
+        with file_lock(AUDIT_LOCK) if self.shared else nullcontext():
+            with self._lock:
+                obj.id = self._allocate_id(model)
+                self._pending.append(obj)
+                size = len(self._pending)
+
+            # Переполненный буфер (сбросы не проходят) — синхронная запись
+            if durable or not self.enabled or self._thread is None or size >= self.max_pending:
+                try:
+                    self.flush()
+                except Exception as exc:
+                    # Вызывающий получит ошибку: строка не должна записаться позже
+                    with self._lock:
+                        self._pending = [item for item in self._pending if item is not obj]
+                    raise AuditWriteError(
+                        status_code=503, detail="Audit log write failed, retry later", headers={"Retry-After": "1"}
+                    ) from exc
+                return getattr(obj, _STORED, None) or obj
+            if size >= self.max_rows:
+                self._wake.set()
+        return obj
+
+    def _allocate_id(self, model) -> int:
+        """Следующий id для модели (под self._lock)"""
+        next_id = None if self.shared else self._next_ids.get(model)
+        if next_id is None:
+            db = self.session_factory()
+            try:
+                next_id = max_id(db, model) + 1
+            finally:
+                db.close()
+        self._next_ids[model] = next_id + 1
+        return next_id
+
+    def flush(self) -> int:
+        """Записать все накопленные строки одной транзакцией"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, []
+                self._inflight = batch
+
+            db = self.session_factory()
+            try:
+                skipped = set()
+                for model in BUFFERED_MODELS:
+                    objs = [obj for obj in batch if type(obj) is model]
+                    if not objs:
+                        continue
+                    stmt = insert(model)
+                    if "idempotency_key" in model.__table__.c:
+                        # Повтор с тем же ключом из другого воркера: строка уже есть
+                        stmt = stmt.on_conflict_do_nothing(index_elements=["idempotency_key"])
+                    db.execute(stmt, [_to_row(obj) for obj in objs])
+                    if "idempotency_key" in model.__table__.c:
+                        skipped.update(_attach_stored(db, model, objs))
+                changes.record_many(db, [
+                    changes.entry(CHANGE_ENTITIES[type(obj)], obj.id, changes.CREATED)
+                    for obj in batch if id(obj) not in skipped
+                ])
+                db.commit()
+            except Exception:
+                db.rollback()
+                self._requeue(batch)
+                raise
+            finally:
+                db.close()
+
+            with self._lock:
+                self._inflight = []
+                self.failed_flushes = 0
+            return len(batch)
+
+    def _requeue(self, batch: list) -> None:
+        """Вернуть строки неудачного сброса в начало очереди"""
+        with self._lock:
+            self._pending = batch + self._pending
+            self._inflight = []
+            self.failed_flushes += 1
+            pending = len(self._pending)
+        logger.exception(
+            "Audit buffer flush failed (%d in a row), %d rows pending", self.failed_flushes, pending
+        )
+
+    # ───────────────────────────────────────────────
+    # Чтение
+    # ───────────────────────────────────────────────
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending) + len(self._inflight),
+                "max_pending": self.max_pending,
+                "failed_flushes": self.failed_flushes,
+            }
+
+    def pending(self, model, predicate: Optional[Callable] = None) -> list:
+        """Незаписанные строки модели, от новых к старым"""
+        with self._lock:
+            items = [
+                obj for obj in self._inflight + self._pending
+                if type(obj) is model and (predicate is None or predicate(obj))
+            ]
+        items.sort(key=lambda obj: (obj.created_at, obj.id), reverse=True)
+        return items
+
+    # ───────────────────────────────────────────────
+    # Фоновый поток
+    # ───────────────────────────────────────────────
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Остановить поток и сбросить остаток буфера"""
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            # Процесс завершается, и повторить сброс будет некому: строки — в лог
+            with self._lock:
+                rows = [dict(_to_row(obj), table=obj.__tablename__) for obj in self._pending]
+            logger.error(
+                "Audit buffer not flushed on shutdown, %d rows lost: %s", len(rows), json.dumps(rows, default=str)
+            )
+        # После остановки id снова читаются из БД
+        with self._lock:
+            self._next_ids.clear()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Уже залогировано, строки вернулись в очередь
+                pass
+
+
+def _apply_defaults(obj) -> None:
+    """Заполнить скалярные default-значения колонок и created_at"""
+    for column in obj.__table__.columns:
+        if getattr(obj, column.key) is not None or column.default is None:
+            continue
+        if column.key == "created_at":
+            setattr(obj, column.key, datetime.utcnow())
+        elif column.default.is_scalar:
+            setattr(obj, column.key, column.default.arg)
+
+
+def _to_row(obj) -> dict:
+    return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+
+def _attach_stored(db, model, objs: list) -> set:
+    """
+    Строки, не вставленные из-за idempotency_key: к объекту
+    прикрепляется записанная строка (_STORED). Возвращает id() объектов.
+    """
+    keyed = {obj.idempotency_key: obj for obj in objs if obj.idempotency_key is not None}
+    if not keyed:
+        return set()
+    stored = db.query(model).filter(
+        model.idempotency_key.in_(list(keyed)), model.id.notin_([obj.id for obj in keyed.values()])
+    ).all()
+    skipped = set()
+    for row in stored:
+        db.expunge(row)
+        obj = keyed[row.idempotency_key]
+        setattr(obj, _STORED, row)
+        skipped.add(id(obj))
+    return skipped
+
+
+def merge_recent(rows: list, pending: list, limit: int) -> list:
+    """Объединить строки из БД с буфером: от новых к старым, без дублей"""
+    merged = {obj.id: obj for obj in rows}
+    for obj in pending:
+        merged.setdefault(obj.id, obj)
+    items = sorted(merged.values(), key=lambda obj: (obj.created_at, obj.id), reverse=True)
+    return items[:limit]
+
+
+settings = get_settings()
+
+audit_buffer = AuditBuffer(
+    max_rows=settings.AUDIT_BUFFER_MAX_ROWS,
+    flush_seconds=settings.AUDIT_BUFFER_FLUSH_SECONDS,
+    enabled=settings.AUDIT_BUFFER_ENABLED,
+    shared=multi_worker(),
+    max_pending=settings.AUDIT_BUFFER_MAX_PENDING,
+)
@@ -0,0 +1,388 @@
+"""
+Резервные копии SQLite без остановки записи
+
+Копирование — online backup API SQLite (sqlite3.Connection.backup)
+шагами по BACKUP_PAGES_PER_STEP страниц с паузой между шагами: блокировка
+чтения держится только на время шага. Основная БД работает в режиме WAL
+(DATABASE_JOURNAL_MODE), и на время копирования на источнике открыта
+транзакция чтения:
+- копия согласована на момент начала — снимок точки во времени;
+- запись других соединений идёт в WAL и не ждёт копирования;
+- копирование не перезапускается: без транзакции каждая запись другого
+  соединения начинает его заново, и под постоянной нагрузкой оно не
+  заканчивается.
+Архив (ARCHIVE_DATABASE_PATH) пишется только retention, поэтому он
+копируется под той же блокировкой retention.
+
+Снимок — каталог BACKUP_DIR/<UTC-время>/ с файлами main.db и archive.db
+(опционально .gz / .zst). Каталог собирается как <имя>.partial и
+переименовывается в конце: незаконченный снимок не виден в списке.
+Хранятся последние BACKUP_KEEP снимков.
+
+CLI (из каталога backend):
+    python -m app.backup snapshot [--compress gzip|zstd]
+    python -m app.backup list
+    python -m app.backup restore <снимок>
+Восстановление — при остановленном сервисе: процессы держат в памяти
+кэши и счётчики, вычисленные по старым данным.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.engine import make_url
+
+from .config import get_settings
+from .database import archive_enabled
+from .workers import file_lock
+
+try:
+    import zstandard
+except ImportError:  # без zstandard — только gzip
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+SNAPSHOT_FORMAT = "%Y%m%dT%H%M%SZ"
+PARTIAL_SUFFIX = ".partial"
+COMPRESSED_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+COPY_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def database_files() -> dict:
+    """Имя файла в снимке -> путь к БД"""
+    files = {"main": make_url(settings.DATABASE_URL).database}
+    if archive_enabled:
+        files["archive"] = settings.ARCHIVE_DATABASE_PATH
+    return files
+
+
+class _Progress:
+    """Колбэк backup(): шаги и перезапуски (remaining вырос — копирование заново)"""
+
+    def __init__(self):
+        self.steps = 0
+        self.restarts = 0
+        self.pages = 0
+        self._remaining: Optional[int] = None
+
+    def __call__(self, status: int, remaining: int, total: int) -> None:
+        self.steps += 1
+        self.pages = total
+        if self._remaining is not None and remaining > self._remaining:
+            self.restarts += 1
+        self._remaining = remaining
+
+
+def copy_database(source_path: str, target_path: str,
+                  pages_per_step: Optional[int] = None, step_sleep: Optional[float] = None) -> dict:
+    """Скопировать БД в target_path шагами; возвращает статистику копирования"""
+    pages_per_step = pages_per_step or settings.BACKUP_PAGES_PER_STEP
+    step_sleep = settings.BACKUP_STEP_SLEEP_SECONDS if step_sleep is None else step_sleep
+
+    source = sqlite3.connect(source_path, isolation_level=None, check_same_thread=False)
+    target = sqlite3.connect(target_path, isolation_level=None)
+    try:
+        wal = source.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        if wal:
+            # Транзакция чтения фиксирует снимок на всё время копирования
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+
+        progress = _Progress()
+        started = time.perf_counter()
+        source.backup(target, pages=pages_per_step, progress=progress, sleep=step_sleep)
+        seconds = time.perf_counter() - started
+        if wal:
+            source.execute("COMMIT")
+            # Пока снимок держался, WAL рос без checkpoint; переносим его
+            # здесь, иначе это сделает первая же запись за счёт своего времени
+            source.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+
+        # Снимок — один самодостаточный файл, без -wal рядом
+        target.execute("PRAGMA journal_mode=DELETE")
+        page_size = target.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+
+    size = os.path.getsize(target_path)
+    return {
+        "seconds": round(seconds, 3),
+        "pages": progress.pages,
+        "page_size": page_size,
+        "steps": progress.steps,
+        "restarts": progress.restarts,
+        "bytes": size,
+        "mb_per_second": round(size / 1024 / 1024 / seconds, 1) if seconds else None,
+        "point_in_time": wal,
+    }
+
+
+def _compress(path: str, method: str) -> str:
+    """Сжать файл потоково (без чтения в память), исходный удаляется"""
+    compressed = path + COMPRESSED_SUFFIXES[method]
+    with open(path, "rb") as src, open(compressed, "wb") as raw:
+        if method == "zstd":
+            with zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL, threads=-1).stream_writer(raw) as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_BYTES)
+        else:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=settings.COMPRESSION_GZIP_LEVEL) as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_BYTES)
+    os.remove(path)
+    return compressed
+
+
+def _decompress(path: str, target_path: str) -> None:
+    with open(path, "rb") as src, open(target_path, "wb") as dst:
+        if path.endswith(COMPRESSED_SUFFIXES["zstd"]):
+            if zstandard is None:
+                raise RuntimeError("zstandard is not installed")
+            with zstandard.ZstdDecompressor().stream_reader(src) as reader:
+                shutil.copyfileobj(reader, dst, COPY_CHUNK_BYTES)
+        elif path.endswith(COMPRESSED_SUFFIXES["gzip"]):
+            with gzip.GzipFile(fileobj=src, mode="rb") as reader:
+                shutil.copyfileobj(reader, dst, COPY_CHUNK_BYTES)
+        else:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_BYTES)
+
+
+def _compression_method(compression: Optional[str]) -> Optional[str]:
+    method = (settings.BACKUP_COMPRESSION if compression is None else compression) or None
+    if method is not None and method not in COMPRESSED_SUFFIXES:
+        raise ValueError(f"Unknown backup compression: {method}")
+    if method == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed, backup is compressed with gzip")
+        method = "gzip"
+    return method
+
+
+def take_snapshot(compression: Optional[str] = None, keep: Optional[int] = None) -> dict:
+    """Снимок всех БД в новый каталог BACKUP_DIR, затем ротация"""
+    method = _compression_method(compression)
+    keep = settings.BACKUP_KEEP if keep is None else keep
+
+    # Один снимок за раз на все процессы
+    with file_lock("backup"):
+        name = datetime.utcnow().strftime(SNAPSHOT_FORMAT)
+        final_dir = os.path.join(settings.BACKUP_DIR, name)
+        if os.path.exists(final_dir):
+            raise RuntimeError(f"Snapshot {name} already exists")
+        partial_dir = final_dir + PARTIAL_SUFFIX
+        os.makedirs(partial_dir, exist_ok=True)
+
+        started = time.perf_counter()
+        databases = {}
+        try:
+            for label, source_path in database_files().items():
+                target_path = os.path.join(partial_dir, f"{label}.db")
+                if label == "archive":
+                    with file_lock("retention"):
+                        stats = copy_database(source_path, target_path)
+                else:
+                    stats = copy_database(source_path, target_path)
+
+                if method is not None:
+                    compress_started = time.perf_counter()
+                    target_path = _compress(target_path, method)
+                    stats["compress_seconds"] = round(time.perf_counter() - compress_started, 3)
+                    stats["compressed_bytes"] = os.path.getsize(target_path)
+                stats["file"] = os.path.basename(target_path)
+                databases[label] = stats
+
+            with open(os.path.join(partial_dir, "manifest.json"), "w") as handle:
+                json.dump({"name": name, "compression": method, "databases": databases}, handle, indent=2)
+            os.rename(partial_dir, final_dir)
+        except BaseException:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+            raise
+
+        removed = rotate(keep)
+
+    result = {
+        "name": name,
+        "path": final_dir,
+        "compression": method,
+        "seconds": round(time.perf_counter() - started, 3),
+        "databases": databases,
+        "rotated": removed,
+    }
+    logger.info("Backup %s done in %.1f s", name, result["seconds"])
+    return result
+
+
+def list_snapshots() -> list:
+    """Готовые снимки, новые первыми"""
+    if not os.path.isdir(settings.BACKUP_DIR):
+        return []
+    result = []
+    for name in sorted(os.listdir(settings.BACKUP_DIR), reverse=True):
+        manifest_path = os.path.join(settings.BACKUP_DIR, name, "manifest.json")
+        if name.endswith(PARTIAL_SUFFIX) or not os.path.isfile(manifest_path):
+            continue
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+        manifest["bytes"] = sum(
+            os.path.getsize(os.path.join(settings.BACKUP_DIR, name, db["file"]))
+            for db in manifest["databases"].values()
+        )
+        result.append(manifest)
+    return result
+
+
+def rotate(keep: int) -> list:
+    """Удалить снимки сверх keep и брошенные .partial (вызывается под блокировкой backup)"""
+    if not os.path.isdir(settings.BACKUP_DIR):
+        return []
+    removed = [
+        name for name in os.listdir(settings.BACKUP_DIR) if name.endswith(PARTIAL_SUFFIX)
+    ]
+    if keep > 0:
+        removed += [snapshot["name"] for snapshot in list_snapshots()[keep:]]
+    for name in removed:
+        shutil.rmtree(os.path.join(settings.BACKUP_DIR, name), ignore_errors=True)
+    return removed
+
+
+def _load_manifest(snapshot: str) -> tuple:
+    """Каталог снимка (имя в BACKUP_DIR или путь) и его manifest"""
+    snapshot_dir = snapshot if os.path.isdir(snapshot) else os.path.join(settings.BACKUP_DIR, snapshot)
+    manifest_path = os.path.join(snapshot_dir, "manifest.json")
+    if not os.path.isfile(manifest_path):
+        raise FileNotFoundError(f"Snapshot {snapshot} not found")
+    with open(manifest_path) as handle:
+        return snapshot_dir, json.load(handle)
+
+
+def extract(snapshot: str, target_dir: str) -> dict:
+    """Распаковать БД снимка в target_dir (копия для проверок и soak): метка -> путь"""
+    snapshot_dir, manifest = _load_manifest(snapshot)
+    os.makedirs(target_dir, exist_ok=True)
+    result = {}
+    for label, info in manifest["databases"].items():
+        result[label] = os.path.join(target_dir, f"{label}.db")
+        _decompress(os.path.join(snapshot_dir, info["file"]), result[label])
+    return result
+
+
+def restore(name: str) -> dict:
+    """
+    Восстановить БД из снимка. Файл снимка распаковывается рядом с целевой
+    БД, проверяется (quick_check) и копируется в неё тем же backup API —
+    целевой файл заменяется целиком, с учётом WAL. Затем миграции: снимок
+    может быть старше схемы.
+    """
+    snapshot_dir, manifest = _load_manifest(name)
+    targets = database_files()
+    result = {}
+    with file_lock("backup"), file_lock("retention"):
+        for label, info in manifest["databases"].items():
+            if label not in targets:
+                logger.warning("Skipping %s: database is not configured", label)
+                continue
+            target_path = targets[label]
+            started = time.perf_counter()
+            fd, unpacked = tempfile.mkstemp(
+                prefix=".restore-", suffix=".db", dir=os.path.dirname(os.path.abspath(target_path))
+            )
+            os.close(fd)
+            try:
+                _decompress(os.path.join(snapshot_dir, info["file"]), unpacked)
+                source = sqlite3.connect(unpacked)
+                try:
+                    check = source.execute("PRAGMA quick_check").fetchone()[0]
+                    if check != "ok":
+                        raise RuntimeError(f"Snapshot {name}/{info['file']} is corrupted: {check}")
+                    target = sqlite3.connect(target_path)
+                    try:
+                        source.backup(target)
+                    finally:
+                        target.close()
+                finally:
+                    source.close()
+            finally:
+                os.remove(unpacked)
+            result[label] = {"seconds": round(time.perf_counter() - started, 3), "path": target_path}
+
+    from .migrations import migrate
+
+    migrate()
+    return {"name": name, "databases": result}
+
+
+class BackupWorker:
+    """Снимки по таймеру (BACKUP_INTERVAL_SECONDS) в фоновом потоке"""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval_seconds <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="backup", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            if self._recent_snapshot_exists():
+                continue
+            try:
+                take_snapshot()
+            except Exception:
+                logger.exception("Backup failed")
+
+    def _recent_snapshot_exists(self) -> bool:
+        """Таймер есть в каждом воркере: снимок уже сделан другим процессом"""
+        snapshots = list_snapshots()
+        if not snapshots:
+            return False
+        taken_at = datetime.strptime(snapshots[0]["name"], SNAPSHOT_FORMAT)
+        return (datetime.utcnow() - taken_at).total_seconds() < self.interval_seconds / 2
+
+
+backup_worker = BackupWorker(settings.BACKUP_INTERVAL_SECONDS)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Резервные копии SQLite")
+    commands = parser.add_subparsers(dest="command", required=True)
+    snapshot = commands.add_parser("snapshot", help="сделать снимок")
+    snapshot.add_argument("--compress", choices=sorted(COMPRESSED_SUFFIXES), default=None)
+    snapshot.add_argument("--keep", type=int, default=None)
+    commands.add_parser("list", help="список снимков")
+    restore_parser = commands.add_parser("restore", help="восстановить снимок (сервис остановлен)")
+    restore_parser.add_argument("name")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "snapshot":
+        result = take_snapshot(args.compress, args.keep)
+    elif args.command == "list":
+        result = list_snapshots()
+    else:
+        result = restore(args.name)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
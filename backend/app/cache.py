@@ -0,0 +1,253 @@
+"""
+Кэш вычисленных ответов
+
+Два бэкенда с одним интерфейсом:
+- MemoryCache — словарь в процессе, для WORKERS=1;
+- SqliteCache — общий файл CACHE_PATH, для нескольких процессов на
+  одной машине.
+
+Ключи живут в пространствах имён (namespace). invalidate(namespace)
+увеличивает поколение пространства: в SqliteCache поколение хранится
+в общем файле, поэтому сброс в одном процессе виден всем остальным.
+Значения — JSON.
+
+cached() читает поколение до loader() и сохраняет значение под ним:
+если пространство сбросили, пока loader() читал БД, устаревшее
+значение под новым поколением не окажется.
+
+Сброс привязан к коммиту: invalidate_on_commit() помечает сессию, и
+пространство сбрасывается после успешного commit, чтобы другой процесс
+не закэшировал данные до коммита.
+
+Кэш сжатых ответов (compression.py) сюда не относится: его ключ —
+хэш тела ответа, поэтому он не может устареть.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .workers import multi_worker
+
+settings = get_settings()
+
+_MISSING = object()
+
+
+class MemoryCache:
+    """Кэш в памяти процесса с TTL и ограничением числа записей (LRU)"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()  # (namespace, key) -> (expires_at, value)
+        self._generations: dict = {}  # namespace -> число сбросов
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[(namespace, key)]
+                return default
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def generation(self, namespace: str) -> int:
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def set(
+        self, namespace: str, key: str, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None
+    ) -> None:
+        """generation — поколение, при котором значение вычислено (устаревшее не сохраняется)"""
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl_seconds)
+        with self._lock:
+            if generation is not None and generation != self._generations.get(namespace, 0):
+                return
+            self._entries[(namespace, key)] = (expires_at, value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace: str) -> None:
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            for cache_key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[cache_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SqliteCache:
+    """
+    Общий для процессов кэш в отдельном SQLite-файле.
+    Поколение пространства — часть ключа, поэтому invalidate — один UPDATE,
+    а устаревшие записи вытесняются по TTL и лимиту.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1024, ttl_seconds: float = 60.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS cache_generations (
+                    namespace TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    generation INTEGER NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, generation, key)
+                );
+                CREATE INDEX IF NOT EXISTS ix_cache_entries_expires_at
+                    ON cache_entries (expires_at);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Соединение на поток; WAL — чтения не блокируют запись"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        row = self._connect().execute(
+            """
+            SELECT e.value FROM cache_entries e
+            WHERE e.namespace = ? AND e.key = ? AND e.expires_at >= ?
+              AND e.generation = COALESCE(
+                  (SELECT generation FROM cache_generations WHERE namespace = ?), 0)
+            """,
+            (namespace, key, time.time(), namespace)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def generation(self, namespace: str) -> int:
+        row = self._connect().execute(
+            "SELECT generation FROM cache_generations WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def set(
+        self, namespace: str, key: str, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None
+    ) -> None:
+        """generation — поколение, при котором значение вычислено (устаревшее не сохраняется)"""
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.ttl_seconds)
+        conn = self._connect()
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO cache_entries (namespace, generation, key, value, expires_at)
+            SELECT ?, current.generation, ?, ?, ? FROM (
+                SELECT COALESCE(
+                    (SELECT generation FROM cache_generations WHERE namespace = ?), 0) AS generation
+            ) current
+            WHERE ? IS NULL OR current.generation = ?
+            """,
+            (namespace, key, json.dumps(value, default=str), expires_at, namespace, generation, generation)
+        )
+        conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (now,))
+        conn.execute(
+            """
+            DELETE FROM cache_entries WHERE rowid IN (
+                SELECT rowid FROM cache_entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,)
+        )
+
+    def invalidate(self, namespace: str) -> None:
+        conn = self._connect()
+        conn.execute(
+            """
+            INSERT INTO cache_generations (namespace, generation) VALUES (?, 1)
+            ON CONFLICT (namespace) DO UPDATE SET generation = generation + 1
+            """,
+            (namespace,)
+        )
+        conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM cache_entries")
+
+
+def create_cache():
+    backend = settings.CACHE_BACKEND
+    if backend == "auto":
+        backend = "sqlite" if multi_worker() else "memory"
+    if backend == "sqlite":
+        return SqliteCache(settings.CACHE_PATH, settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+    if backend == "memory":
+        return MemoryCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+    raise ValueError(f"Unknown CACHE_BACKEND '{backend}'")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Кэш процесса (создаётся при первом обращении)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache()
+    return _cache
+
+
+def cached(namespace: str, key: str, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+    """Значение из кэша или loader() с сохранением (если за время loader() не было сброса)"""
+    cache = get_cache()
+    value = cache.get(namespace, key, _MISSING)
+    if value is _MISSING:
+        generation = cache.generation(namespace)
+        value = loader()
+        cache.set(namespace, key, value, ttl, generation=generation)
+    return value
+
+
+# ───────────────────────────────────────────────
+# Сброс после коммита
+# ───────────────────────────────────────────────
+
+_PENDING_KEY = "cache_invalidate"
+
+
+def invalidate_on_commit(db: Session, *namespaces: str) -> None:
+    """Сбросить пространства после commit сессии (при rollback — не сбрасывать)"""
+    db.info.setdefault(_PENDING_KEY, set()).update(namespaces)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    namespaces = session.info.pop(_PENDING_KEY, None)
+    if namespaces:
+        cache = get_cache()
+        for namespace in namespaces:
+            cache.invalidate(namespace)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,278 @@
+"""
+Калибровка уверенности агента по истории feedback
+
+Предсказание — feedback.confidence_before (0..1), исход — одобрен ли
+пост (approved / edited = 1, rejected = 0). Калибровка хорошая, если
+среди постов с уверенностью ~0.8 одобряется ~80%.
+
+Feedback только добавляется, поэтому история держится в памяти процесса
+в виде колонок NumPy и дочитывается по id > последнего загруженного:
+запрос стоит O(новых строк) + векторный расчёт. Первое чтение всей
+истории выполняется в фоне при старте (CALIBRATION_PRELOAD). Платформа
+и версия промпта берутся у поста в момент загрузки строки.
+
+Метрики:
+- кривая надёжности — по корзинам уверенности: средняя уверенность,
+  доля одобренных, число;
+- Brier score — среднее (уверенность − исход)²;
+- ECE — среднее |доля одобренных − уверенность| по корзинам с весом
+  размера корзины;
+- разбивка по платформам и версиям промпта.
+"""
+import logging
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .database import ReadSessionLocal
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 100_000
+
+# Строка выборки feedback; created_at — юлианский день (UTC)
+ROW_DTYPE = np.dtype([
+    ("id", np.int64),
+    ("confidence", np.float64),
+    ("approved", np.int8),
+    ("created_at", np.float64),
+    ("post_id", np.int64),
+])
+CATEGORIES = ("platform", "prompt_version")
+
+# Платформа и версия — отдельным запросом по диапазону постов: строки
+# для каждой строки feedback в разы замедляют загрузку
+FEEDBACK_SQL = """
+    SELECT id, confidence_before, feedback_type IN ('approved', 'edited'),
+           COALESCE(julianday(created_at), 0), post_id
+    FROM feedback
+    WHERE id > ? AND confidence_before IS NOT NULL
+      AND feedback_type IN ('approved', 'edited', 'rejected')
+    ORDER BY id
+"""
+POSTS_SQL = """
+    SELECT id, COALESCE(platform, ''), COALESCE(prompt_version, '')
+    FROM posts WHERE id BETWEEN ? AND ? ORDER BY id
+"""
+
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+
+class Snapshot(NamedTuple):
+    """Согласованный срез истории для одного расчёта"""
+    confidence: np.ndarray
+    approved: np.ndarray
+    created_at: np.ndarray
+    codes: dict   # категория -> коды строк
+    labels: dict  # категория -> список значений по коду
+
+
+class FeedbackHistory:
+    """Колонки feedback с уверенностью в памяти, дочитываются инкрементально"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.last_id = 0
+        self.confidence = np.empty(0, dtype=np.float64)
+        self.approved = np.empty(0, dtype=np.int8)
+        self.created_at = np.empty(0, dtype=np.float64)
+        # Категории — коды в словарях labels, чтобы группировать через bincount
+        self.labels = {name: [] for name in CATEGORIES}
+        self.codes = {name: np.empty(0, dtype=np.int32) for name in CATEGORIES}
+
+    def refresh(self, db: Session) -> Snapshot:
+        """Дочитать новые строки и вернуть срез"""
+        with self._lock:
+            # Курсор драйвера: кортежи без обёртки Row, их сразу читает fromiter
+            connection = db.connection().connection
+            cursor = connection.execute(FEEDBACK_SQL, (self.last_id,))
+            while True:
+                chunk = cursor.fetchmany(CHUNK_ROWS)
+                if not chunk:
+                    break
+                self._append(connection, np.fromiter(chunk, dtype=ROW_DTYPE, count=len(chunk)))
+            return Snapshot(
+                self.confidence, self.approved, self.created_at,
+                dict(self.codes), {name: list(labels) for name, labels in self.labels.items()},
+            )
+
+    def _append(self, connection, rows: np.ndarray) -> None:
+        post_ids = rows["post_id"]
+        self.last_id = int(rows["id"][-1])
+        self.confidence = np.concatenate([self.confidence, rows["confidence"]])
+        self.approved = np.concatenate([self.approved, rows["approved"]])
+        self.created_at = np.concatenate([self.created_at, rows["created_at"]])
+
+        posts = connection.execute(POSTS_SQL, (int(post_ids.min()), int(post_ids.max()))).fetchall()
+        known = np.array([row[0] for row in posts], dtype=np.int64)
+        # Индекс поста для каждой строки; удалённые посты — последняя позиция ('')
+        index = np.searchsorted(known, post_ids)
+        found = index < len(known)
+        found[found] = known[index[found]] == post_ids[found]
+        index[~found] = len(known)
+
+        for offset, name in enumerate(CATEGORIES, start=1):
+            post_codes = self._encode(name, [row[offset] for row in posts] + [""])
+            self.codes[name] = np.concatenate([self.codes[name], post_codes[index]])
+
+    def _encode(self, name: str, values: list) -> np.ndarray:
+        """Строки -> коды с дополнением словаря новыми значениями"""
+        labels = self.labels[name]
+        index = {label: code for code, label in enumerate(labels)}
+        for label in set(values) - index.keys():
+            index[label] = len(labels)
+            labels.append(label)
+        return np.array([index[label] for label in values], dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.confidence)
+
+
+history = FeedbackHistory()
+
+
+def preload() -> None:
+    """Загрузить историю заранее, чтобы первый запрос не ждал полного чтения"""
+    started = time.perf_counter()
+    try:
+        with ReadSessionLocal() as db:
+            count = len(history.refresh(db).confidence)
+    except Exception:
+        logger.exception("Calibration preload failed")
+        return
+    logger.info("Loaded %d feedback rows for calibration in %.1f ms", count, (time.perf_counter() - started) * 1000)
+
+
+# ───────────────────────────────────────────────
+# Расчёт
+# ───────────────────────────────────────────────
+
+def _bin_index(confidence: np.ndarray, bins: int) -> np.ndarray:
+    """Номер корзины [i/bins, (i+1)/bins); 1.0 попадает в последнюю"""
+    return np.minimum((confidence * bins).astype(np.int64), bins - 1)
+
+
+def _metrics(n: np.ndarray, sum_conf: np.ndarray, sum_approved: np.ndarray,
+             sum_sq: np.ndarray, bin_gap: np.ndarray) -> dict:
+    """
+    Метрики групп из сумм (массивы по группам).
+    bin_gap — (группы × корзины): |одобрено − сумма уверенности| в корзине.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "mean_confidence": sum_conf / n,
+            "approval_rate": sum_approved / n,
+            "brier_score": sum_sq / n,
+            "ece": bin_gap.sum(axis=1) / n,
+        }
+
+
+def _round(value, digits: int = 4) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+def _breakdown(codes: np.ndarray, labels: list, bin_idx: np.ndarray, bins: int,
+               confidence: np.ndarray, approved: np.ndarray, sq_err: np.ndarray) -> list:
+    """Метрики по каждой категории за один проход bincount"""
+    groups = len(labels)
+    n = np.bincount(codes, minlength=groups)
+    cell = codes.astype(np.int64) * bins + bin_idx
+    cell_gap = np.abs(
+        np.bincount(cell, weights=approved, minlength=groups * bins)
+        - np.bincount(cell, weights=confidence, minlength=groups * bins)
+    ).reshape(groups, bins)
+    metrics = _metrics(
+        n,
+        np.bincount(codes, weights=confidence, minlength=groups),
+        np.bincount(codes, weights=approved, minlength=groups),
+        np.bincount(codes, weights=sq_err, minlength=groups),
+        cell_gap,
+    )
+
+    result = []
+    for code in np.flatnonzero(n):
+        result.append({
+            "key": labels[code] or None,
+            "count": int(n[code]),
+            "mean_confidence": _round(metrics["mean_confidence"][code]),
+            "approval_rate": _round(metrics["approval_rate"][code]),
+            "brier_score": _round(metrics["brier_score"][code]),
+            "ece": _round(metrics["ece"][code]),
+        })
+    result.sort(key=lambda item: -item["count"])
+    return result
+
+
+def report(
+    db: Session,
+    bins: int = 10,
+    days: Optional[int] = None,
+    platform: Optional[str] = None,
+    prompt_version: Optional[str] = None,
+) -> dict:
+    """Кривая надёжности, Brier score, ECE и разбивки по платформам и версиям"""
+    data = history.refresh(db)
+
+    mask = np.ones(len(data.confidence), dtype=bool)
+    if days is not None:
+        now = time.time() / 86400 + UNIX_EPOCH_JULIAN_DAY
+        mask &= data.created_at >= now - days
+    for name, value in (("platform", platform), ("prompt_version", prompt_version)):
+        if value is not None:
+            labels = data.labels[name]
+            code = labels.index(value) if value in labels else -1
+            mask &= data.codes[name] == code
+
+    confidence = data.confidence[mask]
+    approved = data.approved[mask].astype(np.float64)
+    sq_err = (confidence - approved) ** 2
+    bin_idx = _bin_index(confidence, bins)
+
+    bin_n = np.bincount(bin_idx, minlength=bins)
+    bin_conf = np.bincount(bin_idx, weights=confidence, minlength=bins)
+    bin_approved = np.bincount(bin_idx, weights=approved, minlength=bins)
+    total = _metrics(
+        np.array([len(confidence)]),
+        np.array([confidence.sum()]),
+        np.array([approved.sum()]),
+        np.array([sq_err.sum()]),
+        np.abs(bin_approved - bin_conf)[None, :],
+    )
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        curve_conf = bin_conf / bin_n
+        curve_rate = bin_approved / bin_n
+
+    return {
+        "count": len(confidence),
+        "bins": bins,
+        "mean_confidence": _round(total["mean_confidence"][0]),
+        "approval_rate": _round(total["approval_rate"][0]),
+        "brier_score": _round(total["brier_score"][0]),
+        "ece": _round(total["ece"][0]),
+        "reliability": [
+            {
+                "lower": round(i / bins, 4),
+                "upper": round((i + 1) / bins, 4),
+                "count": int(bin_n[i]),
+                "mean_confidence": _round(curve_conf[i]),
+                "approval_rate": _round(curve_rate[i]),
+            }
+            for i in range(bins)
+        ],
+        "by_platform": _breakdown(
+            data.codes["platform"][mask], data.labels["platform"],
+            bin_idx, bins, confidence, approved, sq_err
+        ),
+        "by_prompt_version": _breakdown(
+            data.codes["prompt_version"][mask], data.labels["prompt_version"],
+            bin_idx, bins, confidence, approved, sq_err
+        ),
+    }
@@ -0,0 +1,252 @@
+"""
+Журнал изменений (change feed) для инкрементальной синхронизации
+
+Мутации постов, feedback, журнала агента, версий промптов, снимков и
+состояния агента пишут строку в change_log в той же транзакции. seq —
+глобальный и монотонный: в SQLite один писатель, строка получает seq
+при вставке и становится видна после commit в том же порядке, поэтому
+клиент, запомнивший последний seq, изменений не пропустит.
+
+Клиент:
+1. GET /api/changes/head — текущий seq;
+2. полная загрузка нужных данных;
+3. GET /api/changes?since=<seq>&wait=25 — только новые изменения
+   (long-poll: ответ сразу, как только они появятся).
+
+Строка — уведомление «сущность изменилась» с подсказкой в data.
+created/updated клиент применяет как upsert, deleted — как удаление.
+
+Компактация (вместе с retention):
+- старше CHANGES_COMPACT_AFTER_HOURS по сущности остаётся только
+  последняя запись;
+- старше CHANGES_RETENTION_DAYS строки удаляются, граница (horizon)
+  запоминается, и клиент с since < horizon получает 410 — нужна
+  полная загрузка.
+"""
+import asyncio
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import event, func, insert, text
+from sqlalchemy.orm import Session
+
+from . import agent_state
+from .config import get_settings
+from .database import ReadSessionLocal
+from .models import AgentState, ChangeLogEntry
+
+settings = get_settings()
+
+# Сущности
+POST = "post"
+FEEDBACK = "feedback"
+DECISION = "decision"
+LEARNING_EVENT = "learning_event"
+PROMPT_VERSION = "prompt_version"
+SNAPSHOT = "snapshot"
+AGENT_STATE = "agent_state"
+
+# Операции
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+
+HORIZON_KEY = "change_log_horizon"
+
+
+class ChangeFeedError(HTTPException):
+    """Запрошенные изменения уже удалены компактацией (410)"""
+
+
+# ───────────────────────────────────────────────
+# Запись
+# ───────────────────────────────────────────────
+
+_PENDING_KEY = "change_feed_notify"
+
+
+def entry(entity: str, entity_id: Any, op: str, data: Optional[dict] = None) -> dict:
+    """Строка журнала для record_many"""
+    return {
+        "entity": entity,
+        "entity_id": str(entity_id),
+        "op": op,
+        "data": json.dumps(data, ensure_ascii=False, default=str) if data is not None else None,
+        "created_at": datetime.utcnow(),
+    }
+
+
+def record(db: Session, entity: str, entity_id: Any, op: str, data: Optional[dict] = None) -> None:
+    """Записать изменение в текущей транзакции (без commit)"""
+    record_many(db, [entry(entity, entity_id, op, data)])
+
+
+def record_many(db: Session, rows: List[dict]) -> None:
+    if rows:
+        db.execute(insert(ChangeLogEntry), rows)
+        db.info[_PENDING_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session: Session) -> None:
+    if session.info.pop(_PENDING_KEY, False):
+        notifier.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+# ───────────────────────────────────────────────
+# Чтение
+# ───────────────────────────────────────────────
+
+def horizon(db: Session) -> int:
+    """seq, до которого (включительно) изменения удалены"""
+    return agent_state.get_value(db, HORIZON_KEY, 0)
+
+
+def head(db: Session) -> int:
+    """Последний seq"""
+    return db.query(func.max(ChangeLogEntry.seq)).scalar() or horizon(db)
+
+
+def read(db: Session, since: int, limit: int = 500) -> dict:
+    """Изменения с seq > since (не больше limit)"""
+    floor = horizon(db)
+    if since < floor:
+        raise ChangeFeedError(
+            status_code=410,
+            detail=f"Changes up to seq {floor} were compacted, full resync required"
+        )
+
+    rows = db.query(ChangeLogEntry).filter(
+        ChangeLogEntry.seq > since
+    ).order_by(ChangeLogEntry.seq).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        "changes": [
+            {
+                "seq": row.seq,
+                "entity": row.entity,
+                "entity_id": row.entity_id,
+                "op": row.op,
+                "data": json.loads(row.data) if row.data else None,
+                "created_at": row.created_at,
+            }
+            for row in rows
+        ],
+        "last_seq": rows[-1].seq if rows else since,
+        "has_more": has_more,
+    }
+
+
+# ───────────────────────────────────────────────
+# Long-poll
+# ───────────────────────────────────────────────
+
+class ChangeNotifier:
+    """
+    Будит ожидающие запросы после commit с изменениями.
+    Работает в пределах процесса; изменения из других воркеров
+    замечаются опросом раз в CHANGES_POLL_INTERVAL_SECONDS.
+    """
+
+    def __init__(self):
+        self._waiters: set = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def subscribe(self):
+        woke = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), woke)
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            yield woke
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+    def notify(self) -> None:
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, woke in waiters:
+            try:
+                loop.call_soon_threadsafe(woke.set)
+            except RuntimeError:
+                pass  # цикл уже закрыт
+
+
+notifier = ChangeNotifier()
+
+
+def _read_once(since: int, limit: int) -> dict:
+    with ReadSessionLocal() as db:
+        return read(db, since, limit)
+
+
+async def wait_for_changes(since: int, limit: int, wait: float) -> dict:
+    """read(), но если изменений нет — ждать их до wait секунд"""
+    from starlette.concurrency import run_in_threadpool
+
+    deadline = time.monotonic() + min(wait, settings.CHANGES_LONG_POLL_MAX_SECONDS)
+    while True:
+        # Подписка до чтения: commit между чтением и ожиданием не потеряется
+        with notifier.subscribe() as woke:
+            result = await run_in_threadpool(_read_once, since, limit)
+            remaining = deadline - time.monotonic()
+            if result["changes"] or remaining <= 0:
+                return result
+            try:
+                await asyncio.wait_for(
+                    woke.wait(), min(remaining, settings.CHANGES_POLL_INTERVAL_SECONDS)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+
+# ───────────────────────────────────────────────
+# Компактация
+# ───────────────────────────────────────────────
+
+def compact(db: Session, now: Optional[datetime] = None) -> dict:
+    """Схлопнуть и удалить старые записи (без commit)"""
+    now = now or datetime.utcnow()
+    purge_before = now - timedelta(days=settings.CHANGES_RETENTION_DAYS)
+    compact_before = now - timedelta(hours=settings.CHANGES_COMPACT_AFTER_HOURS)
+
+    # Удаляется префикс по seq, чтобы horizon однозначно описывал потерю
+    purged = 0
+    last_purged = db.query(func.max(ChangeLogEntry.seq)).filter(
+        ChangeLogEntry.created_at < purge_before
+    ).scalar()
+    if last_purged:
+        purged = db.execute(text(
+            "DELETE FROM change_log WHERE seq <= :seq"
+        ), {"seq": last_purged}).rowcount
+        # Напрямую, а не через agent_state.set_value: сама граница в журнал не пишется
+        db.merge(AgentState(key=HORIZON_KEY, value=json.dumps(max(last_purged, horizon(db)))))
+
+    # Запись, после которой есть более новая по той же сущности, больше не нужна
+    coalesced = 0
+    boundary = db.query(func.max(ChangeLogEntry.seq)).filter(
+        ChangeLogEntry.created_at < compact_before
+    ).scalar()
+    if boundary:
+        coalesced = db.execute(text(
+            "DELETE FROM change_log WHERE seq <= :seq AND seq < ("
+            "  SELECT MAX(c.seq) FROM change_log c"
+            "  WHERE c.entity = change_log.entity AND c.entity_id = change_log.entity_id"
+            ")"
+        ), {"seq": boundary}).rowcount
+
+    return {"purged": purged, "coalesced": coalesced}
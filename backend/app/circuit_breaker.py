@@ -0,0 +1,266 @@
+"""
+Circuit breaker агента
+
+Состояния:
+- closed    — всё работает, исходы копятся в скользящем окне
+- open      — в окне набралось FAILURE_THRESHOLD ошибок, вызовы запрещены
+- half_open — после COOLDOWN_SECONDS разрешён один пробный вызов;
+              успех закрывает breaker, ошибка снова открывает
+
+Состояние обновляется инкрементально при записи решения агента и
+читается за O(1). Снимок сохраняется в agent_state при смене состояния
+и при остановке приложения, чтобы пережить рестарт.
+
+При WORKERS > 1 (shared) состояние общее для процессов: каждая
+операция читает снимок из agent_state, а изменяющая — записывает его
+обратно под файловой блокировкой.
+"""
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from .config import get_settings
+from .database import SessionLocal
+from .models import AgentDecision, AgentState
+from .workers import file_lock, multi_worker
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_KEY = "circuit_breaker"
+BREAKER_LOCK = "circuit_breaker"
+
+
+class CircuitBreaker:
+    """Circuit breaker со скользящим окном исходов и cooldown"""
+
+    def __init__(
+        self,
+        window_size: int = 10,
+        failure_threshold: int = 3,
+        cooldown_seconds: float = 300.0,
+        session_factory: Callable = SessionLocal,
+        clock: Callable[[], float] = time.time,
+        shared: bool = False,
+    ):
+        self.window_size = window_size
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.session_factory = session_factory
+        self.clock = clock
+        self.shared = shared
+
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # снимок и запись — атомарно
+        self._window: deque = deque(maxlen=window_size)  # True = failure
+        self._failures = 0
+        self._state = CLOSED
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    # ───────────────────────────────────────────────
+    # Чтение — O(1)
+    # ───────────────────────────────────────────────
+
+    @contextmanager
+    def _synced(self, write: bool = False) -> Iterator[None]:
+        """shared: перечитать общее состояние до операции и сохранить после"""
+        if not self.shared:
+            yield
+            return
+        with file_lock(BREAKER_LOCK):
+            self.load(warm=False)
+            yield
+            if write:
+                self.save()
+
+    @property
+    def state(self) -> str:
+        with self._synced(), self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        """Состояние с учётом истёкшего cooldown (под self._lock)"""
+        if self._state == OPEN and self.clock() - self._opened_at >= self.cooldown_seconds:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    @property
+    def failure_rate(self) -> float:
+        with self._synced(), self._lock:
+            return self._failures / len(self._window) if self._window else 0.0
+
+    def allow(self) -> bool:
+        """
+        Можно ли делать внешний вызов (генерация, публикация).
+        В half_open пропускает только один пробный вызов до его исхода.
+        """
+        with self._synced(write=True), self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        """Секунд до перехода в half_open (0 если не open)"""
+        with self._synced(), self._lock:
+            if self._current_state() != OPEN:
+                return 0.0
+            return max(0.0, self.cooldown_seconds - (self.clock() - self._opened_at))
+
+    def snapshot(self) -> dict:
+        with self._synced(), self._lock:
+            state = self._current_state()
+            return {
+                "state": state,
+                "failures": self._failures,
+                "window": len(self._window),
+                "window_size": self.window_size,
+                "failure_threshold": self.failure_threshold,
+                "cooldown_seconds": self.cooldown_seconds,
+                "opened_at": self._opened_at,
+            }
+
+    # ───────────────────────────────────────────────
+    # Запись
+    # ───────────────────────────────────────────────
+
+    def record(self, outcome: Optional[str]) -> str:
+        """Учесть исход решения агента. Исходы кроме success/failure игнорируются."""
+        if outcome not in ("success", "failure"):
+            return self.state
+
+        failed = outcome == "failure"
+        with self._synced(write=True):
+            return self._record(failed)
+
+    def _record(self, failed: bool) -> str:
+        with self._lock:
+            before = self._current_state()
+
+            if before == HALF_OPEN:
+                self._probe_in_flight = False
+                if failed:
+                    self._open()
+                else:
+                    self._close()
+            else:
+                self._push(failed)
+                if before == OPEN and failed:
+                    # Ошибки во время open продлевают cooldown
+                    self._opened_at = self.clock()
+                elif before == CLOSED and self._failures >= self.failure_threshold:
+                    self._open()
+
+            after = self._state
+            changed = after != before
+
+        if changed and not self.shared:
+            self.save()
+        return after
+
+    def _push(self, failed: bool) -> None:
+        if len(self._window) == self._window.maxlen and self._window[0]:
+            self._failures -= 1
+        self._window.append(failed)
+        if failed:
+            self._failures += 1
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = self.clock()
+
+    def _close(self) -> None:
+        self._state = CLOSED
+        self._opened_at = None
+        self._window.clear()
+        self._failures = 0
+
+    def reset(self) -> None:
+        """Принудительно закрыть breaker"""
+        with self._synced():
+            with self._lock:
+                self._close()
+            self.save()
+
+    # ───────────────────────────────────────────────
+    # Персистентность
+    # ───────────────────────────────────────────────
+
+    def save(self) -> None:
+        with self._save_lock:
+            with self._lock:
+                data = {
+                    "state": self._state,
+                    "opened_at": self._opened_at,
+                    "window": list(self._window),
+                    "probe_in_flight": self._probe_in_flight,
+                }
+            db = self.session_factory()
+            try:
+                db.merge(AgentState(key=STATE_KEY, value=json.dumps(data)))
+                db.commit()
+            finally:
+                db.close()
+
+    def load(self, warm: bool = True) -> None:
+        """
+        Восстановить состояние из agent_state.
+        Если снимка нет и warm — прогреть окно по последним решениям в БД.
+        """
+        warmed = False
+        db = self.session_factory()
+        try:
+            row = db.query(AgentState).filter(AgentState.key == STATE_KEY).first()
+            if row and row.value:
+                data = json.loads(row.value)
+                window = [bool(x) for x in data.get("window", [])]
+                state = data.get("state", CLOSED)
+                opened_at = data.get("opened_at")
+                # Пробный вызов переживает только переход между процессами, не рестарт
+                probe = self.shared and data.get("probe_in_flight", False)
+            elif not warm:
+                window, state, opened_at, probe = [], CLOSED, None, False
+            else:
+                outcomes = db.query(AgentDecision.outcome).filter(
+                    AgentDecision.outcome.in_(("success", "failure"))
+                ).order_by(AgentDecision.created_at.desc()).limit(self.window_size).all()
+                window = [o.outcome == "failure" for o in reversed(outcomes)]
+                state, opened_at, probe = CLOSED, None, False
+                warmed = True
+        finally:
+            db.close()
+
+        with self._lock:
+            if state == OPEN and opened_at is None:
+                # Снимок без времени открытия (ручная правка, старый формат): cooldown — с этого момента
+                opened_at = self.clock()
+            self._window = deque(window, maxlen=self.window_size)
+            self._failures = sum(self._window)
+            self._state = state
+            self._opened_at = opened_at
+            self._probe_in_flight = probe
+            if state == CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+        if warmed and self.shared:
+            # Остальные процессы читают только снимок
+            self.save()
+
+
+settings = get_settings()
+
+circuit_breaker = CircuitBreaker(
+    window_size=settings.CIRCUIT_BREAKER_WINDOW,
+    failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    cooldown_seconds=settings.CIRCUIT_BREAKER_COOLDOWN_SECONDS,
+    shared=multi_worker(),
+)
@@ -0,0 +1,271 @@
+"""
+Сжатие ответов API (zstd / brotli / gzip)
+
+Кодек выбирается по Accept-Encoding клиента. Маленькие ответы
+(меньше COMPRESSION_MIN_SIZE) отдаются как есть. Для кэшируемых
+эндпоинтов (статистика, календарь, версии промптов) сжатое тело
+хранится в LRU-кэше по BLAKE2b-хэшу исходного тела и переиспользуется.
+Большие тела (от COMPRESSION_THREAD_MIN_SIZE) хэшируются и сжимаются
+в пуле потоков, чтобы не блокировать event loop; маленькие — на месте.
+Ответы на HEAD проходят без изменений: тела нет, а Content-Length
+должен остаться длиной тела GET.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - опциональная зависимость
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - опциональная зависимость
+    zstandard = None
+
+
+# Порядок предпочтения сервера при равных q-значениях
+ENCODING_PREFERENCE = ("zstd", "br", "gzip")
+
+# Типы контента, которые имеет смысл сжимать
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "text/",
+    "application/javascript",
+    "application/xml",
+)
+
+
+def available_encodings() -> tuple:
+    """Кодеки, доступные в текущем окружении"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return tuple(encodings)
+
+
+def negotiate_encoding(accept_encoding: str, supported: tuple) -> Optional[str]:
+    """
+    Выбрать кодек по заголовку Accept-Encoding.
+    Учитывает q-значения и `*`; при равенстве — порядок ENCODING_PREFERENCE.
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    wildcard = weights.get("*")
+    best, best_q = None, 0.0
+    for encoding in ENCODING_PREFERENCE:
+        if encoding not in supported:
+            continue
+        q = weights.get(encoding, wildcard if wildcard is not None else 0.0)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class Compressor:
+    """Кодеки с настроенными уровнями сжатия"""
+
+    def __init__(self, gzip_level: int = 6, brotli_quality: int = 4, zstd_level: int = 3):
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.zstd_level = zstd_level
+        # ZstdCompressor не потокобезопасен — держим по экземпляру на поток
+        self._local = threading.local()
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "gzip":
+            # mtime=0 — одинаковое тело даёт одинаковые байты
+            return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        if encoding == "zstd":
+            cctx = getattr(self._local, "zstd", None)
+            if cctx is None:
+                cctx = zstandard.ZstdCompressor(level=self.zstd_level)
+                self._local.zstd = cctx
+            return cctx.compress(body)
+        raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class CompressedCache:
+    """
+    LRU-кэш сжатых тел: (BLAKE2b тела, длина, кодек) -> байты.
+    Ограничен суммарным размером, а не числом записей.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware для сжатия ответов.
+
+    Тело ответа буферизуется целиком (API отдаёт JSON), поэтому
+    Content-Length всегда выставлен — без chunked-передачи, что удобно
+    для HTTP/2 прокси перед приложением.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        thread_min_size: int = 64 * 1024,
+        cacheable_paths: tuple = (),
+        cache_max_bytes: int = 16 * 1024 * 1024,
+        compressor: Optional[Compressor] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_min_size = thread_min_size
+        self.cacheable_paths = tuple(cacheable_paths)
+        self.compressor = compressor or Compressor()
+        self.cache = CompressedCache(cache_max_bytes)
+        self.supported = available_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""), self.supported)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        cacheable = scope["path"].startswith(self.cacheable_paths) if self.cacheable_paths else False
+        responder = _CompressionResponder(self, encoding, cacheable, send)
+        await self.app(scope, receive, responder)
+
+    def encode(self, body: bytes, encoding: str, cacheable: bool) -> bytes:
+        """Сжать тело, используя кэш для кэшируемых эндпоинтов"""
+        if not cacheable:
+            return self.compressor.compress(body, encoding)
+
+        # Криптографический хэш: при совпадении hash() клиент получил бы чужое тело.
+        # BLAKE2b всё равно заметно дешевле сжатия
+        key = (hashlib.blake2b(body, digest_size=16).digest(), len(body), encoding)
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = self.compressor.compress(body, encoding)
+            self.cache.put(key, compressed)
+        return compressed
+
+
+class _CompressionResponder:
+    """Перехватывает send() приложения и сжимает тело"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, cacheable: bool, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.cacheable = cacheable
+        self.send = send
+        self.start_message: Optional[Message] = None
+        self.chunks: list = []
+        self.passthrough = False
+
+    async def __call__(self, message: Message) -> None:
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            if "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+                self.passthrough = True
+                await self.send(message)
+                return
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        self.chunks.append(message.get("body", b""))
+        if message.get("more_body", False):
+            return
+
+        body = b"".join(self.chunks)
+        start = self.start_message
+        headers = MutableHeaders(raw=start["headers"])
+        headers.add_vary_header("Accept-Encoding")
+
+        if len(body) >= self.middleware.minimum_size:
+            if len(body) >= self.middleware.thread_min_size:
+                # zlib/brotli/zstd и hashlib отпускают GIL на больших буферах
+                body = await anyio.to_thread.run_sync(
+                    self.middleware.encode, body, self.encoding, self.cacheable
+                )
+            else:
+                body = self.middleware.encode(body, self.encoding, self.cacheable)
+            headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(body))
+
+        await self.send(start)
+        await self.send({"type": "http.response.body", "body": body})
@@ -10,6 +10,9 @@ class Settings(BaseSettings):
 
     # База данных
     DATABASE_URL: str = "sqlite:///./smm_dashboard.db"
+    DATABASE_JOURNAL_MODE: str = "wal"  # "" — режим файла не меняется
+    DB_READ_POOL_SIZE: int = 8  # read-only соединения для GET; 0 — всё через соединения записи
+    DB_WRITE_QUEUE_TIMEOUT_SECONDS: float = 30.0  # ожидание очереди записи
 
     # CORS
     CORS_ORIGINS: list[str] = ["http://localhost:3000", "http://127.0.0.1:3000"]
@@ -18,6 +21,125 @@ class Settings(BaseSettings):
     OPENROUTER_API_KEY: str = ""
     GROQ_API_KEY: str = ""
 
+    # Сжатие ответов
+    COMPRESSION_MIN_SIZE: int = 1024  # байт; меньше — отдаём без сжатия
+    COMPRESSION_THREAD_MIN_SIZE: int = 64 * 1024  # байт; больше — сжатие в пуле потоков
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    COMPRESSION_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    COMPRESSION_CACHEABLE_PATHS: list[str] = [
+        "/api/posts/stats",
+        "/api/agent/prompt/versions",
+        "/api/metrics/health",  # /api/metrics/admission меняется на каждом запросе
+    ]
+
+    # Write-behind буфер журнала решений агента
+    AUDIT_BUFFER_ENABLED: bool = True
+    AUDIT_BUFFER_MAX_ROWS: int = 200       # сброс по размеру
+    AUDIT_BUFFER_FLUSH_SECONDS: float = 2.0  # сброс по времени
+    AUDIT_BUFFER_MAX_PENDING: int = 5000   # больше незаписанных строк — запись синхронная (ошибка — 503)
+
+    # Circuit breaker агента
+    CIRCUIT_BREAKER_WINDOW: int = 10            # последних исходов в окне
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 3  # ошибок в окне для открытия
+    CIRCUIT_BREAKER_COOLDOWN_SECONDS: float = 300.0  # open -> half_open
+
+    # Хранение журнала агента: горячая часть в основной БД, старое — в архиве
+    ARCHIVE_DATABASE_PATH: str = "./smm_dashboard_archive.db"  # "" — без архива
+    HOT_RETENTION_DAYS: int = 30       # сколько дней держать в основной БД
+    ARCHIVE_RETENTION_DAYS: int = 365  # 0 — хранить архив бессрочно
+    RETENTION_INTERVAL_SECONDS: float = 3600.0
+
+    # Картинки: генерация и локальное хранилище
+    IMAGE_GENERATION_URL: str = (
+        "https://image.pollinations.ai/prompt/{prompt}?width=1024&height=1024&nologo=true"
+    )
+    IMAGE_GENERATION_TIMEOUT_SECONDS: float = 90.0
+    MEDIA_ROOT: str = "./media"
+    MEDIA_MAX_BYTES: int = 10 * 1024 * 1024
+    MEDIA_THUMBNAIL_WIDTHS: list[int] = [320, 640]  # WebP-варианты
+    MEDIA_WEBP_QUALITY: int = 80
+    MEDIA_PROCESS_WORKERS: int = 2  # процессы для ресайза
+    MEDIA_INGEST_ALLOWED_HOSTS: list[str] = []  # /ingest?url=: пусто — любой публичный хост
+
+    # Несколько процессов (uvicorn --workers / gunicorn)
+    WORKERS: int = 1  # >1 — общий кэш, синхронная запись журнала, общий circuit breaker
+    LOCK_DIR: str = "."  # файловые блокировки между процессами
+    CACHE_BACKEND: str = "auto"  # auto | memory | sqlite (auto: memory при WORKERS=1)
+    CACHE_PATH: str = "./smm_dashboard_cache.db"
+    CACHE_TTL_SECONDS: float = 60.0
+    CACHE_MAX_ENTRIES: int = 1024
+
+    # Контент-план: ритм публикаций по платформам (переопределяется через API)
+    CONTENT_CADENCES: dict[str, list[str]] = {
+        "telegram": ["weekdays 10:00"],
+        "linkedin": ["tue 09:00", "thu 09:00"],
+        "vk": ["mon 12:00", "wed 12:00", "fri 12:00"],
+        "twitter": ["daily 11:00"],
+    }
+    CONTENT_PLAN_TIMEZONE: str = "Europe/Moscow"
+    CONTENT_SLOT_TOLERANCE_HOURS: float = 6.0  # пост в пределах ±N часов закрывает слот
+
+    # Вебхук Telegram (feedback ревьюеров)
+    TELEGRAM_WEBHOOK_SECRET: str = ""  # X-Telegram-Bot-Api-Secret-Token; "" — без проверки
+    TELEGRAM_BATCH_SIZE: int = 200  # updates в одной транзакции
+    TELEGRAM_SEEN_CACHE_SIZE: int = 10000  # update_id в памяти процесса
+    TELEGRAM_UPDATE_RETENTION_DAYS: int = 7  # Telegram повторяет доставку не дольше суток
+
+    # Журнал изменений (/api/changes)
+    CHANGES_COMPACT_AFTER_HOURS: float = 24.0  # старше — только последняя запись по сущности
+    CHANGES_RETENTION_DAYS: int = 7            # старше — удаляются (клиенту нужна полная загрузка)
+    CHANGES_LONG_POLL_MAX_SECONDS: float = 30.0
+    CHANGES_POLL_INTERVAL_SECONDS: float = 1.0  # проверка изменений других воркеров
+
+    # Калибровка уверенности агента
+    CALIBRATION_PRELOAD: bool = True  # читать историю feedback в фоне при старте
+
+    # Классификатор причин отклонения по rejection_details (для /learning/insights)
+    REJECTION_CLASSIFIER_INTERVAL_SECONDS: float = 300.0  # 0 — только вручную (API)
+    REJECTION_CLASSIFIER_MIN_TRAINING_ROWS: int = 30  # размеченных отклонений с текстом
+    REJECTION_CLASSIFIER_MIN_CLASS_ROWS: int = 5      # реже встречающиеся причины не учатся
+    REJECTION_CLASSIFIER_RETRAIN_ROWS: int = 50       # новых размеченных строк до переобучения
+    REJECTION_CLASSIFIER_MIN_CONFIDENCE: float = 0.6  # ниже — причина в insights не засчитывается
+    REJECTION_CLASSIFIER_BATCH_ROWS: int = 1000       # строк на транзакцию записи предсказаний
+
+    # Idempotency-Key мутирующих эндпоинтов
+    IDEMPOTENCY_TTL_SECONDS: float = 24 * 3600.0  # сколько помнить ответ в памяти
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000
+    IDEMPOTENCY_WAIT_SECONDS: float = 30.0  # ожидание одновременного запроса с тем же ключом
+
+    # Контроль допуска: лимиты на клиента (X-API-Key или IP) и сброс нагрузки
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_API_KEYS: list[str] = []  # ключи клиентов; другой или пустой X-API-Key — лимит по IP
+    RATE_LIMIT_READ_PER_SECOND: float = 20.0
+    RATE_LIMIT_READ_BURST: int = 60
+    RATE_LIMIT_WRITE_PER_SECOND: float = 5.0
+    RATE_LIMIT_WRITE_BURST: int = 20
+    RATE_LIMIT_AUDIT_PER_SECOND: float = 50.0  # решения агента и feedback (пишутся на каждом шаге)
+    RATE_LIMIT_AUDIT_BURST: int = 200
+    RATE_LIMIT_MAX_CLIENTS: int = 10000
+    ADMISSION_EXEMPT_PATHS: list[str] = ["/", "/api/health"]
+    ADMISSION_HEAVY_PATHS: list[str] = [  # пути, работающие с БД (long-poll /api/changes не держит слот)
+        "/api/posts", "/api/agent", "/api/plan", "/api/metrics/health", "/api/telegram", "/api/images",
+    ]
+    ADMISSION_MAX_CONCURRENT: int = 32  # не больше пула потоков (40)
+    ADMISSION_MAX_QUEUE: int = 64
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    DB_STATEMENT_TIMEOUT_SECONDS: float = 5.0  # 0 — без таймаута
+
+    # Резервные копии SQLite (online backup API, без остановки записи)
+    BACKUP_DIR: str = "./backups"
+    BACKUP_INTERVAL_SECONDS: float = 0.0  # 0 — только вручную (CLI / API)
+    BACKUP_KEEP: int = 7                  # сколько снимков хранить
+    BACKUP_COMPRESSION: str = ""          # "" | gzip | zstd
+    BACKUP_PAGES_PER_STEP: int = 1024     # страниц за шаг копирования
+    BACKUP_STEP_SLEEP_SECONDS: float = 0.005  # пауза между шагами
+
+    # Трассы запросов для воспроизведения (benchmarks/soak.py)
+    TRACE_PATH: str = ""  # "" — не писать
+    TRACE_MAX_BODY_BYTES: int = 64 * 1024
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
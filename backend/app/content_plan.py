@@ -0,0 +1,271 @@
+"""
+Контент-план: пустые слоты и буфер готового контента
+
+Для каждой платформы задан ритм публикаций (cadence) — слоты недели
+вида "mon 10:00", "weekdays 10:00", "daily 11:00" в CONTENT_PLAN_TIMEZONE.
+Движок:
+1. разворачивает ритм в ожидаемые слоты на горизонте;
+2. строит интервалы покрытия постов [t - tolerance, t + tolerance]
+   по scheduled_at (для опубликованных без даты — published_at);
+3. сливает пересекающиеся интервалы и одним проходом отмечает слоты,
+   не попавшие ни в один интервал.
+
+Сортировка доминирует: O((слоты + посты) log (слоты + посты)).
+Результат считается и кэшируется по (платформа, неделя); любое
+изменение постов или ритма сбрасывает кэш после коммита.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from fastapi import HTTPException
+from sqlalchemy import and_, event, func, or_
+from sqlalchemy.orm import Session
+
+from . import agent_state
+from .cache import cached, invalidate_on_commit
+from .config import get_settings
+from .models import Post, PostStatus
+
+settings = get_settings()
+
+CACHE_NAMESPACE = "content_plan"
+CADENCES_KEY = "content_cadences"
+
+# Статусы, которые занимают слот
+FILLING_STATUSES = (PostStatus.SCHEDULED.value, PostStatus.PUBLISHED.value)
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+DAY_GROUPS = {
+    "daily": tuple(range(7)),
+    "weekdays": tuple(range(5)),
+    "weekends": (5, 6),
+}
+
+
+class CadenceError(HTTPException):
+    """Неверная запись ритма"""
+
+    def __init__(self, detail: str):
+        super().__init__(status_code=400, detail=detail)
+
+
+# ───────────────────────────────────────────────
+# Ритм публикаций
+# ───────────────────────────────────────────────
+
+def parse_slot(spec: str) -> Tuple[Tuple[int, ...], time]:
+    """'mon 10:00' / 'weekdays 09:30' -> (дни недели, время)"""
+    try:
+        days, clock = spec.strip().lower().split()
+        hour, minute = (int(part) for part in clock.split(":"))
+        at = time(hour, minute)
+    except ValueError:
+        raise CadenceError(f"Invalid slot '{spec}', expected e.g. 'mon 10:00'")
+    if days in DAY_GROUPS:
+        return DAY_GROUPS[days], at
+    if days in WEEKDAYS:
+        return (WEEKDAYS.index(days),), at
+    raise CadenceError(f"Invalid day '{days}' in slot '{spec}'")
+
+
+def validate_cadences(cadences: dict) -> dict:
+    for specs in cadences.values():
+        for spec in specs:
+            parse_slot(spec)
+    return cadences
+
+
+def get_cadences(db: Session) -> dict:
+    """Ритм из agent_state (задаётся через API) или из настроек"""
+    return agent_state.get_value(db, CADENCES_KEY) or settings.CONTENT_CADENCES
+
+
+def set_cadences(db: Session, cadences: dict) -> None:
+    """Сохранить ритм (без commit)"""
+    agent_state.set_value(db, CADENCES_KEY, validate_cadences(cadences))
+    invalidate_on_commit(db, CACHE_NAMESPACE)
+
+
+def _timezone():
+    try:
+        return ZoneInfo(settings.CONTENT_PLAN_TIMEZONE)
+    except ZoneInfoNotFoundError:
+        return timezone.utc
+
+
+def naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """Момент из запроса (возможно, с часовым поясом) -> naive UTC, как в БД"""
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def week_start(moment: datetime) -> date:
+    """Понедельник недели (в часовом поясе плана) для naive UTC момента"""
+    local = moment.replace(tzinfo=timezone.utc).astimezone(_timezone()).date()
+    return local - timedelta(days=local.weekday())
+
+
+def week_start_utc(moment: datetime) -> datetime:
+    """Начало недели плана (понедельник 00:00 по местному времени) в naive UTC"""
+    local = datetime.combine(week_start(moment), time(), tzinfo=_timezone())
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def expected_slots(specs: Iterable[str], monday: date) -> List[datetime]:
+    """Слоты недели, начиная с monday, в naive UTC, по возрастанию"""
+    tz = _timezone()
+    slots = set()
+    for spec in specs:
+        days, at = parse_slot(spec)
+        for weekday in days:
+            local = datetime.combine(monday + timedelta(days=weekday), at, tzinfo=tz)
+            slots.add(local.astimezone(timezone.utc).replace(tzinfo=None))
+    return sorted(slots)
+
+
+# ───────────────────────────────────────────────
+# Интервалы
+# ───────────────────────────────────────────────
+
+def merge_intervals(points: Iterable[datetime], tolerance: timedelta) -> List[Tuple[datetime, datetime]]:
+    """Интервалы [t - tolerance, t + tolerance], слитые в непересекающиеся"""
+    merged: List[list] = []
+    for point in sorted(points):
+        start, end = point - tolerance, point + tolerance
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def uncovered(slots: List[datetime], intervals: List[Tuple[datetime, datetime]]) -> List[datetime]:
+    """Слоты (по возрастанию) вне интервалов (слитых, по возрастанию) — один проход"""
+    empty = []
+    i = 0
+    for slot in slots:
+        while i < len(intervals) and intervals[i][1] < slot:
+            i += 1
+        if i == len(intervals) or slot < intervals[i][0]:
+            empty.append(slot)
+    return empty
+
+
+# ───────────────────────────────────────────────
+# Анализ
+# ───────────────────────────────────────────────
+
+def _post_times(db: Session, platform: str, start: datetime, end: datetime) -> List[datetime]:
+    at = func.coalesce(Post.scheduled_at, Post.published_at)
+    rows = db.query(at).filter(
+        Post.platform == platform,
+        Post.status.in_(FILLING_STATUSES),
+        or_(
+            Post.scheduled_at.between(start, end),
+            and_(Post.scheduled_at.is_(None), Post.published_at.between(start, end)),
+        )
+    ).all()
+    return [row[0] for row in rows]
+
+
+def week_gaps(db: Session, platform: str, specs: List[str], monday: date) -> dict:
+    """Слоты и пустые слоты платформы за неделю (кэшируется)"""
+    def compute() -> dict:
+        slots = expected_slots(specs, monday)
+        if not slots:
+            return {"slots": [], "empty": []}
+        tolerance = timedelta(hours=settings.CONTENT_SLOT_TOLERANCE_HOURS)
+        posts = _post_times(db, platform, slots[0] - tolerance, slots[-1] + tolerance)
+        empty = uncovered(slots, merge_intervals(posts, tolerance))
+        return {
+            "slots": [slot.isoformat() for slot in slots],
+            "empty": [slot.isoformat() for slot in empty],
+        }
+
+    key = f"{platform}:{monday.isoformat()}:{','.join(specs)}"
+    return cached(CACHE_NAMESPACE, key, compute)
+
+
+def analyze(
+    db: Session,
+    start: Optional[datetime] = None,
+    days: int = 14,
+    platforms: Optional[List[str]] = None
+) -> dict:
+    """
+    Пустые слоты и буфер на горизонте [start, start + days).
+    buffer_days — сколько дней от start все слоты платформы заняты
+    (если пустых слотов нет — весь горизонт).
+    """
+    start = start or datetime.utcnow()
+    end = start + timedelta(days=days)
+    cadences = get_cadences(db)
+    if platforms:
+        cadences = {p: specs for p, specs in cadences.items() if p in platforms}
+
+    weeks = []
+    monday = week_start(start)
+    while datetime.combine(monday, time()) - timedelta(days=1) < end:
+        weeks.append(monday)
+        monday += timedelta(days=7)
+
+    result = []
+    for platform, specs in sorted(cadences.items()):
+        slots_total = 0
+        empty = []
+        for monday in weeks:
+            week = week_gaps(db, platform, list(specs), monday)
+            slots_total += sum(1 for s in week["slots"] if start <= datetime.fromisoformat(s) < end)
+            empty.extend(
+                at for at in map(datetime.fromisoformat, week["empty"]) if start <= at < end
+            )
+
+        next_empty = empty[0] if empty else None
+        buffer = (next_empty - start) if next_empty else (end - start)
+        result.append({
+            "platform": platform,
+            "slots_total": slots_total,
+            "filled": slots_total - len(empty),
+            "empty_slots": [at.isoformat() for at in empty],
+            "next_empty_at": next_empty.isoformat() if next_empty else None,
+            "buffer_days": round(buffer.total_seconds() / 86400, 1),
+        })
+
+    all_empty = sorted(
+        ({"platform": item["platform"], "at": at} for item in result for at in item["empty_slots"]),
+        key=lambda slot: slot["at"]
+    )
+    slots_total = sum(item["slots_total"] for item in result)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "slots_total": slots_total,
+        "filled": slots_total - len(all_empty),
+        "buffer_days": min((item["buffer_days"] for item in result), default=float(days)),
+        "empty_slots": all_empty,
+        "platforms": result,
+    }
+
+
+# ───────────────────────────────────────────────
+# Сброс кэша при изменении постов
+# ───────────────────────────────────────────────
+
+@event.listens_for(Session, "before_flush")
+def _posts_flushed(session: Session, flush_context, instances) -> None:
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Post):
+            invalidate_on_commit(session, CACHE_NAMESPACE)
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _posts_updated(orm_execute_state) -> None:
+    """UPDATE/DELETE по Post мимо ORM (переходы статусов, массовые операции)"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is Post:
+        invalidate_on_commit(orm_execute_state.session, CACHE_NAMESPACE)
@@ -1,29 +1,306 @@
 """
 Подключение к базе данных SQLite
+
+Два движка на один файл:
+- запись (get_engine, SessionLocal, get_db): в SQLite одновременно пишет
+  одно соединение, поэтому транзакции записи процесса идут через очередь
+  WriteQueue — первая изменяющая команда ждёт своей очереди (FIFO), commit
+  или rollback отдаёт её следующему. Без очереди писатели ждут в busy
+  handler SQLite, который опрашивает блокировку с паузами до 100 мс и не
+  соблюдает порядок;
+- чтение (get_read_engine, ReadSessionLocal, get_read_db): отдельный пул
+  соединений mode=ro + query_only. В WAL читатели не ждут писателя и не
+  занимают соединения записи; GET-эндпоинты объявляют это зависимостью
+  get_read_db.
+Очередь — в памяти процесса: при WORKERS > 1 процессы по-прежнему
+разбирают блокировку SQLite между собой.
 """
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 from .config import get_settings
 
 settings = get_settings()
 
-# Создаём движок SQLite
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}  # Только для SQLite
+# Архивная БД журнала агента подключается к каждому соединению как schema "archive".
+# Флаг считается по URL, без создания движка.
+ARCHIVE_SCHEMA = "archive"
+_url = make_url(settings.DATABASE_URL)
+archive_enabled = (
+    bool(settings.ARCHIVE_DATABASE_PATH)
+    and _url.get_backend_name() == "sqlite"
+    and _url.database not in (None, "", ":memory:")
+)
+
+# Таймаут запроса к БД в секундах: выставляется на время HTTP-запроса
+# (admission), фоновые потоки работают без него. SQLite своего таймаута
+# не имеет — запрос прерывает progress handler ("interrupted").
+statement_timeout: ContextVar[Optional[float]] = ContextVar("statement_timeout", default=None)
+_statement_deadline: ContextVar[Optional[float]] = ContextVar("statement_deadline", default=None)
+PROGRESS_HANDLER_STEPS = 1000  # инструкций VM SQLite между проверками
+
+# Отдельные соединения для чтения — только для файла SQLite
+read_split_enabled = (
+    settings.DB_READ_POOL_SIZE > 0
+    and _url.get_backend_name() == "sqlite"
+    and _url.database not in (None, "", ":memory:")
+)
+
+# Команды, которые пишут: с них транзакция встаёт в очередь записи.
+# WITH ... INSERT/UPDATE/DELETE — тоже (лишнее совпадение в чтении только ставит его в очередь)
+WRITE_STATEMENT = re.compile(
+    r"\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b"
+    r"|\s*WITH\b.*\b(INSERT|UPDATE|DELETE|REPLACE)\b",
+    re.IGNORECASE | re.DOTALL,
 )
 
-# Сессия
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+class WriteQueueTimeout(Exception):
+    """Очередь записи не дошла до транзакции за DB_WRITE_QUEUE_TIMEOUT_SECONDS"""
+
+
+class WriteQueue:
+    """Один писатель на процесс; остальные ждут в порядке прихода"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._busy = False
+        self._waiters: deque = deque()
+        self.transactions = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.max_wait_seconds = 0.0
+
+    def acquire(self) -> None:
+        with self._lock:
+            self.transactions += 1
+            if not self._busy:
+                self._busy = True
+                return
+            turn = threading.Event()
+            self._waiters.append(turn)
+            self.waited += 1
+
+        started = time.monotonic()
+        if not turn.wait(self.timeout):
+            with self._lock:
+                # Очередь могла дойти между таймаутом и захватом _lock
+                if not turn.is_set():
+                    self._waiters.remove(turn)
+                    self.timeouts += 1
+                    raise WriteQueueTimeout("Timed out waiting for the database write queue")
+        self.max_wait_seconds = max(self.max_wait_seconds, time.monotonic() - started)
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # Очередь передаётся следующему без освобождения
+                self._waiters.popleft().set()
+            else:
+                self._busy = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "transactions": self.transactions,
+                "waited": self.waited,
+                "waiting": len(self._waiters),
+                "timeouts": self.timeouts,
+                "max_wait_seconds": round(self.max_wait_seconds, 4),
+            }
+
+
+write_queue = WriteQueue(settings.DB_WRITE_QUEUE_TIMEOUT_SECONDS)
+
+
+class _WriterConnection(sqlite3.Connection):
+    """Соединение записи: место в очереди держится до commit / rollback / close"""
+
+    holds_write_queue = False
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            self._release_write_queue()
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._release_write_queue()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._release_write_queue()
+
+    def _release_write_queue(self) -> None:
+        if self.holds_write_queue:
+            self.holds_write_queue = False
+            write_queue.release()
+
+
+# Движки создаются при первом обращении: импорт моделей, CLI и тесты
+# не открывают БД и не регистрируют обработчики, пока это не нужно
+_engine: Optional[Engine] = None
+_read_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """Движок записи (и чтения, если отдельные соединения выключены)"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine()
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def get_read_engine() -> Engine:
+    """Движок только для чтения"""
+    global _read_engine
+    if not read_split_enabled:
+        engine = get_engine()
+        ReadSessionLocal.configure(bind=engine)
+        return engine
+    if _read_engine is None:
+        # Файл и режим WAL создаёт движок записи (миграции при старте)
+        get_engine()
+        with _engine_lock:
+            if _read_engine is None:
+                _read_engine = _create_read_engine()
+                ReadSessionLocal.configure(bind=_read_engine)
+    return _read_engine
+
+
+def _create_engine() -> Engine:
+    is_sqlite = _url.get_backend_name() == "sqlite"
+    connect_args = {"check_same_thread": False}  # Только для SQLite
+    if read_split_enabled:
+        connect_args["factory"] = _WriterConnection
+    engine = create_engine(
+        settings.DATABASE_URL,
+        connect_args=connect_args if is_sqlite else {},
+    )
+    if is_sqlite:
+        _install_statement_timeout(engine)
+
+        if settings.DATABASE_JOURNAL_MODE and _url.database not in (None, "", ":memory:"):
+            @event.listens_for(engine, "connect")
+            def _set_journal_mode(dbapi_connection, connection_record):
+                # Режим хранится в файле БД; WAL: чтение (и горячий бэкап)
+                # не блокирует запись. Архив остаётся в своём режиме.
+                dbapi_connection.execute(f"PRAGMA main.journal_mode={settings.DATABASE_JOURNAL_MODE}")
+                if settings.DATABASE_JOURNAL_MODE.lower() == "wal":
+                    dbapi_connection.execute("PRAGMA main.synchronous=NORMAL")
+
+    if read_split_enabled:
+        @event.listens_for(engine, "before_cursor_execute")
+        def _enter_write_queue(conn, cursor, statement, parameters, context, executemany):
+            dbapi_connection = conn.connection.dbapi_connection
+            if not dbapi_connection.holds_write_queue and WRITE_STATEMENT.match(statement):
+                write_queue.acquire()
+                dbapi_connection.holds_write_queue = True
+                # Таймаут запроса — на сам запрос, ожидание очереди ограничено своим таймаутом
+                _start_deadline()
+
+    if archive_enabled:
+        @event.listens_for(engine, "connect")
+        def _attach_archive(dbapi_connection, connection_record):
+            dbapi_connection.execute(
+                f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}",
+                (settings.ARCHIVE_DATABASE_PATH,)
+            )
+    return engine
+
+
+def _read_only_uri(path: str) -> str:
+    return f"file:{os.path.abspath(path)}?mode=ro"
+
+
+def _create_read_engine() -> Engine:
+    engine = create_engine(
+        "sqlite://",
+        creator=lambda: sqlite3.connect(
+            _read_only_uri(_url.database), uri=True, check_same_thread=False
+        ),
+        poolclass=QueuePool,
+        pool_size=settings.DB_READ_POOL_SIZE,
+        max_overflow=settings.DB_READ_POOL_SIZE,
+    )
+    _install_statement_timeout(engine)
+
+    @event.listens_for(engine, "connect")
+    def _read_only(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA query_only = 1")
+        if archive_enabled:
+            dbapi_connection.execute(
+                f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}",
+                (_read_only_uri(settings.ARCHIVE_DATABASE_PATH),)
+            )
+    return engine
+
+
+def _install_statement_timeout(engine: Engine) -> None:
+    @event.listens_for(engine, "connect")
+    def _install_progress_handler(dbapi_connection, connection_record):
+        dbapi_connection.set_progress_handler(_statement_expired, PROGRESS_HANDLER_STEPS)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_statement(conn, cursor, statement, parameters, context, executemany):
+        # Дедлайн действует и на выборку строк после execute
+        _start_deadline()
+
+
+def _start_deadline() -> None:
+    timeout = statement_timeout.get()
+    _statement_deadline.set(time.monotonic() + timeout if timeout else None)
+
+
+def _statement_expired() -> int:
+    deadline = _statement_deadline.get()
+    return 1 if deadline is not None and time.monotonic() > deadline else 0
+
+
+class _LazySessionmaker(sessionmaker):
+    """sessionmaker, который создаёт движок при первой сессии"""
+
+    def __init__(self, engine_getter, **kw):
+        super().__init__(**kw)
+        self.engine_getter = engine_getter
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.engine_getter()
+        return super().__call__(**local_kw)
+
+
+# Сессии записи и чтения
+SessionLocal = _LazySessionmaker(get_engine, autocommit=False, autoflush=False)
+ReadSessionLocal = _LazySessionmaker(get_read_engine, autocommit=False, autoflush=False)
 
 # Базовый класс для моделей
 Base = declarative_base()
 
 
 def get_db():
-    """Dependency для получения сессии БД"""
+    """Dependency для получения сессии БД (запись)"""
     db = SessionLocal()
     try:
         yield db
@@ -31,6 +308,10 @@ def get_db():
         db.close()
 
 
-def init_db():
-    """Создать таблицы"""
-    Base.metadata.create_all(bind=engine)
+def get_read_db():
+    """Dependency для эндпоинтов, которые только читают"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,59 @@
+"""
+Применение feedback к посту
+
+Общая логика для REST (/api/posts/{id}/feedback) и вебхука Telegram:
+смена статуса, запись feedback, агрегаты платформы и версии промпта.
+Сначала выполняется переход статуса (compare-and-set), затем запись
+feedback. Feedback записывается всегда — оценки и причины отклонения
+второго ревьюера тоже нужны для обучения: если пост уже в целевом
+статусе или переход из текущего не разрешён
+(transitions.ALLOWED_TRANSITIONS — например, feedback на
+опубликованный пост), статус не меняется. 400 — только для статуса,
+которого нет в PostStatus; 409 — статус сменили одновременно.
+"""
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from . import changes, platform_stats, prompts
+from .models import Feedback, Post, PostStatus
+from .schemas import FeedbackCreate
+from .transitions import ALLOWED_TRANSITIONS, parse_status, transition
+
+# Статус поста после feedback
+FEEDBACK_TRANSITIONS = {
+    "approved": PostStatus.SCHEDULED,
+    "rejected": PostStatus.REJECTED,
+    "edited": PostStatus.SCHEDULED,
+}
+
+
+def apply_feedback(
+    db: Session, post: Post, data: FeedbackCreate, idempotency_key: Optional[str] = None
+) -> Feedback:
+    """Записать feedback и обновить пост (без commit)"""
+    platform = post.platform
+    prompt_version = post.prompt_version
+
+    current = parse_status(post.status)
+    target = FEEDBACK_TRANSITIONS.get(data.feedback_type)
+    if target is not None:
+        if current != target and target in ALLOWED_TRANSITIONS[current]:
+            transition(db, post.id, target, expected=current)
+
+    feedback = Feedback(post_id=post.id, idempotency_key=idempotency_key, **data.model_dump())
+    db.add(feedback)
+    db.flush()
+    changes.record(db, changes.FEEDBACK, feedback.id, changes.CREATED, {
+        "post_id": post.id, "feedback_type": data.feedback_type
+    })
+
+    platform_stats.on_feedback(db, platform, data.feedback_type)
+    if prompt_version:
+        prompts.record_feedback(db, prompt_version, data.feedback_type)
+    if data.feedback_type == "edited" and data.edited_content and current != PostStatus.PUBLISHED:
+        # При редактировании обновляем и контент (опубликованный текст не трогаем —
+        # правка остаётся в feedback.edited_content)
+        post.content = data.edited_content
+        changes.record(db, changes.POST, post.id, changes.UPDATED, {"fields": ["content"]})
+    return feedback
@@ -0,0 +1,148 @@
+"""
+Idempotency-Key для мутирующих эндпоинтов
+
+Клиент (агент) при повторе после таймаута шлёт тот же заголовок
+Idempotency-Key — запрос выполняется один раз:
+- в памяти процесса — ограниченный LRU с TTL: ключ -> (отпечаток запроса,
+  статус, тело ответа). Повтор получает сохранённый ответ с заголовком
+  Idempotent-Replayed: true, без обращения к БД;
+- одновременные повторы ждут первый запрос (Event), а не выполняются
+  параллельно; если первый упал, выполнение берёт следующий;
+- в БД — уникальная колонка idempotency_key у создаваемой строки
+  (posts, feedback, agent_decisions). Она ловит повторы из других
+  воркеров и после вытеснения из памяти: эндпоинт находит строку по
+  ключу и возвращает её.
+
+Сохраняются только успешные ответы: после ошибки клиент может повторить
+запрос с тем же ключом. Тот же ключ с другим телом — 422.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from fastapi import Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from .config import get_settings
+
+settings = get_settings()
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def idempotency_key(
+    key: Optional[str] = Header(default=None, alias=HEADER, min_length=1, max_length=100)
+) -> Optional[str]:
+    """Зависимость: значение заголовка Idempotency-Key"""
+    return key
+
+
+def fingerprint(*parts: Any) -> str:
+    """Отпечаток запроса: тот же ключ с другим запросом — ошибка клиента"""
+    payload = json.dumps(jsonable_encoder(parts), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Сохранённые ответы по ключу (LRU + TTL) и выполняющиеся запросы"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, wait_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, fingerprint, status, body)
+        self._inflight: dict = {}                   # key -> (fingerprint, Event)
+
+    def run(self, key: str, request_fingerprint: str, status_code: int, handler: Callable[[], Any]) -> Any:
+        """
+        handler() — один раз на ключ. Повтор — JSONResponse с сохранённым ответом.
+        Вызывается из потока (sync-эндпоинт): ожидание блокирует только его.
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            with self._lock:
+                entry = self._get(key)
+                if entry is not None:
+                    return self._replay(entry, request_fingerprint)
+                inflight = self._inflight.get(key)
+                if inflight is None:
+                    done = threading.Event()
+                    self._inflight[key] = (request_fingerprint, done)
+                    break
+            waiting_for, done = inflight
+            if waiting_for != request_fingerprint:
+                raise _mismatch()
+            if not done.wait(max(0.0, deadline - time.monotonic())):
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Request with this {HEADER} is still in progress"
+                )
+
+        try:
+            result = handler()
+            body = jsonable_encoder(result)
+            with self._lock:
+                self._entries[key] = (
+                    time.monotonic() + self.ttl_seconds, request_fingerprint, status_code, body
+                )
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            done.set()
+
+    def _get(self, key: str):
+        """Запись по ключу (под self._lock); просроченная удаляется"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    @staticmethod
+    def _replay(entry, request_fingerprint: str) -> JSONResponse:
+        _, stored_fingerprint, status_code, body = entry
+        if stored_fingerprint != request_fingerprint:
+            raise _mismatch()
+        return JSONResponse(status_code=status_code, content=body, headers={REPLAYED_HEADER: "true"})
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _mismatch() -> HTTPException:
+    return HTTPException(
+        status_code=422,
+        detail=f"{HEADER} was already used with a different request"
+    )
+
+
+store = IdempotencyStore(
+    settings.IDEMPOTENCY_MAX_ENTRIES,
+    settings.IDEMPOTENCY_TTL_SECONDS,
+    settings.IDEMPOTENCY_WAIT_SECONDS,
+)
+
+
+def run(scope: str, key: Optional[str], request: Any, status_code: int, handler: Callable[[], Any]) -> Any:
+    """
+    Выполнить handler с учётом Idempotency-Key.
+    scope — эндпоинт (ключи разных эндпоинтов не пересекаются),
+    request — всё, что определяет запрос (тело, параметры пути).
+    """
+    if key is None:
+        return handler()
+    return store.run(f"{scope}:{key}", fingerprint(scope, request), status_code, handler)
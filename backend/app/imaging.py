@@ -0,0 +1,56 @@
+"""
+Обработка картинок (выполняется в пуле процессов)
+
+Модуль намеренно не импортирует ничего из приложения: дочерним
+процессам нужен только Pillow. Pillow импортируется внутри функций,
+чтобы API стартовал и без него, пока картинки не нужны.
+"""
+import os
+from typing import Dict
+
+
+def process_image(src_path: str, variants: Dict[int, str], quality: int) -> dict:
+    """
+    Проверить оригинал и построить WebP-варианты.
+    variants — {ширина: путь}. Возвращает mime_type, width, height.
+    Невалидная картинка — ValueError.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(src_path) as image:
+            image.load()
+            info = {
+                "mime_type": Image.MIME.get(image.format, "application/octet-stream"),
+                "width": image.width,
+                "height": image.height,
+            }
+            for width, path in variants.items():
+                _save_variant(image, width, path, quality)
+    except (UnidentifiedImageError, OSError) as exc:
+        raise ValueError(f"Invalid image: {exc}") from None
+    return info
+
+
+def make_variants(src_path: str, variants: Dict[int, str], quality: int) -> None:
+    """Построить недостающие варианты для уже проверенного оригинала"""
+    from PIL import Image
+
+    with Image.open(src_path) as image:
+        image.load()
+        for width, path in variants.items():
+            _save_variant(image, width, path, quality)
+
+
+def _save_variant(image, width: int, path: str, quality: int) -> None:
+    from PIL import Image
+
+    variant = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    if variant.width > width:
+        height = max(1, round(variant.height * width / variant.width))
+        variant = variant.resize((width, height), Image.LANCZOS)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    variant.save(tmp_path, "WEBP", quality=quality, method=4)
+    os.replace(tmp_path, path)
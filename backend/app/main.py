@@ -1,79 +1,144 @@
 """
 SMM Dashboard Backend — FastAPI Application
+
+Приложение собирается в create_app() при первом обращении к app.main.app
+(так его получает uvicorn "app.main:app"). Сам импорт модуля ничего не
+загружает: роутеры, модели, движок БД и фоновые подсистемы импортируются
+только при сборке приложения и в lifespan.
 """
+import threading
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
 
 from .config import get_settings
-from .database import init_db
-from .routers import posts, agent
-
-settings = get_settings()
 
 
 @asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Lifecycle: создаём таблицы при старте"""
-    init_db()
+async def lifespan(app):
+    """Lifecycle: миграции схемы при старте, сброс буферов при остановке"""
+    from . import media, platform_stats, rollback
+    from .audit_buffer import audit_buffer
+    from .backup import backup_worker
+    from .circuit_breaker import circuit_breaker
+    from .database import SessionLocal
+    from .migrations import migrate
+    from .rejections import classifier_worker
+    from .retention import retention_worker
+    from .workers import STARTUP_LOCK, file_lock
+
+    # При нескольких воркерах миграции и начальные данные выполняет первый,
+    # остальные ждут блокировку и находят всё готовым
+    with file_lock(STARTUP_LOCK):
+        migrate()
+        with SessionLocal() as db:
+            platform_stats.ensure_built(db)
+            rollback.ensure_baseline(db)
+    circuit_breaker.load()
+    audit_buffer.start()
+    retention_worker.start()
+    backup_worker.start()
+    classifier_worker.start()
+    if get_settings().CALIBRATION_PRELOAD:
+        # numpy и история feedback загружаются в фоне, старт их не ждёт
+        threading.Thread(target=_preload_calibration, name="calibration-preload", daemon=True).start()
     yield
+    classifier_worker.stop()
+    backup_worker.stop()
+    retention_worker.stop()
+    audit_buffer.stop()
+    if not circuit_breaker.shared:
+        # Общее состояние уже записано при изменении, снимок процесса может быть старым
+        circuit_breaker.save()
+    media.shutdown()
+    if get_settings().TRACE_PATH:
+        from .tracing import recorder
+
+        recorder.close()
+
+
+def _preload_calibration():
+    from .calibration import preload
+
+    preload()
+
+
+def create_app():
+    """Собрать FastAPI-приложение"""
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from sqlalchemy.exc import OperationalError
+
+    from .admission import AdmissionMiddleware, on_statement_timeout, on_write_queue_timeout
+    from .compression import CompressionMiddleware, Compressor
+    from .database import WriteQueueTimeout
+    from .routers import agent, changes, media, plan, posts, system, telegram
+
+    settings = get_settings()
+
+    app = FastAPI(
+        title="SMM Dashboard API",
+        description="API для управления SMM агентом СБОРКА",
+        version="1.0.0",
+        lifespan=lifespan
+    )
+
+    # Лимиты и сброс нагрузки (внутри CORS: отказы тоже с CORS-заголовками)
+    app.add_middleware(
+        AdmissionMiddleware,
+        heavy_paths=tuple(settings.ADMISSION_HEAVY_PATHS),
+        exempt_paths=tuple(settings.ADMISSION_EXEMPT_PATHS),
+    )
+    app.add_exception_handler(OperationalError, on_statement_timeout)
+    app.add_exception_handler(WriteQueueTimeout, on_write_queue_timeout)
+
+    # CORS для фронтенда
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Сжатие ответов (zstd / br / gzip по Accept-Encoding)
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        thread_min_size=settings.COMPRESSION_THREAD_MIN_SIZE,
+        cacheable_paths=tuple(settings.COMPRESSION_CACHEABLE_PATHS),
+        cache_max_bytes=settings.COMPRESSION_CACHE_MAX_BYTES,
+        compressor=Compressor(
+            gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+            brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+            zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+        ),
+    )
+
+    if settings.TRACE_PATH:
+        from .tracing import TraceMiddleware, recorder
+
+        # Снаружи всех: время и размер ответа — как их видит клиент
+        app.add_middleware(TraceMiddleware, recorder=recorder, max_body_bytes=settings.TRACE_MAX_BODY_BYTES)
+
+    # Подключаем роутеры
+    app.include_router(system.router)
+    app.include_router(posts.router)
+    app.include_router(agent.router)
+    app.include_router(media.router)
+    app.include_router(plan.router)
+    app.include_router(telegram.router)
+    app.include_router(changes.router)
+
+    return app
+
+
+_app = None
 
 
-app = FastAPI(
-    title="SMM Dashboard API",
-    description="API для управления SMM агентом СБОРКА",
-    version="1.0.0",
-    lifespan=lifespan
-)
-
-# CORS для фронтенда
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Подключаем роутеры
-app.include_router(posts.router)
-app.include_router(agent.router)
-
-
-@app.get("/")
-def root():
-    """Корневой эндпоинт"""
-    return {
-        "name": "SMM Dashboard API",
-        "version": "1.0.0",
-        "status": "running"
-    }
-
-
-@app.get("/api/health")
-def health_check():
-    """Проверка здоровья API"""
-    return {"status": "ok"}
-
-
-@app.get("/api/metrics/health")
-def get_health_metrics():
-    """Метрики здоровья контент-плана (mock data)"""
-    return {
-        "plan_completion": 0.77,
-        "buffer_days": 5,
-        "empty_slots_week": 2,
-        "posts_by_status": {
-            "idea": 5,
-            "draft": 3,
-            "review": 2,
-            "scheduled": 7,
-            "published": 23
-        },
-        "posts_by_platform": {
-            "telegram": 12,
-            "linkedin": 8,
-            "vk": 6,
-            "twitter": 4
-        }
-    }
+def __getattr__(name: str):
+    """app.main.app — приложение собирается при первом обращении"""
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,336 @@
+"""
+Картинки постов: генерация, загрузка, локальное хранилище
+
+- Файлы лежат в MEDIA_ROOT по SHA256 содержимого: одинаковые картинки
+  хранятся один раз, URL неизменяем и кэшируется клиентом навсегда.
+- Промпт генерации тоже хэшируется: повторный запрос с тем же промптом
+  возвращает готовую картинку, а одновременные одинаковые запросы
+  ждут одну генерацию.
+- Проверка картинки и WebP-варианты (MEDIA_THUMBNAIL_WIDTHS) строятся
+  в пуле процессов, чтобы не занимать event loop.
+- Обращения к БД из async-функций идут через run_in_threadpool: первая
+  запись транзакции ждёт очередь записи (database.write_queue), и
+  ожидание в event loop остановило бы все корутины.
+- URL от клиента (/ingest) скачивается только по http(s) с публичных
+  адресов (и с MEDIA_INGEST_ALLOWED_HOSTS, если список задан);
+  редиректы проверяются так же, адреса — и при подключении.
+"""
+import asyncio
+import hashlib
+import ipaddress
+import os
+import re
+import socket
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote, urljoin, urlsplit
+
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import changes, imaging
+from .config import get_settings
+from .models import ImagePrompt, MediaAsset, Post
+
+settings = get_settings()
+
+HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+URL_PREFIX = "/api/images"
+MAX_REDIRECTS = 3
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class MediaError(HTTPException):
+    """Ошибка загрузки или обработки картинки"""
+
+
+# ───────────────────────────────────────────────
+# Хранилище
+# ───────────────────────────────────────────────
+
+class MediaStore:
+    """Файлы по хэшу: originals/ab/<hash>, variants/ab/<hash>_w<width>.webp"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def original_path(self, digest: str) -> Path:
+        return self.root / "originals" / digest[:2] / digest
+
+    def variant_path(self, digest: str, width: int) -> Path:
+        return self.root / "variants" / digest[:2] / f"{digest}_w{width}.webp"
+
+    def write(self, data: bytes) -> tuple:
+        """Сохранить байты, вернуть (hash, записан ли новый файл)"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.original_path(digest)
+        if path.exists():
+            return digest, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{digest}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        return digest, True
+
+
+store = MediaStore(settings.MEDIA_ROOT)
+
+
+def is_valid_hash(digest: str) -> bool:
+    return bool(HASH_RE.match(digest))
+
+
+def asset_urls(digest: str) -> dict:
+    return {
+        "image_url": f"{URL_PREFIX}/{digest}",
+        "thumbnails": {
+            width: f"{URL_PREFIX}/{digest}/w{width}.webp"
+            for width in settings.MEDIA_THUMBNAIL_WIDTHS
+        },
+    }
+
+
+# ───────────────────────────────────────────────
+# Пул процессов
+# ───────────────────────────────────────────────
+
+_pool = None
+
+
+def _get_pool():
+    """Пул создаётся при первой картинке (процессы и импорт — только по делу)"""
+    global _pool
+    if _pool is None:
+        from concurrent.futures import ProcessPoolExecutor
+
+        _pool = ProcessPoolExecutor(max_workers=settings.MEDIA_PROCESS_WORKERS)
+    return _pool
+
+
+async def _run_in_pool(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), func, *args)
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
+
+
+# ───────────────────────────────────────────────
+# Загрузка и обработка
+# ───────────────────────────────────────────────
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def check_public_url(url: str) -> None:
+    """URL от клиента: http(s), разрешённый хост, все адреса публичные (защита от SSRF)"""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise MediaError(status_code=400, detail="Only http(s) image URLs are allowed")
+    host = parts.hostname.lower().rstrip(".")
+    allowed = settings.MEDIA_INGEST_ALLOWED_HOSTS
+    if allowed and not any(host == h or host.endswith("." + h) for h in allowed):
+        raise MediaError(status_code=400, detail="Image host is not allowed")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError):
+        raise MediaError(status_code=400, detail="Image host cannot be resolved")
+    if not addresses or not all(_is_public(info[4][0]) for info in addresses):
+        raise MediaError(status_code=400, detail="Image host resolves to a non-public address")
+
+
+def _public_connector():
+    """Коннектор, который не подключается к непубличным адресам (повторный DNS-ответ)"""
+    import aiohttp
+    from aiohttp.resolver import DefaultResolver
+
+    class PublicResolver(DefaultResolver):
+        async def resolve(self, host, port=0, family=socket.AF_INET):
+            hosts = await super().resolve(host, port, family)
+            if not all(_is_public(entry["host"]) for entry in hosts):
+                raise OSError(f"{host} resolves to a non-public address")
+            return hosts
+
+    return aiohttp.TCPConnector(resolver=PublicResolver())
+
+
+async def fetch_image(url: str, public_only: bool = False) -> bytes:
+    """
+    Скачать картинку (aiohttp импортируется только здесь).
+    public_only — URL от клиента: проверка check_public_url на каждом редиректе.
+    """
+    import aiohttp
+
+    timeout = aiohttp.ClientTimeout(total=settings.IMAGE_GENERATION_TIMEOUT_SECONDS)
+    connector = _public_connector() if public_only else None
+    try:
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            for _ in range(MAX_REDIRECTS + 1):
+                if public_only:
+                    await check_public_url(url)
+                async with session.get(url, allow_redirects=not public_only) as response:
+                    if public_only and response.status in REDIRECT_STATUSES and "Location" in response.headers:
+                        url = urljoin(url, response.headers["Location"])
+                        continue
+                    if response.status != 200:
+                        raise MediaError(status_code=502, detail=f"Image source returned {response.status}")
+                    data = bytearray()
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        data.extend(chunk)
+                        if len(data) > settings.MEDIA_MAX_BYTES:
+                            raise MediaError(status_code=413, detail="Image is too large")
+                    return bytes(data)
+            raise MediaError(status_code=502, detail="Too many redirects")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        raise MediaError(status_code=502, detail=f"Image download failed: {exc}")
+
+
+async def _store_bytes(data: bytes, source_url: Optional[str] = None) -> dict:
+    """Записать файл и построить варианты; без обращения к БД"""
+    if len(data) > settings.MEDIA_MAX_BYTES:
+        raise MediaError(status_code=413, detail="Image is too large")
+
+    digest, created = store.write(data)
+    variants = {
+        width: str(store.variant_path(digest, width))
+        for width in settings.MEDIA_THUMBNAIL_WIDTHS
+    }
+    try:
+        info = await _run_in_pool(
+            imaging.process_image, str(store.original_path(digest)), variants,
+            settings.MEDIA_WEBP_QUALITY
+        )
+    except ValueError as exc:
+        if created:
+            store.original_path(digest).unlink(missing_ok=True)
+        raise MediaError(status_code=400, detail=str(exc))
+
+    info.update(content_hash=digest, size_bytes=len(data), source_url=source_url)
+    return info
+
+
+def _save_asset(db: Session, info: dict) -> MediaAsset:
+    db.execute(insert(MediaAsset).values(**info).on_conflict_do_nothing())
+    db.flush()
+    return db.get(MediaAsset, info["content_hash"])
+
+
+def _stored_asset(db: Session, digest: str) -> Optional[MediaAsset]:
+    """Запись, файл которой на месте (в потоке пула)"""
+    asset = db.get(MediaAsset, digest)
+    return asset if asset is not None and store.original_path(digest).exists() else None
+
+
+def _commit_asset(db: Session, info: dict, prompt: Optional[str] = None) -> MediaAsset:
+    """Записать картинку (и промпт генерации) с commit (в потоке пула)"""
+    asset = _save_asset(db, info)
+    if prompt is not None:
+        db.merge(ImagePrompt(prompt_hash=prompt_hash(prompt), prompt=prompt, content_hash=asset.content_hash))
+    db.commit()
+    # После commit атрибуты просрочены: перечитать здесь, а не из event loop
+    db.refresh(asset)
+    return asset
+
+
+async def ingest(db: Session, data: bytes, source_url: Optional[str] = None) -> MediaAsset:
+    """Добавить картинку в хранилище (с commit); повтор — та же запись"""
+    digest = hashlib.sha256(data).hexdigest()
+    asset = await run_in_threadpool(_stored_asset, db, digest)
+    if asset is not None:
+        return asset
+    info = await _store_bytes(data, source_url)
+    return await run_in_threadpool(_commit_asset, db, info)
+
+
+# ───────────────────────────────────────────────
+# Генерация
+# ───────────────────────────────────────────────
+
+_inflight: dict = {}
+
+
+def build_prompt(topic: str) -> str:
+    return f"{topic.strip()}. Minimalist illustration for a social media post, no text"
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+async def generate(db: Session, topic: str) -> tuple:
+    """
+    Сгенерировать картинку по теме (с commit).
+    Возвращает (asset, prompt, cached).
+    """
+    prompt = build_prompt(topic)
+    key = prompt_hash(prompt)
+
+    asset = await run_in_threadpool(_generated_asset, db, key)
+    if asset is not None:
+        return asset, prompt, True
+
+    # Одинаковые одновременные запросы ждут одну генерацию
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_generate_file(prompt))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    info = await asyncio.shield(task)
+
+    asset = await run_in_threadpool(_commit_asset, db, info, prompt)
+    return asset, prompt, False
+
+
+def _generated_asset(db: Session, key: str) -> Optional[MediaAsset]:
+    known = db.get(ImagePrompt, key)
+    return _stored_asset(db, known.content_hash) if known is not None else None
+
+
+async def _generate_file(prompt: str) -> dict:
+    url = settings.IMAGE_GENERATION_URL.format(prompt=quote(prompt, safe=""))
+    return await _store_bytes(await fetch_image(url), source_url=url)
+
+
+def attach_to_post(db: Session, post_id: int, asset: MediaAsset, prompt: Optional[str] = None) -> None:
+    """Проставить посту картинку из хранилища (с commit; из async — через run_in_threadpool)"""
+    values = {"image_url": asset_urls(asset.content_hash)["image_url"]}
+    if prompt is not None:
+        values["image_prompt"] = prompt
+    updated = db.execute(
+        update(Post).where(Post.id == post_id).values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        raise MediaError(status_code=404, detail="Post not found")
+    changes.record(db, changes.POST, post_id, changes.UPDATED, {"fields": sorted(values)})
+    db.commit()
+    db.refresh(asset)
+
+
+# ───────────────────────────────────────────────
+# Отдача
+# ───────────────────────────────────────────────
+
+async def variant_file(digest: str, width: int) -> Path:
+    """Путь к WebP-варианту; если его нет (сменились ширины) — построить"""
+    path = store.variant_path(digest, width)
+    if path.exists():
+        return path
+    original = store.original_path(digest)
+    if not original.exists():
+        raise MediaError(status_code=404, detail="Image not found")
+    await _run_in_pool(
+        imaging.make_variants, str(original), {width: str(path)}, settings.MEDIA_WEBP_QUALITY
+    )
+    return path
@@ -0,0 +1,347 @@
+"""
+Версионные миграции схемы SQLite
+
+Версия схемы хранится в PRAGMA user_version (заголовок файла БД),
+поэтому при старте достаточно прочитать одно число: если оно равно
+последней версии, таблицы не инспектируются. Архивная БД
+(ATTACH ... AS archive) версионируется отдельно своим user_version.
+
+Каждая миграция выполняется в своей транзакции вместе с записью версии:
+прерванный запуск продолжится с первой невыполненной миграции.
+Миграции идемпотентны — старые БД, созданные через create_all, могут
+уже содержать часть таблиц, колонок и индексов.
+
+Индексы создаются через CREATE INDEX IF NOT EXISTS, по одному на
+транзакцию: SQLite на время построения блокирует только запись, и
+блокировка не держится дольше, чем строится один индекс.
+
+    python -m app.migrations           # применить
+    python -m app.migrations --status  # только показать версии
+"""
+import argparse
+import logging
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy.engine import Connection, Engine
+
+from .database import ARCHIVE_SCHEMA, Base, archive_enabled, get_engine
+from .models import (
+    AgentDecision, AgentSnapshot, AgentState, ChangeLogEntry, DecisionDailyRollup,
+    Feedback, ImagePrompt, LearningEvent, LearningEventDailyRollup, MediaAsset,
+    PlatformDailyStat, PlatformStatusCount, PlatformSummary, Post,
+    PromptContent, PromptVersion, RejectionClassifier, TelegramUpdate,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+# ───────────────────────────────────────────────
+# Помощники (идемпотентные)
+# ───────────────────────────────────────────────
+
+def create_tables(conn: Connection, *models) -> None:
+    for model in models:
+        model.__table__.create(conn, checkfirst=True)
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str, schema: str = "main") -> None:
+    """ALTER TABLE ADD COLUMN, если колонки ещё нет"""
+    existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA {schema}.table_info({table})")}
+    if column not in existing:
+        conn.exec_driver_sql(f"ALTER TABLE {schema}.{table} ADD COLUMN {column} {ddl}")
+
+
+# Строка -> доля: "0.85", "85%", "85" (больше 1 — проценты), high/medium/low
+PROBABILITY_SQL = (
+    "CASE"
+    " WHEN SUBSTR({value}, -1) = '%' THEN CAST(RTRIM({value}, '%') AS REAL) / 100"
+    " WHEN LOWER({value}) = 'high' THEN 0.9"
+    " WHEN LOWER({value}) = 'medium' THEN 0.6"
+    " WHEN LOWER({value}) = 'low' THEN 0.3"
+    " WHEN {value} NOT GLOB '*[0-9]*' THEN NULL"
+    " WHEN CAST({value} AS REAL) > 1 THEN CAST({value} AS REAL) / 100"
+    " ELSE CAST({value} AS REAL) END"
+)
+
+
+def to_real(conn: Connection, table: str, column: str, schema: str = "main") -> None:
+    """
+    Перевести текстовую колонку с долей (0..1) в FLOAT.
+    SQLite не меняет тип колонки, поэтому: переименовать, добавить
+    новую, перенести значения через PROBABILITY_SQL, удалить старую.
+    """
+    types = {row[1]: row[2].upper() for row in conn.exec_driver_sql(f"PRAGMA {schema}.table_info({table})")}
+    if types.get(column, "FLOAT") in ("FLOAT", "REAL"):
+        return
+    legacy = f"{column}_text"
+    conn.exec_driver_sql(f"ALTER TABLE {schema}.{table} RENAME COLUMN {column} TO {legacy}")
+    conn.exec_driver_sql(f"ALTER TABLE {schema}.{table} ADD COLUMN {column} FLOAT")
+    conn.exec_driver_sql(
+        f"UPDATE {schema}.{table} SET {column} = {PROBABILITY_SQL.format(value=f'TRIM({legacy})')} "
+        f"WHERE {legacy} IS NOT NULL"
+    )
+    conn.exec_driver_sql(f"UPDATE {schema}.{table} SET {column} = NULL WHERE {column} NOT BETWEEN 0 AND 1")
+    conn.exec_driver_sql(f"ALTER TABLE {schema}.{table} DROP COLUMN {legacy}")
+
+
+def create_index(
+    conn: Connection, table: str, *columns: str, schema: str = "main", unique: bool = False,
+    name: Optional[str] = None, where: Optional[str] = None
+) -> None:
+    """Индекс ix_<таблица>_<колонки>; where — частичный индекс (тогда нужно своё name)"""
+    name = name or f"ix_{table}_{'_'.join(columns)}"
+    conn.exec_driver_sql(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {schema}.{name} ON {table} ({', '.join(columns)})"
+        + (f" WHERE {where}" if where else "")
+    )
+
+
+# ───────────────────────────────────────────────
+# Основная БД
+# ───────────────────────────────────────────────
+
+def _initial(conn: Connection) -> None:
+    create_tables(conn, Post, Feedback, PromptVersion, AgentDecision, LearningEvent)
+
+
+def _agent_state(conn: Connection) -> None:
+    create_tables(conn, AgentState)
+
+
+def _journal_rollups(conn: Connection) -> None:
+    create_tables(conn, DecisionDailyRollup, LearningEventDailyRollup)
+
+
+def _journal_created_at_indexes(conn: Connection) -> None:
+    create_index(conn, "agent_decisions", "created_at")
+
+
+def _learning_created_at_index(conn: Connection) -> None:
+    create_index(conn, "learning_events", "created_at")
+
+
+def _platform_rollups(conn: Connection) -> None:
+    create_tables(conn, PlatformStatusCount, PlatformDailyStat, PlatformSummary)
+
+
+def _prompt_store(conn: Connection) -> None:
+    create_tables(conn, PromptContent)
+    add_column(conn, "prompt_versions", "traffic_weight", "INTEGER DEFAULT 0")
+    add_column(conn, "prompt_versions", "feedback_total", "INTEGER DEFAULT 0")
+    add_column(conn, "prompt_versions", "feedback_approved", "INTEGER DEFAULT 0")
+    add_column(conn, "posts", "prompt_version", "VARCHAR(20)")
+
+
+def _prompt_version_indexes(conn: Connection) -> None:
+    create_index(conn, "posts", "prompt_version")
+
+
+def _prompt_content_hash_index(conn: Connection) -> None:
+    create_index(conn, "prompt_versions", "content_hash")
+
+
+def _agent_snapshots(conn: Connection) -> None:
+    create_tables(conn, AgentSnapshot)
+
+
+def _media(conn: Connection) -> None:
+    create_tables(conn, MediaAsset, ImagePrompt)
+
+
+def _post_schedule_index(conn: Connection) -> None:
+    create_index(conn, "posts", "platform", "scheduled_at")
+
+
+def _telegram_updates(conn: Connection) -> None:
+    create_tables(conn, TelegramUpdate)
+
+
+def _change_log(conn: Connection) -> None:
+    create_tables(conn, ChangeLogEntry)
+    create_index(conn, "change_log", "entity", "entity_id")
+
+
+def _numeric_confidence(conn: Connection) -> None:
+    to_real(conn, "feedback", "confidence_before")
+    to_real(conn, "agent_decisions", "confidence")
+    to_real(conn, "prompt_versions", "approval_rate_before")
+    to_real(conn, "prompt_versions", "approval_rate_after")
+
+
+def _idempotency_keys(conn: Connection) -> None:
+    # Уникальный индекс, а не UNIQUE в таблице: ADD COLUMN его не умеет; NULL не конфликтуют
+    for table in ("posts", "feedback", "agent_decisions"):
+        add_column(conn, table, "idempotency_key", "VARCHAR(100)")
+        create_index(conn, table, "idempotency_key", unique=True)
+
+
+def _rejection_classifier(conn: Connection) -> None:
+    create_tables(conn, RejectionClassifier)
+    add_column(conn, "feedback", "predicted_reason", "VARCHAR(100)")
+    add_column(conn, "feedback", "predicted_confidence", "FLOAT")
+    add_column(conn, "feedback", "predicted_by", "INTEGER")
+    # Очередь классификатора: отклонения с текстом, но без причины
+    create_index(
+        conn, "feedback", "id", name="ix_feedback_untagged_rejections",
+        where="feedback_type = 'rejected' AND rejection_reason IS NULL AND rejection_details IS NOT NULL",
+    )
+
+
+# Страницы журнала с фильтром по типу или исходу (audit.decision_page)
+
+def _decision_type_index(conn: Connection, schema: str = "main") -> None:
+    create_index(conn, "agent_decisions", "decision_type", "created_at", schema=schema)
+
+
+def _decision_outcome_index(conn: Connection, schema: str = "main") -> None:
+    create_index(conn, "agent_decisions", "outcome", "created_at", schema=schema)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial schema", _initial),
+    Migration(2, "agent_state", _agent_state),
+    Migration(3, "journal daily rollups", _journal_rollups),
+    Migration(4, "index agent_decisions.created_at", _journal_created_at_indexes),
+    Migration(5, "index learning_events.created_at", _learning_created_at_index),
+    Migration(6, "platform rollups", _platform_rollups),
+    Migration(7, "prompt content store and A/B columns", _prompt_store),
+    Migration(8, "index posts.prompt_version", _prompt_version_indexes),
+    Migration(9, "index prompt_versions.content_hash", _prompt_content_hash_index),
+    Migration(10, "agent snapshots", _agent_snapshots),
+    Migration(11, "media store", _media),
+    Migration(12, "index posts (platform, scheduled_at)", _post_schedule_index),
+    Migration(13, "telegram webhook updates", _telegram_updates),
+    Migration(14, "change log", _change_log),
+    Migration(15, "numeric confidence and approval rates", _numeric_confidence),
+    Migration(16, "idempotency keys", _idempotency_keys),
+    Migration(17, "rejection reason classifier", _rejection_classifier),
+    Migration(18, "index agent_decisions (decision_type, created_at)", _decision_type_index),
+    Migration(19, "index agent_decisions (outcome, created_at)", _decision_outcome_index),
+]
+
+
+# ───────────────────────────────────────────────
+# Архивная БД
+# ───────────────────────────────────────────────
+
+def _archive_tables(conn: Connection) -> None:
+    # Импорт здесь: копии таблиц архива строятся в retention
+    from .retention import archive_tables
+
+    for table in archive_tables.values():
+        table.create(conn, checkfirst=True)
+
+
+def _archive_numeric_confidence(conn: Connection) -> None:
+    to_real(conn, "agent_decisions", "confidence", schema=ARCHIVE_SCHEMA)
+
+
+def _archive_idempotency_key(conn: Connection) -> None:
+    # Без индекса: в архиве ключ только переносится, повторы ловит основная БД
+    add_column(conn, "agent_decisions", "idempotency_key", "VARCHAR(100)", schema=ARCHIVE_SCHEMA)
+
+
+def _archive_decision_type_index(conn: Connection) -> None:
+    _decision_type_index(conn, schema=ARCHIVE_SCHEMA)
+
+
+def _archive_decision_outcome_index(conn: Connection) -> None:
+    _decision_outcome_index(conn, schema=ARCHIVE_SCHEMA)
+
+
+ARCHIVE_MIGRATIONS: List[Migration] = [
+    Migration(1, "archive journal tables", _archive_tables),
+    Migration(2, "numeric agent_decisions.confidence", _archive_numeric_confidence),
+    Migration(3, "agent_decisions.idempotency_key", _archive_idempotency_key),
+    Migration(4, "index agent_decisions (decision_type, created_at)", _archive_decision_type_index),
+    Migration(5, "index agent_decisions (outcome, created_at)", _archive_decision_outcome_index),
+]
+
+
+# ───────────────────────────────────────────────
+# Применение
+# ───────────────────────────────────────────────
+
+def latest_version(migrations: List[Migration] = MIGRATIONS) -> int:
+    return migrations[-1].version if migrations else 0
+
+
+def current_version(conn: Connection, schema: str = "main") -> int:
+    return conn.exec_driver_sql(f"PRAGMA {schema}.user_version").scalar()
+
+
+def _apply(conn: Connection, migrations: List[Migration], schema: str) -> List[int]:
+    version = current_version(conn, schema)
+    conn.commit()  # закрыть транзакцию чтения, дальше — по транзакции на миграцию
+    applied = []
+    for migration in migrations:
+        if migration.version <= version:
+            continue
+        started = time.perf_counter()
+        try:
+            migration.apply(conn)
+            conn.exec_driver_sql(f"PRAGMA {schema}.user_version = {migration.version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info(
+            "Applied %s migration %d (%s) in %.1f ms", schema, migration.version,
+            migration.description, (time.perf_counter() - started) * 1000
+        )
+        applied.append(migration.version)
+    return applied
+
+
+def migrate(bind: Optional[Engine] = None) -> dict:
+    """
+    Привести схему к последней версии.
+    Если версии совпадают — только чтение user_version.
+    """
+    bind = bind or get_engine()
+    if bind.dialect.name != "sqlite":
+        Base.metadata.create_all(bind=bind)
+        return {"main": []}
+
+    result = {}
+    with bind.connect() as conn:
+        if current_version(conn) < latest_version():
+            result["main"] = _apply(conn, MIGRATIONS, "main")
+        if archive_enabled and current_version(conn, ARCHIVE_SCHEMA) < latest_version(ARCHIVE_MIGRATIONS):
+            result[ARCHIVE_SCHEMA] = _apply(conn, ARCHIVE_MIGRATIONS, ARCHIVE_SCHEMA)
+    return result
+
+
+def status(bind: Optional[Engine] = None) -> dict:
+    bind = bind or get_engine()
+    with bind.connect() as conn:
+        result = {"main": {"current": current_version(conn), "latest": latest_version()}}
+        if archive_enabled:
+            result[ARCHIVE_SCHEMA] = {
+                "current": current_version(conn, ARCHIVE_SCHEMA),
+                "latest": latest_version(ARCHIVE_MIGRATIONS),
+            }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схемы SMM Dashboard")
+    parser.add_argument("--status", action="store_true", help="только показать версии")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if not args.status:
+        migrate()
+    for schema, versions in status().items():
+        print(f"{schema}: {versions['current']} / {versions['latest']}")
+
+
+if __name__ == "__main__":
+    main()
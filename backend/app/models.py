@@ -1,8 +1,10 @@
 """
 SQLAlchemy модели
+
+Новые таблицы, колонки и индексы добавляются миграцией в migrations.py.
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, Enum
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime, Enum, LargeBinary
 import enum
 
 from .database import Base
@@ -48,12 +50,14 @@ class Post(Base):
     # AI генерация
     ai_prompt = Column(Text, nullable=True)
     ai_model = Column(String(50), nullable=True)
+    prompt_version = Column(String(20), nullable=True, index=True)  # A/B назначение
 
     # Планирование
     scheduled_at = Column(DateTime, nullable=True)
     published_at = Column(DateTime, nullable=True)
 
     # Метаданные
+    idempotency_key = Column(String(100), nullable=True, unique=True, index=True)  # Idempotency-Key создания
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -75,8 +79,8 @@ class Feedback(Base):
     # Тип feedback
     feedback_type = Column(String(20), nullable=False)  # approved, rejected, edited
 
-    # Уверенность агента до feedback
-    confidence_before = Column(String(10), nullable=True)
+    # Уверенность агента до feedback (0..1)
+    confidence_before = Column(Float, nullable=True)
 
     # Детали редактирования (если edited)
     original_content = Column(Text, nullable=True)
@@ -86,8 +90,14 @@ class Feedback(Base):
     rejection_reason = Column(String(100), nullable=True)
     rejection_details = Column(Text, nullable=True)
 
+    # Причина, предсказанная по rejection_details (если rejection_reason не задан)
+    predicted_reason = Column(String(100), nullable=True)
+    predicted_confidence = Column(Float, nullable=True)
+    predicted_by = Column(Integer, nullable=True)  # версия классификатора (rejection_classifiers.id)
+
     # Метаданные
     user_id = Column(String(100), nullable=True)  # Telegram user ID
+    idempotency_key = Column(String(100), nullable=True, unique=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     def __repr__(self):
@@ -100,25 +110,43 @@ class PromptVersion(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     version = Column(String(20), unique=True, nullable=False)  # v1.0.0
-    content_hash = Column(String(64), nullable=False)  # SHA256 of content
+    content_hash = Column(String(64), nullable=False, index=True)  # SHA256 of content -> prompt_contents
 
     # Почему изменён
     reason = Column(Text, nullable=True)
     author = Column(String(50), default="agent")  # agent / human
 
     # Метрики на момент изменения
-    approval_rate_before = Column(String(10), nullable=True)
-    approval_rate_after = Column(String(10), nullable=True)  # Заполняется позже
+    approval_rate_before = Column(Float, nullable=True)
+    approval_rate_after = Column(Float, nullable=True)  # Заполняется позже
 
     # Статус
     is_active = Column(Integer, default=0)  # 0 = inactive, 1 = active
 
+    # A/B: доля трафика и накопленный feedback по постам этой версии
+    traffic_weight = Column(Integer, default=0)
+    feedback_total = Column(Integer, default=0)
+    feedback_approved = Column(Integer, default=0)  # approved + edited
+
     created_at = Column(DateTime, default=datetime.utcnow)
 
     def __repr__(self):
         return f"<PromptVersion {self.version}: {'active' if self.is_active else 'inactive'}>"
 
 
+class PromptContent(Base):
+    """Тексты промптов, адресуемые по SHA256 (одинаковые тексты хранятся один раз)"""
+    __tablename__ = "prompt_contents"
+
+    content_hash = Column(String(64), primary_key=True)
+    body = Column(Text, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<PromptContent {self.content_hash[:12]}>"
+
+
 class AgentDecision(Base):
     """Решения агента (для аудита и мониторинга)"""
     __tablename__ = "agent_decisions"
@@ -130,7 +158,7 @@ class AgentDecision(Base):
 
     # Контекст решения
     autonomy_level = Column(Integer, default=2)
-    confidence = Column(String(10), nullable=True)
+    confidence = Column(Float, nullable=True)  # 0..1
 
     # Было ли выполнено
     action_taken = Column(Integer, default=0)  # 0 = no, 1 = yes
@@ -140,7 +168,8 @@ class AgentDecision(Base):
     outcome = Column(String(20), nullable=True)  # success, failure, pending
     outcome_details = Column(Text, nullable=True)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    idempotency_key = Column(String(100), nullable=True, unique=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
     def __repr__(self):
         return f"<AgentDecision {self.id}: {self.decision_type}>"
@@ -164,7 +193,188 @@ class LearningEvent(Base):
     prompt_version_before = Column(String(20), nullable=True)
     prompt_version_after = Column(String(20), nullable=True)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
     def __repr__(self):
         return f"<LearningEvent {self.id}: {self.event_type}>"
+
+
+# ═══════════════════════════════════════════════════
+# DAILY ROLLUPS (агрегаты строк, ушедших в архив)
+# ═══════════════════════════════════════════════════
+
+class DecisionDailyRollup(Base):
+    """Число решений агента за день по типу и исходу"""
+    __tablename__ = "decision_daily_rollups"
+
+    day = Column(String(10), primary_key=True)  # YYYY-MM-DD
+    decision_type = Column(String(50), primary_key=True)
+    outcome = Column(String(20), primary_key=True)  # "" если исхода нет
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DecisionDailyRollup {self.day} {self.decision_type}/{self.outcome}: {self.count}>"
+
+
+class LearningEventDailyRollup(Base):
+    """Число событий обучения за день по типу"""
+    __tablename__ = "learning_event_daily_rollups"
+
+    day = Column(String(10), primary_key=True)  # YYYY-MM-DD
+    event_type = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<LearningEventDailyRollup {self.day} {self.event_type}: {self.count}>"
+
+
+# ═══════════════════════════════════════════════════
+# PLATFORM ROLLUPS (обновляются инкрементально при записи)
+# ═══════════════════════════════════════════════════
+
+class PlatformStatusCount(Base):
+    """Число постов платформы в каждом статусе"""
+    __tablename__ = "platform_status_counts"
+
+    platform = Column(String(50), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class PlatformDailyStat(Base):
+    """Посты платформы по дням: создано и опубликовано"""
+    __tablename__ = "platform_daily_stats"
+
+    platform = Column(String(50), primary_key=True)
+    day = Column(String(10), primary_key=True)  # YYYY-MM-DD
+    created = Column(Integer, nullable=False, default=0)
+    published = Column(Integer, nullable=False, default=0)
+
+
+class PlatformSummary(Base):
+    """Сводка по платформе: публикации и feedback"""
+    __tablename__ = "platform_summaries"
+
+    platform = Column(String(50), primary_key=True)
+    published_total = Column(Integer, nullable=False, default=0)
+    first_published_at = Column(DateTime, nullable=True)
+    last_published_at = Column(DateTime, nullable=True)
+    feedback_total = Column(Integer, nullable=False, default=0)
+    feedback_approved = Column(Integer, nullable=False, default=0)  # approved + edited
+
+
+class AgentState(Base):
+    """Персистентное состояние агента (key -> JSON): circuit breaker и др."""
+    __tablename__ = "agent_state"
+
+    key = Column(String(50), primary_key=True)
+    value = Column(Text, nullable=True)  # JSON
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<AgentState {self.key}>"
+
+
+class AgentSnapshot(Base):
+    """Снимок состояния агента (промпт, правила, автономия, A/B) для отката"""
+    __tablename__ = "agent_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    label = Column(String(50), nullable=False, index=True)  # baseline, pre_rollback, manual
+    state = Column(Text, nullable=False)  # JSON
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<AgentSnapshot {self.id}: {self.label}>"
+
+
+class RejectionClassifier(Base):
+    """Обученный классификатор причин отклонения (id — версия)"""
+    __tablename__ = "rejection_classifiers"
+
+    id = Column(Integer, primary_key=True)
+    labels = Column(Text, nullable=False)       # JSON: список категорий
+    trained_rows = Column(Integer, nullable=False)
+    last_feedback_id = Column(Integer, nullable=False)  # последняя размеченная строка обучения
+    metrics = Column(Text, nullable=True)       # JSON: точность на отложенной выборке
+    weights = Column(LargeBinary, nullable=False)  # npz: словарь, idf, веса
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<RejectionClassifier v{self.id}>"
+
+
+# ═══════════════════════════════════════════════════
+# MEDIA (content-addressed хранилище картинок)
+# ═══════════════════════════════════════════════════
+
+class MediaAsset(Base):
+    """Картинка в локальном хранилище, ключ — SHA256 содержимого"""
+    __tablename__ = "media_assets"
+
+    content_hash = Column(String(64), primary_key=True)
+    mime_type = Column(String(50), nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    source_url = Column(String(1000), nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<MediaAsset {self.content_hash[:12]} {self.width}x{self.height}>"
+
+
+class ImagePrompt(Base):
+    """Промпт генерации -> картинка: одинаковые промпты не генерируются повторно"""
+    __tablename__ = "image_prompts"
+
+    prompt_hash = Column(String(64), primary_key=True)
+    prompt = Column(Text, nullable=False)
+    content_hash = Column(String(64), nullable=False, index=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ImagePrompt {self.prompt_hash[:12]} -> {self.content_hash[:12]}>"
+
+
+# ═══════════════════════════════════════════════════
+# TELEGRAM
+# ═══════════════════════════════════════════════════
+
+class TelegramUpdate(Base):
+    """Обработанный update вебхука Telegram: повторная доставка не применяется"""
+    __tablename__ = "telegram_updates"
+
+    update_id = Column(Integer, primary_key=True, autoincrement=False)
+    outcome = Column(String(100), nullable=True)  # applied, ignored, или причина отказа
+    received_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<TelegramUpdate {self.update_id}: {self.outcome}>"
+
+
+# ═══════════════════════════════════════════════════
+# CHANGE FEED
+# ═══════════════════════════════════════════════════
+
+class ChangeLogEntry(Base):
+    """Изменение сущности с глобальным номером seq (для /api/changes)"""
+    __tablename__ = "change_log"
+    # AUTOINCREMENT: seq не переиспользуется после компактации хвоста
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String(30), nullable=False)     # post, feedback, decision, ...
+    entity_id = Column(String(100), nullable=False)
+    op = Column(String(20), nullable=False)         # created, updated, deleted
+    data = Column(Text, nullable=True)              # JSON: что изменилось (подсказка клиенту)
+
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<ChangeLogEntry {self.seq}: {self.entity}:{self.entity_id} {self.op}>"
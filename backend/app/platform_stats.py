@@ -0,0 +1,219 @@
+"""
+Агрегаты по платформам
+
+Счётчики обновляются инкрементально в той же транзакции, что и запись
+поста или feedback, поэтому аналитика платформ читает O(платформ × дней)
+строк независимо от размера истории:
+- platform_status_counts — посты по статусам;
+- platform_daily_stats — создано / опубликовано по дням;
+- platform_summaries — публикации (первая, последняя, всего) и feedback.
+
+rebuild() пересчитывает всё с нуля — для существующих БД и проверки.
+Ответ platform_analytics кэшируется в пространстве CACHE_NAMESPACE,
+любое изменение агрегатов сбрасывает его после коммита.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .cache import invalidate_on_commit
+from .models import (
+    PlatformDailyStat, PlatformStatusCount, PlatformSummary, PostStatus
+)
+
+APPROVED_FEEDBACK = ("approved", "edited")
+CACHE_NAMESPACE = "platform_stats"
+
+
+def _bump(db: Session, model, keys: dict, **deltas) -> None:
+    """UPSERT: прибавить deltas к счётчикам строки keys"""
+    stmt = insert(model).values(**keys, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: getattr(model, name) + stmt.excluded[name] for name in deltas}
+    )
+    db.execute(stmt)
+    invalidate_on_commit(db, CACHE_NAMESPACE)
+
+
+# ───────────────────────────────────────────────
+# Хуки записи
+# ───────────────────────────────────────────────
+
+def on_post_created(db: Session, platform: str, status: str, at: Optional[datetime] = None) -> None:
+    day = (at or datetime.utcnow()).date().isoformat()
+    _bump(db, PlatformStatusCount, {"platform": platform, "status": status}, count=1)
+    _bump(db, PlatformDailyStat, {"platform": platform, "day": day}, created=1)
+
+
+def on_post_deleted(db: Session, platform: str, status: str) -> None:
+    _bump(db, PlatformStatusCount, {"platform": platform, "status": status}, count=-1)
+
+
+def on_platform_changed(db: Session, old: str, new: str, status: str) -> None:
+    _bump(db, PlatformStatusCount, {"platform": old, "status": status}, count=-1)
+    _bump(db, PlatformStatusCount, {"platform": new, "status": status}, count=1)
+
+
+def on_status_changed(
+    db: Session,
+    changes: Iterable[tuple],
+    to_status: str,
+    at: Optional[datetime] = None
+) -> None:
+    """changes — пары (platform, from_status), по одной на пост"""
+    at = at or datetime.utcnow()
+    for (platform, from_status), n in Counter(changes).items():
+        if from_status == to_status:
+            continue
+        _bump(db, PlatformStatusCount, {"platform": platform, "status": from_status}, count=-n)
+        _bump(db, PlatformStatusCount, {"platform": platform, "status": to_status}, count=n)
+        if to_status == PostStatus.PUBLISHED.value:
+            _record_published(db, platform, n, at)
+
+
+def _record_published(db: Session, platform: str, n: int, at: datetime) -> None:
+    _bump(db, PlatformDailyStat, {"platform": platform, "day": at.date().isoformat()}, published=n)
+
+    stmt = insert(PlatformSummary).values(
+        platform=platform, published_total=n,
+        first_published_at=at, last_published_at=at
+    )
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["platform"],
+        set_={
+            "published_total": PlatformSummary.published_total + excluded.published_total,
+            "first_published_at": func.coalesce(
+                PlatformSummary.first_published_at, excluded.first_published_at
+            ),
+            "last_published_at": excluded.last_published_at,
+        }
+    )
+    db.execute(stmt)
+
+
+def on_feedback(db: Session, platform: str, feedback_type: str) -> None:
+    approved = 1 if feedback_type in APPROVED_FEEDBACK else 0
+    _bump(db, PlatformSummary, {"platform": platform}, feedback_total=1, feedback_approved=approved)
+
+
+# ───────────────────────────────────────────────
+# Чтение
+# ───────────────────────────────────────────────
+
+def platform_analytics(db: Session, days: int = 30) -> list:
+    """Аналитика по всем платформам из агрегатов"""
+    today = datetime.utcnow().date()
+    since = today - timedelta(days=days - 1)
+    day_keys = [(since + timedelta(days=i)).isoformat() for i in range(days)]
+
+    platforms = {}
+
+    def entry(platform: str) -> dict:
+        if platform not in platforms:
+            platforms[platform] = {
+                "platform": platform,
+                "posts_total": 0,
+                "by_status": {},
+                "published_total": 0,
+                "last_published_at": None,
+                "cadence_days": None,
+                "approval_rate": None,
+                "feedback_total": 0,
+                "daily": {day: {"day": day, "created": 0, "published": 0} for day in day_keys},
+            }
+        return platforms[platform]
+
+    for row in db.query(PlatformStatusCount).filter(PlatformStatusCount.count != 0).all():
+        item = entry(row.platform)
+        item["by_status"][row.status] = row.count
+        item["posts_total"] += row.count
+
+    for row in db.query(PlatformSummary).all():
+        item = entry(row.platform)
+        item["published_total"] = row.published_total
+        item["feedback_total"] = row.feedback_total
+        if row.last_published_at:
+            item["last_published_at"] = row.last_published_at.isoformat()
+        if row.published_total > 1 and row.first_published_at:
+            span = (row.last_published_at - row.first_published_at).total_seconds()
+            item["cadence_days"] = round(span / 86400 / (row.published_total - 1), 2)
+        if row.feedback_total:
+            item["approval_rate"] = round(row.feedback_approved / row.feedback_total, 3)
+
+    daily = db.query(PlatformDailyStat).filter(PlatformDailyStat.day >= since.isoformat()).all()
+    for row in daily:
+        item = entry(row.platform)
+        if row.day in item["daily"]:
+            item["daily"][row.day].update(created=row.created, published=row.published)
+
+    for item in platforms.values():
+        item["daily"] = list(item["daily"].values())
+    return sorted(platforms.values(), key=lambda item: item["platform"])
+
+
+def rebuild(db: Session) -> None:
+    """
+    Пересчитать все агрегаты из posts и feedback (без commit).
+    Дневное «создано» считается по существующим постам: удалённые
+    посты и смена платформы в истории не сохраняются.
+    """
+    for model in (PlatformStatusCount, PlatformDailyStat, PlatformSummary):
+        db.query(model).delete()
+
+    published = PostStatus.PUBLISHED.value
+    statements = [
+        """
+        INSERT INTO platform_status_counts (platform, status, count)
+        SELECT platform, status, COUNT(*) FROM posts GROUP BY platform, status
+        """,
+        """
+        INSERT INTO platform_daily_stats (platform, day, created, published)
+        SELECT platform, day, SUM(created), SUM(published) FROM (
+            SELECT platform, date(created_at) AS day, 1 AS created, 0 AS published
+            FROM posts
+            UNION ALL
+            SELECT platform, date(COALESCE(published_at, updated_at)), 0, 1
+            FROM posts WHERE status = :published
+        ) WHERE day IS NOT NULL GROUP BY platform, day
+        """,
+        """
+        INSERT INTO platform_summaries (
+            platform, published_total, first_published_at, last_published_at,
+            feedback_total, feedback_approved
+        )
+        SELECT p.platform,
+               COALESCE(pub.total, 0), pub.first_at, pub.last_at,
+               COALESCE(fb.total, 0), COALESCE(fb.approved, 0)
+        FROM (SELECT DISTINCT platform FROM posts) p
+        LEFT JOIN (
+            SELECT platform, COUNT(*) AS total,
+                   MIN(COALESCE(published_at, updated_at)) AS first_at,
+                   MAX(COALESCE(published_at, updated_at)) AS last_at
+            FROM posts WHERE status = :published GROUP BY platform
+        ) pub ON pub.platform = p.platform
+        LEFT JOIN (
+            SELECT posts.platform, COUNT(*) AS total,
+                   SUM(feedback.feedback_type IN ('approved', 'edited')) AS approved
+            FROM feedback JOIN posts ON posts.id = feedback.post_id
+            GROUP BY posts.platform
+        ) fb ON fb.platform = p.platform
+        """,
+    ]
+    for sql in statements:
+        db.execute(text(sql), {"published": published})
+    invalidate_on_commit(db, CACHE_NAMESPACE)
+
+
+def ensure_built(db: Session) -> None:
+    """Построить агрегаты, если их ещё нет, а посты уже есть"""
+    has_rollup = db.query(PlatformStatusCount).first() is not None
+    has_posts = db.execute(text("SELECT 1 FROM posts LIMIT 1")).first() is not None
+    if has_posts and not has_rollup:
+        rebuild(db)
+        db.commit()
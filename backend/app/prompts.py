@@ -0,0 +1,178 @@
+"""
+Реестр версий промптов
+
+- Тексты хранятся в prompt_contents по SHA256: одинаковые тексты разных
+  версий занимают одну строку.
+- Активная версия — указатель в agent_state, активация меняет указатель
+  и две строки is_active (старую и новую), а не всю таблицу.
+  Предыдущие активные версии лежат в ограниченной истории (для отката).
+- A/B: версии с traffic_weight > 0 делят генерации пропорционально весу.
+  Назначение детерминировано по post_id, повторный запрос даёт ту же версию.
+- Feedback по постам версии копится в feedback_total / feedback_approved,
+  из них сразу пересчитывается approval_rate_after.
+- Изменения версий сбрасывают кэш CACHE_NAMESPACE после коммита.
+"""
+import hashlib
+import random
+from typing import Optional
+
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from . import agent_state, changes
+from .cache import invalidate_on_commit
+from .models import PromptContent, PromptVersion
+
+APPROVED_FEEDBACK = ("approved", "edited")
+HISTORY_LIMIT = 20
+CACHE_NAMESPACE = "prompts"
+
+
+def content_hash(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def store_content(db: Session, body: str) -> str:
+    """Сохранить текст промпта (если такого ещё нет) и вернуть его хэш"""
+    digest = content_hash(body)
+    # ON CONFLICT: тот же текст может сохраняться параллельно
+    db.execute(
+        insert(PromptContent).values(content_hash=digest, body=body)
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+    )
+    return digest
+
+
+def get_content(db: Session, digest: str) -> Optional[str]:
+    row = db.get(PromptContent, digest)
+    return row.body if row else None
+
+
+# ───────────────────────────────────────────────
+# Активная версия
+# ───────────────────────────────────────────────
+
+def active_version(db: Session) -> Optional[PromptVersion]:
+    """Активная версия по указателю (для старых БД — по is_active)"""
+    pointer = agent_state.get_value(db, agent_state.ACTIVE_PROMPT)
+    if pointer:
+        return db.query(PromptVersion).filter(PromptVersion.version == pointer).first()
+    return db.query(PromptVersion).filter(PromptVersion.is_active == 1).first()
+
+
+def activate(db: Session, prompt: PromptVersion, remember: bool = True) -> Optional[str]:
+    """
+    Сделать версию активной (без commit). Возвращает предыдущую версию.
+    Затрагивает только указатель и строки старой и новой версии.
+    remember=False — не класть предыдущую версию в историю (откат).
+    """
+    previous = active_version(db)
+    ids = {prompt.id}
+    if previous is not None:
+        ids.add(previous.id)
+
+    db.execute(
+        update(PromptVersion)
+        .where(PromptVersion.id.in_(ids))
+        .values(is_active=case((PromptVersion.id == prompt.id, 1), else_=0))
+        .execution_options(synchronize_session=False)
+    )
+    agent_state.set_value(db, agent_state.ACTIVE_PROMPT, prompt.version)
+    changes.record_many(db, [
+        changes.entry(changes.PROMPT_VERSION, version, changes.UPDATED, {"fields": ["is_active"]})
+        for version in sorted({prompt.version, previous.version if previous else prompt.version})
+    ])
+    if remember and previous is not None and previous.id != prompt.id:
+        history = agent_state.get_value(db, agent_state.PROMPT_HISTORY, [])
+        history = (history + [previous.version])[-HISTORY_LIMIT:]
+        agent_state.set_value(db, agent_state.PROMPT_HISTORY, history)
+    invalidate_on_commit(db, CACHE_NAMESPACE)
+    db.flush()
+    db.expire_all()
+    return previous.version if previous is not None else None
+
+
+# ───────────────────────────────────────────────
+# A/B распределение
+# ───────────────────────────────────────────────
+
+def set_traffic(db: Session, weights: dict) -> None:
+    """Задать веса версий (без commit); версии вне weights получают 0"""
+    changed = set(db.execute(
+        update(PromptVersion)
+        .where(PromptVersion.traffic_weight > 0)
+        .values(traffic_weight=0)
+        .returning(PromptVersion.version)
+        .execution_options(synchronize_session=False)
+    ).scalars())
+    changed.update(weights)
+    changes.record_many(db, [
+        changes.entry(changes.PROMPT_VERSION, version, changes.UPDATED, {"fields": ["traffic_weight"]})
+        for version in sorted(changed)
+    ])
+    for version, weight in weights.items():
+        db.execute(
+            update(PromptVersion)
+            .where(PromptVersion.version == version)
+            .values(traffic_weight=weight)
+            .execution_options(synchronize_session=False)
+        )
+    invalidate_on_commit(db, CACHE_NAMESPACE)
+    db.expire_all()
+
+
+def assign_version(db: Session, key: Optional[int] = None) -> Optional[PromptVersion]:
+    """
+    Выбрать версию для генерации пропорционально traffic_weight.
+    key (обычно post_id) делает выбор детерминированным.
+    Без весов — активная версия.
+    """
+    candidates = db.query(PromptVersion).filter(
+        PromptVersion.traffic_weight > 0
+    ).order_by(PromptVersion.version).all()
+    if not candidates:
+        return active_version(db)
+
+    total = sum(v.traffic_weight for v in candidates)
+    if key is None:
+        point = random.randrange(total)
+    else:
+        digest = hashlib.sha256(f"prompt-ab:{key}".encode()).digest()
+        point = int.from_bytes(digest[:8], "big") % total
+
+    for version in candidates:
+        if point < version.traffic_weight:
+            return version
+        point -= version.traffic_weight
+    return candidates[-1]
+
+
+def traffic_weights(db: Session) -> dict:
+    """Текущие веса A/B: {version: weight}"""
+    rows = db.query(PromptVersion.version, PromptVersion.traffic_weight).filter(
+        PromptVersion.traffic_weight > 0
+    ).all()
+    return {version: weight for version, weight in rows}
+
+
+# ───────────────────────────────────────────────
+# Метрики версий
+# ───────────────────────────────────────────────
+
+def record_feedback(db: Session, version: str, feedback_type: str) -> None:
+    """Учесть feedback по посту версии и пересчитать approval_rate_after (без commit)"""
+    approved = 1 if feedback_type in APPROVED_FEEDBACK else 0
+    new_total = PromptVersion.feedback_total + 1
+    new_approved = PromptVersion.feedback_approved + approved
+    db.execute(
+        update(PromptVersion)
+        .where(PromptVersion.version == version)
+        .values(
+            feedback_total=new_total,
+            feedback_approved=new_approved,
+            approval_rate_after=func.round(new_approved * 1.0 / new_total, 3)
+        )
+        .execution_options(synchronize_session=False)
+    )
+    invalidate_on_commit(db, CACHE_NAMESPACE)
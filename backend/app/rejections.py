@@ -0,0 +1,282 @@
+"""
+Причины отклонения по тексту rejection_details
+
+Ревьюер не всегда выбирает причину (tone, too_long, off_topic, ...):
+в Telegram можно ответить на пост текстом, через API — передать только
+rejection_details. Такие строки размечает локальный классификатор
+(text_classifier: TF-IDF + логистическая регрессия), обученный на
+отклонениях, где есть и причина, и текст.
+
+Предсказание хранится в самой строке feedback: predicted_reason,
+predicted_confidence и predicted_by (версия модели =
+rejection_classifiers.id), поэтому insights считают причины одним
+GROUP BY без анализа текста. Фоновый воркер раз в
+REJECTION_CLASSIFIER_INTERVAL_SECONDS:
+- переобучает модель, если размеченных строк с текстом прибавилось
+  на REJECTION_CLASSIFIER_RETRAIN_ROWS (первая модель — когда их
+  набралось REJECTION_CLASSIFIER_MIN_TRAINING_ROWS);
+- размечает строки без причины, ещё не размеченные текущей версией,
+  порциями по REJECTION_CLASSIFIER_BATCH_ROWS (частичный индекс
+  ix_feedback_untagged_rejections); после переобучения — все заново.
+
+Чтение — через read-only движок, запись предсказаний — короткими
+транзакциями по порции. numpy загружается только при обучении и
+разметке. При нескольких воркерах работу выполняет взявший
+file_lock("rejections"), остальные находят её сделанной.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .database import ReadSessionLocal, SessionLocal
+from .models import Feedback, RejectionClassifier
+from .workers import file_lock
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+MAX_TRAINING_ROWS = 50_000  # последние размеченные строки
+KEEP_VERSIONS = 3
+
+REJECTED = Feedback.feedback_type == "rejected"
+LABELLED = (REJECTED, Feedback.rejection_reason.isnot(None), Feedback.rejection_details.isnot(None))
+# Условие частичного индекса ix_feedback_untagged_rejections (буквально, иначе индекс не используется)
+UNTAGGED = (REJECTED, Feedback.rejection_reason.is_(None), Feedback.rejection_details.isnot(None))
+
+# Загруженная модель процесса: (версия, TextClassifier)
+_loaded: Tuple[Optional[int], object] = (None, None)
+# Строки до этого id уже размечены загруженной версией
+_classified_through = 0
+_state_lock = threading.Lock()
+
+
+def latest(db: Session) -> Optional[RejectionClassifier]:
+    return db.query(RejectionClassifier).order_by(RejectionClassifier.id.desc()).first()
+
+
+def _classifier(row: RejectionClassifier):
+    global _loaded, _classified_through
+    if _loaded[0] != row.id:
+        from .text_classifier import TextClassifier
+
+        _loaded = (row.id, TextClassifier.loads(row.weights))
+        _classified_through = 0
+    return _loaded[1]
+
+
+# ───────────────────────────────────────────────
+# Обучение
+# ───────────────────────────────────────────────
+
+def train(force: bool = False) -> Optional[dict]:
+    """
+    Обучить новую версию, если накопилось достаточно новых размеченных
+    строк (force — без этой проверки). None — обучение не нужно или
+    данных мало.
+    """
+    with ReadSessionLocal() as db:
+        current = latest(db)
+        if current is not None and not force:
+            new_rows = db.query(func.count(Feedback.id)).filter(
+                Feedback.id > current.last_feedback_id, *LABELLED
+            ).scalar()
+            if new_rows < settings.REJECTION_CLASSIFIER_RETRAIN_ROWS:
+                return None
+        rows = db.execute(
+            select(Feedback.id, Feedback.rejection_details, Feedback.rejection_reason)
+            .where(*LABELLED, func.trim(Feedback.rejection_details) != "")
+            .order_by(Feedback.id.desc())
+            .limit(MAX_TRAINING_ROWS)
+        ).all()
+
+    counts = {}
+    for _, _, reason in rows:
+        counts[reason] = counts.get(reason, 0) + 1
+    rows = [row for row in rows if counts[row[2]] >= settings.REJECTION_CLASSIFIER_MIN_CLASS_ROWS]
+    labels = {row[2] for row in rows}
+    if len(rows) < settings.REJECTION_CLASSIFIER_MIN_TRAINING_ROWS or len(labels) < 2:
+        return None
+
+    from .text_classifier import TextClassifier
+
+    started = time.perf_counter()
+    classifier, metrics = TextClassifier.train([row[1] for row in rows], [row[2] for row in rows])
+    metrics["train_seconds"] = round(time.perf_counter() - started, 3)
+    metrics["features"] = len(classifier.vectorizer.vocabulary)
+
+    with SessionLocal() as db:
+        model = RejectionClassifier(
+            labels=json.dumps(classifier.labels),
+            trained_rows=len(rows),
+            last_feedback_id=max(row[0] for row in rows),
+            metrics=json.dumps(metrics),
+            weights=classifier.dumps(),
+        )
+        db.add(model)
+        db.flush()
+        db.query(RejectionClassifier).filter(
+            RejectionClassifier.id <= model.id - KEEP_VERSIONS
+        ).delete(synchronize_session=False)
+        db.commit()
+        logger.info(
+            "Trained rejection classifier v%d on %d rows (%s)", model.id, len(rows), metrics
+        )
+        return _describe(model)
+
+
+# ───────────────────────────────────────────────
+# Разметка
+# ───────────────────────────────────────────────
+
+def classify_pending(batch_rows: Optional[int] = None) -> int:
+    """Разметить текущей моделью строки без причины; число размеченных строк"""
+    global _classified_through
+    batch_rows = batch_rows or settings.REJECTION_CLASSIFIER_BATCH_ROWS
+    with ReadSessionLocal() as db:
+        model = latest(db)
+        if model is None:
+            return 0
+        classifier = _classifier(model)
+        version = model.id
+
+    total = 0
+    while True:
+        with ReadSessionLocal() as db:
+            rows = db.execute(
+                select(Feedback.id, Feedback.rejection_details)
+                .where(
+                    *UNTAGGED,
+                    Feedback.id > _classified_through,
+                    func.coalesce(Feedback.predicted_by, 0) != version,
+                )
+                .order_by(Feedback.id)
+                .limit(batch_rows)
+            ).all()
+            if not rows:
+                # Размечено (возможно, другим процессом) всё до последней строки этого чтения:
+                # запись в SQLite одна, id фиксируются в порядке коммитов
+                newest = db.query(func.max(Feedback.id)).filter(*UNTAGGED).scalar()
+                _classified_through = max(_classified_through, newest or 0)
+                return total
+
+        reasons, confidence = classifier.predict([row[1] for row in rows])
+        with SessionLocal() as db:
+            db.execute(update(Feedback), [
+                {
+                    "id": row[0],
+                    "predicted_reason": reason,
+                    "predicted_confidence": round(float(value), 4),
+                    "predicted_by": version,
+                }
+                for row, reason, value in zip(rows, reasons, confidence)
+            ])
+            db.commit()
+        _classified_through = rows[-1][0]
+        total += len(rows)
+
+
+def run_classifier(force_train: bool = False) -> dict:
+    """Переобучение при необходимости и разметка новых строк"""
+    with file_lock("rejections"), _state_lock:
+        trained = train(force=force_train)
+        started = time.perf_counter()
+        classified = classify_pending()
+    if classified:
+        logger.info("Classified %d untagged rejections in %.1f ms", classified, (time.perf_counter() - started) * 1000)
+    return {"trained": trained, "classified": classified}
+
+
+# ───────────────────────────────────────────────
+# Чтение
+# ───────────────────────────────────────────────
+
+def _describe(model: RejectionClassifier) -> dict:
+    return {
+        "version": model.id,
+        "labels": json.loads(model.labels),
+        "trained_rows": model.trained_rows,
+        "last_feedback_id": model.last_feedback_id,
+        "metrics": json.loads(model.metrics) if model.metrics else {},
+        "created_at": model.created_at.isoformat() if model.created_at else None,
+    }
+
+
+def status(db: Session) -> dict:
+    """Текущая модель и сколько строк без причины ещё ждут разметки"""
+    model = latest(db)
+    untagged, pending = db.query(
+        func.count(Feedback.id),
+        func.sum(case((func.coalesce(Feedback.predicted_by, 0) != (model.id if model else -1), 1), else_=0)),
+    ).filter(*UNTAGGED).one()
+    return {
+        "model": _describe(model) if model else None,
+        "untagged_rejections": untagged,
+        "pending": pending or 0,
+        "min_confidence": settings.REJECTION_CLASSIFIER_MIN_CONFIDENCE,
+    }
+
+
+def reason_counts(db: Session, since: datetime) -> Tuple[dict, dict, int]:
+    """
+    Причины отклонений за окно: (все — указанные и предсказанные,
+    только предсказанные, без причины). Предсказание засчитывается при
+    уверенности не ниже REJECTION_CLASSIFIER_MIN_CONFIDENCE.
+    """
+    predicted = case(
+        (Feedback.predicted_confidence >= settings.REJECTION_CLASSIFIER_MIN_CONFIDENCE, Feedback.predicted_reason),
+        else_=None,
+    )
+    rows = db.query(
+        Feedback.rejection_reason, predicted, func.count(Feedback.id)
+    ).filter(REJECTED, Feedback.created_at >= since).group_by(Feedback.rejection_reason, predicted).all()
+
+    reasons, predicted_reasons, unclassified = {}, {}, 0
+    for tagged, guessed, count in rows:
+        reason = tagged or guessed
+        if reason is None:
+            unclassified += count
+            continue
+        reasons[reason] = reasons.get(reason, 0) + count
+        if not tagged:
+            predicted_reasons[reason] = predicted_reasons.get(reason, 0) + count
+    return reasons, predicted_reasons, unclassified
+
+
+class ClassifierWorker:
+    """Периодический запуск run_classifier в фоновом потоке"""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval_seconds <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rejection-classifier", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                run_classifier()
+            except Exception:
+                logger.exception("Rejection classifier run failed")
+
+
+classifier_worker = ClassifierWorker(settings.REJECTION_CLASSIFIER_INTERVAL_SECONDS)
@@ -0,0 +1,198 @@
+"""
+Партиционирование журнала агента по времени
+
+agent_decisions и learning_events делятся на две части:
+- горячая — основная БД, последние HOT_RETENTION_DAYS дней;
+- архив — отдельный файл ARCHIVE_DATABASE_PATH, подключённый через ATTACH.
+
+При переносе в архив строки сворачиваются в дневные агрегаты
+(decision_daily_rollups / learning_event_daily_rollups), поэтому архив
+можно чистить через ARCHIVE_RETENTION_DAYS без потери статистики.
+Таблицы архива создаются миграциями (migrations.ARCHIVE_MIGRATIONS).
+Запросы за окно внутри горячей части идут только в основную БД.
+Тем же запуском удаляются устаревшие ключи вебхука Telegram и
+компактируется журнал изменений.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import MetaData, func, select, text
+from sqlalchemy.orm import Session, aliased
+
+from . import changes
+from .config import get_settings
+from .database import ARCHIVE_SCHEMA, SessionLocal, archive_enabled, get_engine
+from .models import AgentDecision, LearningEvent
+from .workers import file_lock
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+PARTITIONED_MODELS = (AgentDecision, LearningEvent)
+
+# Копии таблиц в архивной схеме
+archive_metadata = MetaData()
+archive_tables = {
+    model: model.__table__.to_metadata(archive_metadata, schema=ARCHIVE_SCHEMA)
+    for model in PARTITIONED_MODELS
+}
+
+# Свёртка в дневные агрегаты: (таблица, колонки группировки)
+ROLLUPS = {
+    AgentDecision: (
+        "decision_daily_rollups",
+        ("decision_type", "COALESCE(outcome, '')"),
+        ("decision_type", "outcome"),
+    ),
+    LearningEvent: (
+        "learning_event_daily_rollups",
+        ("event_type",),
+        ("event_type",),
+    ),
+}
+
+
+def hot_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Граница горячей части: всё новее — в основной БД"""
+    return (now or datetime.utcnow()) - timedelta(days=settings.HOT_RETENTION_DAYS)
+
+
+def partition_query(db: Session, model, since: Optional[datetime] = None):
+    """
+    Query по модели с маршрутизацией по партициям.
+    Окно внутри горячей части (или без since) — только основная таблица,
+    иначе — UNION ALL основной и архивной таблиц.
+
+    Возвращает (query, entity): фильтры строятся по колонкам entity.
+    """
+    if not archive_enabled or since is None or since >= hot_cutoff():
+        return db.query(model), model
+
+    hot = select(model.__table__).where(model.created_at >= since)
+    archive = archive_tables[model]
+    cold = select(archive).where(archive.c.created_at >= since)
+    entity = aliased(model, hot.union_all(cold).subquery())
+    return db.query(entity), entity
+
+
+def max_id(db: Session, model) -> int:
+    """Максимальный id модели с учётом архива (id не должны повторяться)"""
+    current = db.query(func.max(model.id)).scalar() or 0
+    if archive_enabled:
+        archive = archive_tables[model]
+        archived = db.execute(select(func.max(archive.c.id))).scalar() or 0
+        current = max(current, archived)
+    return current
+
+
+def run_retention(now: Optional[datetime] = None) -> dict:
+    """
+    Перенести устаревшие строки в архив со свёрткой в дневные агрегаты,
+    затем удалить из архива строки старше ARCHIVE_RETENTION_DAYS.
+    """
+    now = now or datetime.utcnow()
+    cutoff = hot_cutoff(now)
+    result = {}
+
+    # Таймер есть в каждом воркере; переносом занимается один за раз
+    with file_lock("retention"):
+        for model in PARTITIONED_MODELS:
+            result[model.__tablename__] = _archive_table(model, now, cutoff)
+
+        # Ключи идемпотентности вебхука Telegram: только удаление, без архива
+        from .telegram import prune
+
+        with get_engine().begin() as conn:
+            result["telegram_updates"] = {"archived": 0, "purged": prune(conn, now)}
+
+    with file_lock("retention"), SessionLocal() as db:
+        result["change_log"] = changes.compact(db, now)
+        db.commit()
+
+    return result
+
+
+def _archive_table(model, now: datetime, cutoff: datetime) -> dict:
+    """
+    Перенос одной таблицы. В режиме WAL транзакция по нескольким файлам
+    атомарна только для каждого файла, поэтому копия в архив коммитится
+    первой, а из основной БД удаляются только строки, уже лежащие в
+    архиве. Повтор после сбоя между шагами не дублирует строки (OR IGNORE
+    по id) и не теряет их.
+    """
+    table = model.__tablename__
+    rollup_table, group_exprs, group_cols = ROLLUPS[model]
+    params = {"cutoff": cutoff}
+    engine = get_engine()
+
+    moved_filter = "created_at < :cutoff"
+    if archive_enabled:
+        # Явный список колонок: порядок в старых БД может отличаться
+        columns = ", ".join(c.name for c in model.__table__.columns)
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.{table} ({columns}) "
+                f"SELECT {columns} FROM main.{table} WHERE created_at < :cutoff"
+            ), params)
+        moved_filter += (
+            f" AND EXISTS (SELECT 1 FROM {ARCHIVE_SCHEMA}.{table} AS a WHERE a.id = {table}.id)"
+        )
+
+    with engine.begin() as conn:
+        # Агрегаты и удаление — в одном файле и одной транзакции
+        exprs = ", ".join(group_exprs)
+        cols = ", ".join(group_cols)
+        conn.execute(text(
+            f"INSERT INTO {rollup_table} (day, {cols}, count) "
+            f"SELECT date(created_at), {exprs}, COUNT(*) FROM main.{table} "
+            f"WHERE {moved_filter} GROUP BY date(created_at), {exprs} "
+            f"ON CONFLICT DO UPDATE SET count = count + excluded.count"
+        ), params)
+        moved = conn.execute(text(
+            f"DELETE FROM main.{table} WHERE {moved_filter}"
+        ), params).rowcount
+
+    purged = 0
+    if archive_enabled and settings.ARCHIVE_RETENTION_DAYS > 0:
+        archive_cutoff = now - timedelta(days=settings.ARCHIVE_RETENTION_DAYS)
+        with engine.begin() as conn:
+            purged = conn.execute(text(
+                f"DELETE FROM {ARCHIVE_SCHEMA}.{table} WHERE created_at < :cutoff"
+            ), {"cutoff": archive_cutoff}).rowcount
+
+    return {"archived": moved, "purged": purged}
+
+
+class RetentionWorker:
+    """Периодический запуск run_retention в фоновом потоке"""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval_seconds <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                run_retention()
+            except Exception:
+                logger.exception("Retention run failed")
+
+
+retention_worker = RetentionWorker(settings.RETENTION_INTERVAL_SECONDS)
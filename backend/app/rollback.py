@@ -0,0 +1,216 @@
+"""
+Откат агента
+
+Уровни:
+1 — промпт: активной становится предыдущая версия из истории активаций,
+    A/B веса сбрасываются (весь трафик идёт на восстановленную версию);
+2 — learned rules: правила заменяются правилами baseline;
+3 — автономия: уровень понижается на один (не ниже SHADOW);
+4 — полный откат: всё состояние восстанавливается из снимка baseline.
+
+Состояние агента — несколько ключей agent_state и веса A/B, поэтому
+снимок и восстановление занимают постоянное время независимо от длины
+истории. Перед каждым откатом сохраняется снимок pre_rollback, так что
+откат можно отменить через restore_snapshot.
+
+execute() сам управляет транзакцией: изменения состояния, снимок и
+исход решения коммитятся вместе; при ошибке всё откатывается, а
+решение помечается как failure.
+"""
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from . import agent_state, changes, prompts
+from .models import AgentDecision, AgentSnapshot, PromptVersion
+
+LEVELS = {1: "prompt", 2: "rules", 3: "autonomy", 4: "full"}
+
+BASELINE = "baseline"
+PRE_ROLLBACK = "pre_rollback"
+
+MIN_AUTONOMY = 1  # SHADOW
+
+
+class RollbackError(HTTPException):
+    """Откат невозможен (409) или снимок не найден (404)"""
+
+
+# ───────────────────────────────────────────────
+# Снимки
+# ───────────────────────────────────────────────
+
+def capture(db: Session) -> dict:
+    """Текущее состояние агента"""
+    active = prompts.active_version(db)
+    return {
+        "active_prompt_version": active.version if active else None,
+        "prompt_history": agent_state.get_value(db, agent_state.PROMPT_HISTORY, []),
+        "learned_rules": agent_state.get_value(db, agent_state.LEARNED_RULES, []),
+        "autonomy_level": agent_state.get_value(
+            db, agent_state.AUTONOMY_LEVEL, agent_state.DEFAULT_AUTONOMY
+        ),
+        "prompt_traffic": prompts.traffic_weights(db),
+    }
+
+
+def restore(db: Session, state: dict) -> None:
+    """Восстановить состояние из снимка (без commit)"""
+    version = state.get("active_prompt_version")
+    if version:
+        prompt = db.query(PromptVersion).filter(PromptVersion.version == version).first()
+        if prompt is not None:
+            prompts.activate(db, prompt, remember=False)
+    agent_state.set_value(db, agent_state.PROMPT_HISTORY, state.get("prompt_history", []))
+    agent_state.set_value(db, agent_state.LEARNED_RULES, state.get("learned_rules", []))
+    agent_state.set_value(
+        db, agent_state.AUTONOMY_LEVEL,
+        state.get("autonomy_level", agent_state.DEFAULT_AUTONOMY)
+    )
+    prompts.set_traffic(db, state.get("prompt_traffic", {}))
+
+
+def take_snapshot(db: Session, label: str, state: Optional[dict] = None) -> AgentSnapshot:
+    """Сохранить снимок (без commit)"""
+    snapshot = AgentSnapshot(
+        label=label,
+        state=json.dumps(state if state is not None else capture(db), ensure_ascii=False)
+    )
+    db.add(snapshot)
+    db.flush()
+    changes.record(db, changes.SNAPSHOT, snapshot.id, changes.CREATED, {"label": label})
+    return snapshot
+
+
+def latest_snapshot(db: Session, label: str) -> Optional[AgentSnapshot]:
+    return db.query(AgentSnapshot).filter(
+        AgentSnapshot.label == label
+    ).order_by(AgentSnapshot.id.desc()).first()
+
+
+def ensure_baseline(db: Session) -> None:
+    """Зафиксировать текущее состояние как baseline, если его ещё нет"""
+    if latest_snapshot(db, BASELINE) is None:
+        take_snapshot(db, BASELINE)
+        db.commit()
+
+
+def restore_snapshot(db: Session, snapshot_id: int) -> dict:
+    """Восстановить снимок по id; текущее состояние сохраняется как pre_rollback"""
+    snapshot = db.get(AgentSnapshot, snapshot_id)
+    if snapshot is None:
+        raise RollbackError(status_code=404, detail="Snapshot not found")
+    saved = take_snapshot(db, PRE_ROLLBACK)
+    restore(db, json.loads(snapshot.state))
+    after = capture(db)
+    db.commit()
+    return {"restored": snapshot.id, "snapshot_id": saved.id, "state": after}
+
+
+# ───────────────────────────────────────────────
+# Выполнение отката
+# ───────────────────────────────────────────────
+
+def execute(db: Session, level: int, decision_id: Optional[int] = None) -> dict:
+    """
+    Выполнить откат уровня level одной транзакцией.
+    decision_id — решение rollback, которому проставляется исход.
+    """
+    try:
+        before = capture(db)
+        snapshot = take_snapshot(db, PRE_ROLLBACK, before)
+        _LEVEL_HANDLERS[level](db, before)
+        after = capture(db)
+        changes = {
+            key: {"before": before[key], "after": after[key]}
+            for key in after if before[key] != after[key]
+        }
+        if decision_id is not None:
+            _set_outcome(
+                db, decision_id, "success",
+                json.dumps({"snapshot_id": snapshot.id, "changes": changes}, ensure_ascii=False),
+                autonomy_level=after["autonomy_level"]
+            )
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        if decision_id is not None:
+            detail = exc.detail if isinstance(exc, HTTPException) else str(exc)
+            _set_outcome(db, decision_id, "failure", json.dumps({"error": detail}, ensure_ascii=False))
+            db.commit()
+        raise
+
+    return {
+        "level": level,
+        "level_name": LEVELS[level],
+        "snapshot_id": snapshot.id,
+        "before": before,
+        "after": after,
+        "changes": changes,
+    }
+
+
+def _rollback_prompt(db: Session, state: dict) -> None:
+    history = list(state["prompt_history"])
+    current = state["active_prompt_version"]
+    while history:
+        version = history.pop()
+        if version == current:
+            continue
+        prompt = db.query(PromptVersion).filter(PromptVersion.version == version).first()
+        if prompt is None:
+            continue
+        prompts.activate(db, prompt, remember=False)
+        agent_state.set_value(db, agent_state.PROMPT_HISTORY, history)
+        prompts.set_traffic(db, {})
+        return
+    raise RollbackError(status_code=409, detail="No previous prompt version to roll back to")
+
+
+def _rollback_rules(db: Session, state: dict) -> None:
+    baseline = _baseline_state(db)
+    agent_state.set_value(db, agent_state.LEARNED_RULES, baseline.get("learned_rules", []))
+
+
+def _rollback_autonomy(db: Session, state: dict) -> None:
+    level = state["autonomy_level"]
+    if level <= MIN_AUTONOMY:
+        raise RollbackError(status_code=409, detail="Autonomy is already at the lowest level")
+    agent_state.set_value(db, agent_state.AUTONOMY_LEVEL, level - 1)
+
+
+def _rollback_full(db: Session, state: dict) -> None:
+    restore(db, _baseline_state(db))
+
+
+def _baseline_state(db: Session) -> dict:
+    """Состояние baseline; без снимка — значения по умолчанию"""
+    snapshot = latest_snapshot(db, BASELINE)
+    if snapshot is not None:
+        return json.loads(snapshot.state)
+    return {
+        "learned_rules": [],
+        "autonomy_level": agent_state.DEFAULT_AUTONOMY,
+        "prompt_traffic": {},
+    }
+
+
+_LEVEL_HANDLERS = {
+    1: _rollback_prompt,
+    2: _rollback_rules,
+    3: _rollback_autonomy,
+    4: _rollback_full,
+}
+
+
+def _set_outcome(db: Session, decision_id: int, outcome: str, details: str, **values) -> None:
+    db.execute(
+        update(AgentDecision)
+        .where(AgentDecision.id == decision_id)
+        .values(outcome=outcome, outcome_details=details, **values)
+        .execution_options(synchronize_session=False)
+    )
+    changes.record(db, changes.DECISION, decision_id, changes.UPDATED, {"outcome": outcome})
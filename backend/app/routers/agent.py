@@ -1,19 +1,28 @@
 """
 API эндпоинты для агента
 """
+import hashlib
+import json
 from typing import Optional, List
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-
-from ..database import get_db
+from sqlalchemy import case, func
+
+from ..audit_buffer import audit_buffer, merge_recent
+from ..cache import cached, invalidate_on_commit
+from ..circuit_breaker import circuit_breaker
+from ..content_plan import naive_utc
+from .. import agent_state, audit, changes, prompts, rejections, rollback
+from ..database import get_db, get_read_db
+from ..retention import hot_cutoff, partition_query, run_retention
 from ..models import (
     Post, PostStatus, Feedback, AgentDecision,
-    LearningEvent, PromptVersion
+    LearningEvent, PromptVersion, DecisionDailyRollup, AgentSnapshot
 )
 from ..schemas import (
-    LearningInsights, AgentStatus,
+    LearningInsights, AgentStatus, CalibrationReport,
     FeedbackResponse, FeedbackList
 )
 
@@ -21,20 +30,20 @@ router = APIRouter(prefix="/api/agent", tags=["agent"])
 
 
 @router.get("/status", response_model=AgentStatus)
-def get_agent_status(db: Session = Depends(get_db)):
+def get_agent_status(db: Session = Depends(get_read_db)):
     """
     Получить текущий статус агента.
     Читает из БД последние данные о состоянии.
     """
-    # Получаем последнее решение агента
-    last_decision = db.query(AgentDecision).order_by(
-        AgentDecision.created_at.desc()
-    ).first()
+    # Получаем последнее решение агента (с учётом буфера)
+    recent_decisions = _recent_decisions(db, limit=1)
+    last_decision = recent_decisions[0] if recent_decisions else None
 
-    # Получаем текущую версию промпта
-    active_prompt = db.query(PromptVersion).filter(
-        PromptVersion.is_active == 1
-    ).first()
+    # Получаем текущую версию промпта и уровень автономии
+    active_prompt = prompts.active_version(db)
+    autonomy_level = agent_state.get_value(db, agent_state.AUTONOMY_LEVEL)
+    if autonomy_level is None:
+        autonomy_level = last_decision.autonomy_level if last_decision else agent_state.DEFAULT_AUTONOMY
 
     # Считаем approval rate за 7 дней
     cutoff = datetime.utcnow() - timedelta(days=7)
@@ -53,32 +62,34 @@ def get_agent_status(db: Session = Depends(get_db)):
         approval_rate_7d = 0.0
 
     # Считаем генерации с последнего reflexion
-    last_reflexion = db.query(LearningEvent).filter(
+    pending_reflexions = audit_buffer.pending(
+        LearningEvent, lambda e: e.event_type == "reflexion"
+    )
+    db_reflexion = db.query(LearningEvent).filter(
         LearningEvent.event_type == "reflexion"
     ).order_by(LearningEvent.created_at.desc()).first()
+    last_reflexion = merge_recent(
+        [db_reflexion] if db_reflexion else [], pending_reflexions, 1
+    )
+    since = last_reflexion[0].created_at if last_reflexion else None
 
-    if last_reflexion:
-        gens_since = db.query(AgentDecision).filter(
-            AgentDecision.decision_type == "generate",
-            AgentDecision.created_at > last_reflexion.created_at
-        ).count()
-    else:
-        gens_since = db.query(AgentDecision).filter(
-            AgentDecision.decision_type == "generate"
-        ).count()
-
-    # Определяем circuit breaker state по последним 10 решениям
-    recent_decisions = db.query(AgentDecision).order_by(
-        AgentDecision.created_at.desc()
-    ).limit(10).all()
-
-    failures = sum(1 for d in recent_decisions if d.outcome == "failure")
-    cb_state = "open" if failures >= 3 else "closed"
+    # Буферизованные генерации считаем отдельно, исключая их из запроса к БД
+    pending_gens = audit_buffer.pending(
+        AgentDecision,
+        lambda d: d.decision_type == "generate" and (since is None or d.created_at > since)
+    )
+    gens_query = db.query(AgentDecision).filter(
+        AgentDecision.decision_type == "generate",
+        AgentDecision.id.notin_([d.id for d in pending_gens])
+    )
+    if since is not None:
+        gens_query = gens_query.filter(AgentDecision.created_at > since)
+    gens_since = gens_query.count() + len(pending_gens)
 
     return AgentStatus(
-        autonomy_level=last_decision.autonomy_level if last_decision else 2,
-        autonomy_name=_level_name(last_decision.autonomy_level if last_decision else 2),
-        circuit_breaker_state=cb_state,
+        autonomy_level=autonomy_level,
+        autonomy_name=_level_name(autonomy_level),
+        circuit_breaker_state=circuit_breaker.state,
         prompt_version=active_prompt.version if active_prompt else "v1.0.0",
         generations_since_reflexion=gens_since,
         approval_rate_7d=round(approval_rate_7d, 3),
@@ -86,6 +97,59 @@ def get_agent_status(db: Session = Depends(get_db)):
     )
 
 
+def _recent_decisions(
+    db: Session,
+    limit: int,
+    decision_type: Optional[str] = None,
+    since: Optional[datetime] = None
+) -> List[AgentDecision]:
+    """
+    Последние решения агента: БД + ещё не записанные строки буфера.
+    Без since (или с окном внутри горячей партиции) архив не читается.
+    """
+    pending = audit_buffer.pending(
+        AgentDecision,
+        lambda d: decision_type is None or d.decision_type == decision_type
+    )
+
+    query, entity = partition_query(db, AgentDecision, since)
+    if since is not None:
+        query = query.filter(entity.created_at >= since)
+    if decision_type:
+        query = query.filter(entity.decision_type == decision_type)
+    rows = query.order_by(entity.created_at.desc()).limit(limit).all()
+
+    return merge_recent(rows, pending, limit)
+
+
+@router.get("/circuit-breaker")
+def get_circuit_breaker():
+    """Текущее состояние circuit breaker"""
+    return circuit_breaker.snapshot()
+
+
+@router.post("/circuit-breaker/check")
+def check_circuit_breaker():
+    """
+    Спросить разрешение перед внешним вызовом (генерация, публикация).
+    В half_open разрешается только один пробный вызов — его исход
+    нужно записать через /api/posts/agent/decision.
+    """
+    allowed = circuit_breaker.allow()
+    return {
+        "allowed": allowed,
+        "state": circuit_breaker.state,
+        "retry_after": round(circuit_breaker.retry_after(), 1)
+    }
+
+
+@router.post("/circuit-breaker/reset")
+def reset_circuit_breaker():
+    """Принудительно закрыть circuit breaker"""
+    circuit_breaker.reset()
+    return circuit_breaker.snapshot()
+
+
 def _level_name(level: int) -> str:
     """Конвертация уровня автономии в название"""
     names = {1: "SHADOW", 2: "DRAFT", 3: "BOUNDED", 4: "AUTONOMOUS"}
@@ -95,7 +159,7 @@ def _level_name(level: int) -> str:
 @router.get("/learning/insights", response_model=LearningInsights)
 def get_learning_insights(
     days: int = Query(default=7, le=90),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получить insights от анализа feedback.
@@ -103,15 +167,13 @@ def get_learning_insights(
     """
     cutoff = datetime.utcnow() - timedelta(days=days)
 
-    feedbacks = db.query(Feedback).filter(
-        Feedback.created_at >= cutoff
-    ).all()
+    total, approved = db.query(
+        func.count(Feedback.id),
+        func.sum(case((Feedback.feedback_type.in_(("approved", "edited")), 1), else_=0)),
+    ).filter(Feedback.created_at >= cutoff).one()
 
-    total = len(feedbacks)
     if total == 0:
-        active_prompt = db.query(PromptVersion).filter(
-            PromptVersion.is_active == 1
-        ).first()
+        active_prompt = prompts.active_version(db)
         return LearningInsights(
             approval_rate=0.0,
             total_feedback=0,
@@ -122,18 +184,10 @@ def get_learning_insights(
         )
 
     # Считаем approval rate
-    approved = sum(
-        1 for f in feedbacks
-        if f.feedback_type in ("approved", "edited")
-    )
     approval_rate = approved / total
 
-    # Анализируем причины отклонений
-    rejection_reasons = {}
-    for f in feedbacks:
-        if f.feedback_type == "rejected" and f.rejection_reason:
-            reason = f.rejection_reason
-            rejection_reasons[reason] = rejection_reasons.get(reason, 0) + 1
+    # Причины отклонений: указанные ревьюером и предсказанные по тексту (rejections)
+    rejection_reasons, predicted_reasons, unclassified = rejections.reason_counts(db, cutoff)
 
     # Формируем suggestions на основе rejection reasons
     suggestions = []
@@ -147,20 +201,50 @@ def get_learning_insights(
         suggestions.append("CRITICAL: Approval rate ниже 50% — требуется review промпта")
 
     # Получаем текущую версию промпта
-    active_prompt = db.query(PromptVersion).filter(
-        PromptVersion.is_active == 1
-    ).first()
+    active_prompt = prompts.active_version(db)
 
     return LearningInsights(
         approval_rate=round(approval_rate, 3),
         total_feedback=total,
         common_rejection_reasons=rejection_reasons,
+        predicted_rejection_reasons=predicted_reasons,
+        unclassified_rejections=unclassified,
         successful_patterns=[],  # TODO: анализ успешных паттернов
         improvement_suggestions=suggestions if suggestions else ["Продолжать в том же духе"],
         prompt_version=active_prompt.version if active_prompt else "v1.0.0"
     )
 
 
+@router.get("/learning/rejection-classifier")
+def get_rejection_classifier(db: Session = Depends(get_read_db)):
+    """Классификатор причин отклонения: версия, метрики, очередь разметки"""
+    return rejections.status(db)
+
+
+@router.post("/learning/rejection-classifier/train")
+def train_rejection_classifier(force: bool = False):
+    """Переобучить (force — даже без новых размеченных строк) и разметить очередь"""
+    return rejections.run_classifier(force_train=force)
+
+
+@router.get("/learning/calibration", response_model=CalibrationReport)
+def get_calibration(
+    bins: int = Query(default=10, ge=2, le=100),
+    days: Optional[int] = Query(default=None, ge=1, le=3650),
+    platform: Optional[str] = None,
+    prompt_version: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Калибровка confidence_before по исходам feedback: кривая надёжности,
+    Brier score, ECE и разбивка по платформам и версиям промпта.
+    """
+    # numpy загружается при первом запросе, а не при старте
+    from .. import calibration
+
+    return calibration.report(db, bins=bins, days=days, platform=platform, prompt_version=prompt_version)
+
+
 @router.post("/rollback")
 def trigger_rollback(
     level: int = Query(..., ge=1, le=4, description="Уровень отката: 1=prompt, 2=rules, 3=autonomy, 4=full"),
@@ -168,99 +252,307 @@ def trigger_rollback(
     db: Session = Depends(get_db)
 ):
     """
-    Инициировать откат агента.
+    Выполнить откат агента.
 
     Уровни:
     1 - Откат промпта к предыдущей версии
-    2 - Сброс learned rules
+    2 - Сброс learned rules к baseline
     3 - Понижение уровня автономии
     4 - Полный reset к baseline
-    """
-    # Записываем событие отката
-    event = LearningEvent(
-        event_type="rollback",
-        input_data=f'{{"level": {level}, "reason": "{reason}"}}',
-        insights=f"Инициирован откат уровня {level}",
-        actions=f"rollback_level_{level}"
-    )
-    db.add(event)
 
-    # Записываем решение
+    Решение записывается сразу (outcome=pending), затем откат и исход
+    решения коммитятся одной транзакцией.
+    """
     decision = AgentDecision(
         decision_type="rollback",
-        autonomy_level=2,  # При откате возвращаемся на уровень 2
+        autonomy_level=agent_state.get_value(
+            db, agent_state.AUTONOMY_LEVEL, agent_state.DEFAULT_AUTONOMY
+        ),
         confidence=None,
         action_taken=1,
         reason=reason,
         outcome="pending"
     )
-    db.add(decision)
+    audit_buffer.add(decision, durable=True)
 
-    db.commit()
+    result = rollback.execute(db, level, decision.id)
+
+    prompt_change = result["changes"].get("active_prompt_version", {})
+    audit_buffer.add(LearningEvent(
+        event_type="rollback",
+        input_data=json.dumps({"level": level, "reason": reason}, ensure_ascii=False),
+        insights=f"Выполнен откат уровня {level} ({result['level_name']})",
+        actions=json.dumps(sorted(result["changes"])),
+        prompt_version_before=prompt_change.get("before"),
+        prompt_version_after=prompt_change.get("after")
+    ))
 
     return {
-        "status": "rollback_initiated",
+        "status": "rolled_back",
         "level": level,
         "reason": reason,
-        "message": f"Rollback level {level} инициирован. Агент должен применить изменения."
+        "decision_id": decision.id,
+        "snapshot_id": result["snapshot_id"],
+        "changes": result["changes"],
+        "message": f"Rollback level {level} выполнен"
     }
 
 
+@router.get("/snapshots")
+def list_snapshots(
+    limit: int = Query(default=20, le=100),
+    label: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Снимки состояния агента (baseline и pre_rollback)"""
+    query = db.query(AgentSnapshot)
+    if label:
+        query = query.filter(AgentSnapshot.label == label)
+    snapshots = query.order_by(AgentSnapshot.id.desc()).limit(limit).all()
+
+    return {
+        "snapshots": [
+            {
+                "id": s.id,
+                "label": s.label,
+                "state": json.loads(s.state),
+                "created_at": s.created_at.isoformat()
+            }
+            for s in snapshots
+        ]
+    }
+
+
+@router.post("/snapshots")
+def create_snapshot(
+    label: str = Query(default="manual", description="baseline — новый baseline для отката уровней 2 и 4"),
+    db: Session = Depends(get_db)
+):
+    """Сохранить текущее состояние агента"""
+    snapshot = rollback.take_snapshot(db, label)
+    db.commit()
+    return {"id": snapshot.id, "label": snapshot.label, "state": json.loads(snapshot.state)}
+
+
+@router.post("/snapshots/{snapshot_id}/restore")
+def restore_snapshot(snapshot_id: int, db: Session = Depends(get_db)):
+    """Восстановить состояние из снимка (например, отменить откат)"""
+    return rollback.restore_snapshot(db, snapshot_id)
+
+
+@router.get("/rules")
+def get_learned_rules(db: Session = Depends(get_read_db)):
+    """Learned rules агента"""
+    return {"rules": agent_state.get_value(db, agent_state.LEARNED_RULES, [])}
+
+
+@router.put("/rules")
+def set_learned_rules(
+    rules: List[str] = Body(..., embed=True),
+    db: Session = Depends(get_db)
+):
+    """Заменить learned rules (после Reflexion)"""
+    agent_state.set_value(db, agent_state.LEARNED_RULES, rules)
+    db.commit()
+    return {"rules": rules}
+
+
+@router.put("/autonomy")
+def set_autonomy_level(
+    level: int = Query(..., ge=1, le=4, description="1=SHADOW, 2=DRAFT, 3=BOUNDED, 4=AUTONOMOUS"),
+    db: Session = Depends(get_db)
+):
+    """Установить уровень автономии"""
+    agent_state.set_value(db, agent_state.AUTONOMY_LEVEL, level)
+    db.commit()
+    return {"autonomy_level": level, "autonomy_name": _level_name(level)}
+
+
 @router.get("/decisions/recent")
 def get_recent_decisions(
     limit: int = Query(default=20, le=100),
     decision_type: Optional[str] = None,
-    db: Session = Depends(get_db)
+    days: Optional[int] = Query(default=None, ge=1, le=3650, description="Окно в днях; за пределами горячей партиции читается архив"),
+    db: Session = Depends(get_read_db)
 ):
     """Получить последние решения агента"""
-    query = db.query(AgentDecision)
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    decisions = _recent_decisions(db, limit, decision_type, since)
 
-    if decision_type:
-        query = query.filter(AgentDecision.decision_type == decision_type)
+    return {"decisions": [audit.decision_dict(d) for d in decisions]}
 
-    decisions = query.order_by(
-        AgentDecision.created_at.desc()
-    ).limit(limit).all()
+
+def _decision_filter(
+    since: Optional[datetime] = Query(default=None, description="UTC, включительно"),
+    until: Optional[datetime] = Query(default=None, description="UTC, не включая"),
+    decision_type: Optional[str] = None,
+    outcome: Optional[str] = Query(default=None, description="success, failure, pending или none (без исхода)"),
+    autonomy_level: Optional[int] = Query(default=None, ge=1, le=4),
+    min_confidence: Optional[float] = Query(default=None, ge=0, le=1),
+    max_confidence: Optional[float] = Query(default=None, ge=0, le=1),
+    action_taken: Optional[bool] = None,
+) -> audit.DecisionFilter:
+    return audit.DecisionFilter(
+        naive_utc(since), naive_utc(until), decision_type, outcome, autonomy_level,
+        min_confidence, max_confidence, action_taken
+    )
+
+
+def _cursor(
+    cursor: Optional[str] = Query(default=None, description="next_cursor предыдущей страницы")
+) -> Optional[tuple]:
+    """Разобранный курсор keyset-страницы; 400 — курсор не из next_cursor"""
+    if not cursor:
+        return None
+    try:
+        return audit.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/decisions")
+def get_decisions(
+    filters: audit.DecisionFilter = Depends(_decision_filter),
+    after: Optional[tuple] = Depends(_cursor),
+    limit: int = Query(default=50, ge=1, le=500),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Журнал решений агента постранично (keyset, от новых к старым) с
+    фильтрами. Без since или с since за горячей партицией читается архив.
+    """
+    return audit.decision_page(db, filters, after, limit)
+
+
+@router.get("/decisions/stats")
+def get_decision_stats(
+    filters: audit.DecisionFilter = Depends(_decision_filter),
+    bucket: str = Query(default="hour", pattern="^(hour|day)$"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Решения по часам или дням и типам: число, успехи, неудачи, доля
+    неудач и средняя уверенность. По умолчанию — последние 7 дней.
+    """
+    if filters.since is None:
+        filters = filters._replace(since=datetime.utcnow() - timedelta(days=7))
+    return audit.decision_stats(db, filters, bucket)
+
+
+@router.get("/decisions/daily")
+def get_decisions_daily(
+    days: int = Query(default=90, ge=1, le=3650),
+    decision_type: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Число решений агента по дням, типам и исходам.
+    Старые дни берутся из дневных агрегатов, горячая партиция
+    агрегируется на лету.
+    """
+    since_day = (datetime.utcnow() - timedelta(days=days)).date().isoformat()
+    counts = {}
+
+    rollups = db.query(DecisionDailyRollup).filter(DecisionDailyRollup.day >= since_day)
+    if decision_type:
+        rollups = rollups.filter(DecisionDailyRollup.decision_type == decision_type)
+    for r in rollups.all():
+        key = (r.day, r.decision_type, r.outcome)
+        counts[key] = counts.get(key, 0) + r.count
+
+    day = func.date(AgentDecision.created_at)
+    hot = db.query(
+        day.label("day"),
+        AgentDecision.decision_type,
+        func.coalesce(AgentDecision.outcome, "").label("outcome"),
+        func.count(AgentDecision.id).label("count")
+    ).filter(day >= since_day)
+    if decision_type:
+        hot = hot.filter(AgentDecision.decision_type == decision_type)
+    for r in hot.group_by(day, AgentDecision.decision_type, "outcome").all():
+        key = (r.day, r.decision_type, r.outcome)
+        counts[key] = counts.get(key, 0) + r.count
 
     return {
-        "decisions": [
-            {
-                "id": d.id,
-                "type": d.decision_type,
-                "autonomy_level": d.autonomy_level,
-                "confidence": d.confidence,
-                "action_taken": bool(d.action_taken),
-                "outcome": d.outcome,
-                "reason": d.reason,
-                "created_at": d.created_at.isoformat()
-            }
-            for d in decisions
-        ]
+        "days": [
+            {"day": d, "type": t, "outcome": o or None, "count": c}
+            for (d, t, o), c in sorted(counts.items())
+        ],
+        "hot_since": hot_cutoff().isoformat()
     }
 
 
+@router.post("/maintenance/retention")
+def trigger_retention():
+    """Перенести устаревшие решения и события в архив (обычно запускается по таймеру)"""
+    return run_retention()
+
+
+@router.post("/maintenance/backup")
+def trigger_backup(compression: Optional[str] = Query(None, pattern="^(gzip|zstd)$")):
+    """Снимок БД без остановки записи (BACKUP_DIR, с ротацией)"""
+    from .. import backup
+
+    return backup.take_snapshot(compression)
+
+
+@router.get("/maintenance/backups")
+def get_backups():
+    """Готовые снимки БД, новые первыми"""
+    from .. import backup
+
+    return {"snapshots": backup.list_snapshots()}
+
+
 @router.get("/prompt/versions")
-def get_prompt_versions(db: Session = Depends(get_db)):
-    """Получить историю версий промптов"""
-    versions = db.query(PromptVersion).order_by(
-        PromptVersion.created_at.desc()
-    ).all()
+def get_prompt_versions(
+    limit: Optional[int] = Query(default=None, ge=1, le=200, description="Без limit — вся история"),
+    after: Optional[tuple] = Depends(_cursor),
+    db: Session = Depends(get_read_db)
+):
+    """Получить историю версий промптов (от новых к старым)"""
+    if limit is not None or after is not None:
+        limit = limit or 50
+        versions = db.query(PromptVersion).filter(
+            *audit.before((PromptVersion.created_at, PromptVersion.id), after)
+        ).order_by(
+            PromptVersion.created_at.desc(), PromptVersion.id.desc()
+        ).limit(limit + 1).all()
+        versions, next_cursor = audit.page(versions, limit)
+        active = prompts.active_version(db)
+        return {"versions": [_prompt_version_dict(v, active) for v in versions], "next_cursor": next_cursor}
+
+    def load() -> list:
+        versions = db.query(PromptVersion).order_by(
+            PromptVersion.created_at.desc()
+        ).all()
+        active = prompts.active_version(db)
+        return [_prompt_version_dict(v, active) for v in versions]
+
+    return {"versions": cached(prompts.CACHE_NAMESPACE, "versions", load)}
+
+
+@router.get("/prompt/versions/{version}")
+def get_prompt_version(version: str, db: Session = Depends(get_read_db)):
+    """Версия промпта вместе с текстом"""
+    prompt = db.query(PromptVersion).filter(
+        PromptVersion.version == version
+    ).first()
+    if not prompt:
+        raise HTTPException(status_code=404, detail=f"Version {version} not found")
 
-    return {
-        "versions": [
-            {
-                "id": v.id,
-                "version": v.version,
-                "is_active": bool(v.is_active),
-                "author": v.author,
-                "reason": v.reason,
-                "approval_rate_before": v.approval_rate_before,
-                "approval_rate_after": v.approval_rate_after,
-                "created_at": v.created_at.isoformat()
-            }
-            for v in versions
-        ]
-    }
+    result = _prompt_version_dict(prompt, prompts.active_version(db))
+    result["content"] = prompts.get_content(db, prompt.content_hash)
+    return result
+
+
+@router.get("/prompt/content/{content_hash}")
+def get_prompt_content(content_hash: str, db: Session = Depends(get_read_db)):
+    """Текст промпта по SHA256"""
+    body = prompts.get_content(db, content_hash)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Prompt content not found")
+    return {"content_hash": content_hash, "content": body}
 
 
 @router.post("/prompt/create")
@@ -269,11 +561,14 @@ def create_prompt_version(
     reason: str = Query(default="Initial version"),
     author: str = Query(default="system"),
     activate: bool = Query(default=True),
+    content: Optional[str] = Body(default=None, embed=True, description="Текст промпта"),
     db: Session = Depends(get_db)
 ):
-    """Создать новую версию промпта"""
-    import hashlib
-
+    """
+    Создать новую версию промпта.
+    Текст передаётся в теле: {"content": "..."}; одинаковые тексты
+    хранятся один раз.
+    """
     # Проверяем что версия не существует
     existing = db.query(PromptVersion).filter(
         PromptVersion.version == version
@@ -282,26 +577,47 @@ def create_prompt_version(
     if existing:
         return {"status": "exists", "version": version}
 
-    # Деактивируем другие если нужно активировать новую
-    if activate:
-        db.query(PromptVersion).update({"is_active": 0})
+    if content is not None:
+        digest = prompts.store_content(db, content)
+    else:
+        # Без текста — как раньше, хэш от строки версии
+        digest = hashlib.sha256(version.encode()).hexdigest()
+
+    # Первая версия с тем же текстом (их может быть уже несколько)
+    duplicate_of = None
+    if content is not None:
+        duplicate_of = db.query(PromptVersion.version).filter(
+            PromptVersion.content_hash == digest
+        ).order_by(PromptVersion.created_at, PromptVersion.id).limit(1).scalar()
 
-    # Создаём новую версию
     prompt = PromptVersion(
         version=version,
-        content_hash=hashlib.sha256(version.encode()).hexdigest(),
+        content_hash=digest,
         reason=reason,
         author=author,
-        is_active=1 if activate else 0
+        is_active=0
     )
-
     db.add(prompt)
+    try:
+        db.flush()
+    except IntegrityError:
+        # Та же версия создана параллельным запросом (version уникален)
+        db.rollback()
+        return {"status": "exists", "version": version}
+    changes.record(db, changes.PROMPT_VERSION, version, changes.CREATED)
+    invalidate_on_commit(db, prompts.CACHE_NAMESPACE)
+
+    if activate:
+        prompts.activate(db, prompt)
+
     db.commit()
     db.refresh(prompt)
 
     return {
         "status": "created",
         "version": version,
+        "content_hash": digest,
+        "duplicate_of": duplicate_of,
         "is_active": bool(prompt.is_active)
     }
 
@@ -317,22 +633,102 @@ def activate_prompt_version(version: str, db: Session = Depends(get_db)):
     if not prompt:
         raise HTTPException(status_code=404, detail=f"Version {version} not found")
 
-    # Деактивируем все остальные
-    db.query(PromptVersion).update({"is_active": 0})
-
-    # Активируем нужную
-    prompt.is_active = 1
+    previous = prompts.activate(db, prompt)
     db.commit()
 
     return {
         "status": "activated",
         "version": version,
+        "previous_version": previous,
         "message": f"Промпт версии {version} активирован"
     }
 
 
+@router.post("/prompt/traffic")
+def set_prompt_traffic(
+    weights: dict = Body(..., description='Веса версий: {"v1.0.0": 80, "v1.1.0": 20}'),
+    db: Session = Depends(get_db)
+):
+    """
+    Задать A/B распределение генераций между версиями.
+    Пустой объект отключает A/B — генерации идут на активную версию.
+    """
+    versions = {
+        v.version for v in db.query(PromptVersion.version).filter(
+            PromptVersion.version.in_(list(weights))
+        ).all()
+    }
+    unknown = [v for v in weights if v not in versions]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown versions: {', '.join(unknown)}")
+    if any(not isinstance(w, int) or isinstance(w, bool) or w < 0 for w in weights.values()):
+        raise HTTPException(status_code=400, detail="Weights must be non-negative integers")
+
+    prompts.set_traffic(db, weights)
+    db.commit()
+    return {"status": "updated", "weights": {v: w for v, w in weights.items() if w > 0}}
+
+
+@router.post("/prompt/assign")
+def assign_prompt_version(
+    post_id: Optional[int] = Query(default=None, description="Пост, для которого идёт генерация"),
+    db: Session = Depends(get_db)
+):
+    """
+    Выбрать версию промпта для генерации по A/B весам.
+    С post_id выбор детерминирован и сохраняется в посте — feedback
+    по посту попадёт в метрики этой версии.
+    """
+    post = None
+    if post_id is not None:
+        post = db.query(Post).filter(Post.id == post_id).first()
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found")
+        if post.prompt_version:
+            assigned = db.query(PromptVersion).filter(
+                PromptVersion.version == post.prompt_version
+            ).first()
+            if assigned:
+                return _assignment(db, assigned)
+
+    prompt = prompts.assign_version(db, post_id)
+    if prompt is None:
+        raise HTTPException(status_code=404, detail="No prompt versions available")
+
+    if post is not None:
+        post.prompt_version = prompt.version
+        changes.record(db, changes.POST, post.id, changes.UPDATED, {"fields": ["prompt_version"]})
+        db.commit()
+
+    return _assignment(db, prompt)
+
+
+def _assignment(db: Session, prompt: PromptVersion) -> dict:
+    return {
+        "version": prompt.version,
+        "content_hash": prompt.content_hash,
+        "content": prompts.get_content(db, prompt.content_hash)
+    }
+
+
+def _prompt_version_dict(v: PromptVersion, active: Optional[PromptVersion]) -> dict:
+    return {
+        "id": v.id,
+        "version": v.version,
+        "is_active": active is not None and v.id == active.id,
+        "author": v.author,
+        "reason": v.reason,
+        "content_hash": v.content_hash,
+        "traffic_weight": v.traffic_weight or 0,
+        "feedback_total": v.feedback_total or 0,
+        "approval_rate_before": v.approval_rate_before,
+        "approval_rate_after": v.approval_rate_after,
+        "created_at": v.created_at.isoformat()
+    }
+
+
 @router.get("/health")
-def get_agent_health(db: Session = Depends(get_db)):
+def get_agent_health(db: Session = Depends(get_read_db)):
     """
     Traffic Light статус агента.
     GREEN - всё хорошо
@@ -359,12 +755,7 @@ def get_agent_health(db: Session = Depends(get_db)):
         approval_rate = None  # Недостаточно данных
 
     # Circuit breaker проверка
-    recent_decisions = db.query(AgentDecision).order_by(
-        AgentDecision.created_at.desc()
-    ).limit(10).all()
-
-    failures = sum(1 for d in recent_decisions if d.outcome == "failure")
-    failure_rate = failures / len(recent_decisions) if recent_decisions else 0
+    failure_rate = circuit_breaker.failure_rate
 
     # Определяем статус
     issues = []
@@ -373,11 +764,11 @@ def get_agent_health(db: Session = Depends(get_db)):
         issues.append(f"LOW_APPROVAL_RATE: {approval_rate:.1%}")
     if failure_rate >= 0.3:
         issues.append(f"HIGH_FAILURE_RATE: {failure_rate:.1%}")
+    if circuit_breaker.state != "closed":
+        issues.append(f"CIRCUIT_BREAKER_{circuit_breaker.state.upper()}")
 
     # Проверяем активный промпт
-    active_prompt = db.query(PromptVersion).filter(
-        PromptVersion.is_active == 1
-    ).first()
+    active_prompt = prompts.active_version(db)
     if not active_prompt:
         issues.append("NO_ACTIVE_PROMPT")
 
@@ -398,6 +789,7 @@ def get_agent_health(db: Session = Depends(get_db)):
         "metrics": {
             "approval_rate_7d": round(approval_rate, 3) if approval_rate else None,
             "failure_rate_10": round(failure_rate, 3),
+            "circuit_breaker_state": circuit_breaker.state,
             "total_feedback_7d": total_7d,
             "active_prompt": active_prompt.version if active_prompt else None
         },
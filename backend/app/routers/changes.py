@@ -0,0 +1,30 @@
+"""
+API журнала изменений: инкрементальная синхронизация агента
+"""
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from .. import changes
+from ..database import get_read_db
+from ..schemas import ChangeFeed
+
+router = APIRouter(prefix="/api/changes", tags=["changes"])
+
+
+@router.get("", response_model=ChangeFeed)
+async def get_changes(
+    since: int = Query(..., ge=0, description="last_seq предыдущего ответа или /head"),
+    limit: int = Query(default=500, ge=1, le=5000),
+    wait: float = Query(default=0, ge=0, description="Long-poll: ждать изменений до N секунд")
+):
+    """
+    Изменения с seq > since по возрастанию seq.
+    410 — изменения до since удалены компактацией, нужна полная загрузка.
+    """
+    return await changes.wait_for_changes(since, limit, wait)
+
+
+@router.get("/head")
+def get_head(db: Session = Depends(get_read_db)):
+    """Текущий seq: с него начинать синхронизацию после полной загрузки"""
+    return {"seq": changes.head(db), "horizon": changes.horizon(db)}
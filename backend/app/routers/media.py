@@ -0,0 +1,121 @@
+"""
+API эндпоинты для картинок постов
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, File, Form, Request, UploadFile
+from fastapi.responses import FileResponse, Response
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .. import media
+from ..database import get_db, get_read_db
+from ..models import MediaAsset
+from ..schemas import GenerateImageRequest, GenerateImageResponse, MediaAssetResponse
+
+router = APIRouter(prefix=media.URL_PREFIX, tags=["images"])
+
+# Файлы адресуются хэшем содержимого и никогда не меняются
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+@router.post("/generate", response_model=GenerateImageResponse)
+async def generate_image(request: GenerateImageRequest, db: Session = Depends(get_db)):
+    """
+    Сгенерировать картинку по теме.
+    Повторный запрос с той же темой возвращает уже готовую картинку.
+    Сессия БД используется только из пула потоков (media.run_in_threadpool).
+    """
+    asset, prompt, cached = await media.generate(db, request.topic)
+    if request.post_id is not None:
+        await run_in_threadpool(media.attach_to_post, db, request.post_id, asset, prompt)
+
+    return GenerateImageResponse(
+        prompt=prompt,
+        content_hash=asset.content_hash,
+        cached=cached,
+        **media.asset_urls(asset.content_hash)
+    )
+
+
+@router.post("/ingest", response_model=MediaAssetResponse)
+async def ingest_image(
+    file: Optional[UploadFile] = File(default=None),
+    url: Optional[str] = Form(default=None),
+    post_id: Optional[int] = Form(default=None),
+    db: Session = Depends(get_db)
+):
+    """
+    Загрузить картинку файлом или по URL в локальное хранилище.
+    URL — только http(s) на публичные адреса (media.check_public_url).
+    """
+    if file is not None:
+        data = await file.read()
+    elif url:
+        data = await media.fetch_image(url, public_only=True)
+    else:
+        raise media.MediaError(status_code=400, detail="Either file or url is required")
+
+    asset = await media.ingest(db, data, source_url=url)
+    if post_id is not None:
+        await run_in_threadpool(media.attach_to_post, db, post_id, asset)
+    return _asset_response(asset)
+
+
+@router.get("/{content_hash}/meta", response_model=MediaAssetResponse)
+def get_image_meta(content_hash: str, db: Session = Depends(get_read_db)):
+    """Размеры и URL вариантов картинки"""
+    return _asset_response(_get_asset(db, content_hash))
+
+
+@router.get("/{content_hash}")
+def get_image(content_hash: str, request: Request, db: Session = Depends(get_read_db)):
+    """Оригинал картинки"""
+    asset = _get_asset(db, content_hash)
+    if _not_modified(request, content_hash):
+        return _not_modified_response(content_hash)
+    path = media.store.original_path(content_hash)
+    if not path.exists():
+        raise media.MediaError(status_code=404, detail="Image not found")
+    return FileResponse(path, media_type=asset.mime_type, headers=_cache_headers(content_hash))
+
+
+@router.get("/{content_hash}/w{width}.webp")
+async def get_image_variant(content_hash: str, width: int, request: Request):
+    """WebP-вариант заданной ширины"""
+    if not media.is_valid_hash(content_hash) or width not in media.settings.MEDIA_THUMBNAIL_WIDTHS:
+        raise media.MediaError(status_code=404, detail="Image not found")
+    etag = f"{content_hash}-w{width}"
+    if _not_modified(request, etag):
+        return _not_modified_response(etag)
+    path = await media.variant_file(content_hash, width)
+    return FileResponse(path, media_type="image/webp", headers=_cache_headers(etag))
+
+
+def _get_asset(db: Session, content_hash: str) -> MediaAsset:
+    asset = db.get(MediaAsset, content_hash) if media.is_valid_hash(content_hash) else None
+    if asset is None:
+        raise media.MediaError(status_code=404, detail="Image not found")
+    return asset
+
+
+def _asset_response(asset: MediaAsset) -> MediaAssetResponse:
+    return MediaAssetResponse(
+        content_hash=asset.content_hash,
+        mime_type=asset.mime_type,
+        width=asset.width,
+        height=asset.height,
+        size_bytes=asset.size_bytes,
+        **media.asset_urls(asset.content_hash)
+    )
+
+
+def _cache_headers(etag: str) -> dict:
+    return {"Cache-Control": IMMUTABLE_CACHE, "ETag": f'"{etag}"'}
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    return f'"{etag}"' in request.headers.get("if-none-match", "")
+
+
+def _not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers=_cache_headers(etag))
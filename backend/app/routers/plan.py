@@ -0,0 +1,48 @@
+"""
+API контент-плана: пустые слоты и буфер для выбора следующей генерации
+"""
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from .. import content_plan
+from ..database import get_db, get_read_db
+from ..schemas import Cadences, EmptySlot, GapAnalysis
+
+router = APIRouter(prefix="/api/plan", tags=["plan"])
+
+
+@router.get("/gaps", response_model=GapAnalysis)
+def get_gaps(
+    days: int = Query(default=14, ge=1, le=366),
+    platform: Optional[List[str]] = Query(default=None),
+    start: Optional[datetime] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Пустые слоты и буфер на горизонте days (UTC) от start (по умолчанию — сейчас)"""
+    return content_plan.analyze(db, start=content_plan.naive_utc(start), days=days, platforms=platform)
+
+
+@router.get("/next", response_model=List[EmptySlot])
+def get_next_slots(
+    limit: int = Query(default=5, ge=1, le=100),
+    days: int = Query(default=14, ge=1, le=366),
+    db: Session = Depends(get_read_db)
+):
+    """Ближайшие пустые слоты — что агенту генерировать в первую очередь"""
+    return content_plan.analyze(db, days=days)["empty_slots"][:limit]
+
+
+@router.get("/cadences", response_model=Cadences)
+def get_cadences(db: Session = Depends(get_read_db)):
+    """Текущий ритм публикаций"""
+    return Cadences(cadences=content_plan.get_cadences(db))
+
+
+@router.put("/cadences", response_model=Cadences)
+def set_cadences(request: Cadences, db: Session = Depends(get_db)):
+    """Задать ритм публикаций (пустой словарь — вернуть ритм из настроек)"""
+    content_plan.set_cadences(db, request.cadences)
+    db.commit()
+    return Cadences(cadences=content_plan.get_cadences(db))
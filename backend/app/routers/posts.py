@@ -3,27 +3,35 @@ API эндпоинты для постов
 """
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-
-from ..database import get_db
-from ..models import Post, PostStatus, Feedback, AgentDecision
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import case, func, select
+
+from ..audit_buffer import audit_buffer
+from ..cache import cached
+from ..circuit_breaker import circuit_breaker
+from ..feedback import apply_feedback
+from .. import changes, idempotency, platform_stats
+from ..database import get_db, get_read_db
+from ..models import Post, PostStatus, Feedback, AgentDecision, PlatformStatusCount
+from ..transitions import transition, bulk_transition, known_status, parse_status
 from ..schemas import (
     PostCreate, PostUpdate, PostResponse, PostList,
+    Board, BoardColumn, BoardDelta,
+    BulkPostIds, BulkReschedule, BulkTransitionResult,
     FeedbackCreate, FeedbackResponse, FeedbackList,
     AgentDecisionCreate, AgentDecisionResponse
 )
 
 router = APIRouter(prefix="/api/posts", tags=["posts"])
 
-
 @router.get("", response_model=PostList)
 def list_posts(
     status: Optional[str] = None,
     platform: Optional[str] = None,
     limit: int = Query(default=50, le=100),
     offset: int = Query(default=0, ge=0),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить список постов с фильтрами"""
     query = db.query(Post)
@@ -44,8 +52,95 @@ def list_posts(
     )
 
 
+# ═══════════════════════════════════════════════════
+# BOARD (канбан; объявлен до /{post_id})
+# ═══════════════════════════════════════════════════
+
+@router.get("/board", response_model=Board)
+def get_board(
+    limit: int = Query(default=20, ge=1, le=200, description="Постов в колонке по умолчанию"),
+    limits: Optional[str] = Query(default=None, description="Лимиты колонок: review:50,published:10"),
+    platform: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Канбан-доска: для каждого статуса — первые N постов и точное число.
+    Один запрос с ROW_NUMBER() / COUNT() OVER (PARTITION BY status).
+    """
+    column_limits = _parse_column_limits(limits)
+
+    ranked = select(
+        Post,
+        func.row_number().over(
+            partition_by=Post.status,
+            order_by=(Post.created_at.desc(), Post.id.desc())
+        ).label("rn"),
+        func.count().over(partition_by=Post.status).label("total")
+    )
+    if platform:
+        ranked = ranked.where(Post.platform == platform)
+    ranked = ranked.subquery()
+
+    window = case(column_limits, value=ranked.c.status, else_=limit) if column_limits else limit
+    post_alias = aliased(Post, ranked)
+    rows = db.query(post_alias, ranked.c.total).filter(
+        ranked.c.rn <= window
+    ).order_by(ranked.c.status, ranked.c.rn).all()
+
+    columns = {s.value: BoardColumn(status=s.value, total=0, items=[]) for s in PostStatus}
+    for post, total in rows:
+        column = columns.setdefault(post.status, BoardColumn(status=post.status, total=0, items=[]))
+        column.total = total
+        column.items.append(PostResponse.model_validate(post))
+
+    return Board(columns=list(columns.values()))
+
+
+@router.post("/board/{post_id}/approve", response_model=BoardDelta)
+def approve_post_on_board(post_id: int, db: Session = Depends(get_db)):
+    """Одобрить пост и вернуть только изменение доски"""
+    from_status = transition(db, post_id, PostStatus.SCHEDULED, expected=PostStatus.REVIEW)
+    db.commit()
+    return _board_delta(db, post_id, from_status)
+
+
+@router.post("/board/{post_id}/reject", response_model=BoardDelta)
+def reject_post_on_board(post_id: int, db: Session = Depends(get_db)):
+    """Отклонить пост и вернуть только изменение доски"""
+    from_status = transition(db, post_id, PostStatus.REJECTED)
+    db.commit()
+    return _board_delta(db, post_id, from_status)
+
+
+def _parse_column_limits(raw: Optional[str]) -> dict:
+    """'review:50,published:10' -> {"review": 50, "published": 10}"""
+    if not raw:
+        return {}
+    result = {}
+    for part in raw.split(","):
+        status, _, value = part.partition(":")
+        try:
+            result[parse_status(status.strip()).value] = max(1, min(int(value), 200))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid column limit '{part}'")
+    return result
+
+
+def _board_delta(db: Session, post_id: int, from_status: str) -> BoardDelta:
+    post = db.query(Post).filter(Post.id == post_id).first()
+    changes = {}
+    if from_status != post.status:
+        changes = {from_status: -1, post.status: 1}
+    return BoardDelta(
+        post=PostResponse.model_validate(post),
+        from_status=from_status,
+        to_status=post.status,
+        count_changes=changes
+    )
+
+
 @router.get("/{post_id}", response_model=PostResponse)
-def get_post(post_id: int, db: Session = Depends(get_db)):
+def get_post(post_id: int, db: Session = Depends(get_read_db)):
     """Получить пост по ID"""
     post = db.query(Post).filter(Post.id == post_id).first()
     if not post:
@@ -54,21 +149,93 @@ def get_post(post_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("", response_model=PostResponse, status_code=201)
-def create_post(post_data: PostCreate, db: Session = Depends(get_db)):
-    """Создать новый пост"""
+def create_post(
+    post_data: PostCreate,
+    idempotency_key: Optional[str] = Depends(idempotency.idempotency_key),
+    db: Session = Depends(get_db)
+):
+    """Создать новый пост. С Idempotency-Key повтор возвращает тот же пост"""
+    return idempotency.run(
+        "create_post", idempotency_key, post_data, 201,
+        lambda: _create_post(db, post_data, idempotency_key)
+    )
+
+
+def _create_post(db: Session, post_data: PostCreate, key: Optional[str]) -> PostResponse:
+    existing = _by_idempotency_key(db, Post, key)
+    if existing is not None:
+        return PostResponse.model_validate(existing)
+
     post = Post(
         title=post_data.title,
         content=post_data.content,
         platform=post_data.platform,
         author=post_data.author,
-        status=PostStatus.IDEA.value
+        status=PostStatus.IDEA.value,
+        idempotency_key=key
     )
     db.add(post)
+    try:
+        db.flush()
+    except IntegrityError:
+        # Тот же ключ одновременно из другого воркера
+        db.rollback()
+        return PostResponse.model_validate(_by_idempotency_key(db, Post, key))
+    platform_stats.on_post_created(db, post.platform, post.status)
+    changes.record(db, changes.POST, post.id, changes.CREATED, {"status": post.status})
     db.commit()
     db.refresh(post)
     return PostResponse.model_validate(post)
 
 
+def _by_idempotency_key(db: Session, model, key: Optional[str]):
+    if key is None:
+        return None
+    return db.query(model).filter(model.idempotency_key == key).first()
+
+
+# ═══════════════════════════════════════════════════
+# BULK ENDPOINTS (объявлены до /{post_id}/..., чтобы не пересекаться)
+# ═══════════════════════════════════════════════════
+
+@router.post("/bulk/approve", response_model=BulkTransitionResult)
+def bulk_approve(data: BulkPostIds, db: Session = Depends(get_db)):
+    """Одобрить посты на ревью (review -> scheduled)"""
+    result = bulk_transition(
+        db, data.post_ids, PostStatus.SCHEDULED, sources=[PostStatus.REVIEW]
+    )
+    db.commit()
+    return _bulk_result(PostStatus.SCHEDULED, result)
+
+
+@router.post("/bulk/reject", response_model=BulkTransitionResult)
+def bulk_reject(data: BulkPostIds, db: Session = Depends(get_db)):
+    """Отклонить посты (кроме опубликованных)"""
+    result = bulk_transition(db, data.post_ids, PostStatus.REJECTED)
+    db.commit()
+    return _bulk_result(PostStatus.REJECTED, result)
+
+
+@router.post("/bulk/reschedule", response_model=BulkTransitionResult)
+def bulk_reschedule(data: BulkReschedule, db: Session = Depends(get_db)):
+    """Перенести запланированные посты на новое время"""
+    result = bulk_transition(
+        db, data.post_ids, PostStatus.SCHEDULED,
+        sources=[PostStatus.SCHEDULED],
+        values={"scheduled_at": data.scheduled_at}
+    )
+    db.commit()
+    return _bulk_result(PostStatus.SCHEDULED, result)
+
+
+def _bulk_result(target: PostStatus, result: dict) -> BulkTransitionResult:
+    return BulkTransitionResult(
+        status=target.value,
+        updated=[row["id"] for row in result["updated"]],
+        skipped=result["skipped"]
+    )
+
+
 @router.patch("/{post_id}", response_model=PostResponse)
 def update_post(post_id: int, post_data: PostUpdate, db: Session = Depends(get_db)):
     """Обновить пост"""
@@ -77,8 +244,20 @@ def update_post(post_id: int, post_data: PostUpdate, db: Session = Depends(get_d
         raise HTTPException(status_code=404, detail="Post not found")
 
     update_data = post_data.model_dump(exclude_unset=True)
+
+    # Статус меняется только через таблицу переходов
+    new_status = update_data.pop("status", None)
+    if new_status is not None and new_status != post.status:
+        transition(db, post_id, parse_status(new_status), expected=known_status(post.status))
+
+    new_platform = update_data.get("platform")
+    if new_platform is not None and new_platform != post.platform:
+        platform_stats.on_platform_changed(db, post.platform, new_platform, post.status)
+
     for field, value in update_data.items():
         setattr(post, field, value)
+    if update_data:
+        changes.record(db, changes.POST, post_id, changes.UPDATED, {"fields": sorted(update_data)})
 
     db.commit()
     db.refresh(post)
@@ -92,6 +271,8 @@ def delete_post(post_id: int, db: Session = Depends(get_db)):
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
+    platform_stats.on_post_deleted(db, post.platform, post.status)
+    changes.record(db, changes.POST, post_id, changes.DELETED)
     db.delete(post)
     db.commit()
     return None
@@ -100,55 +281,68 @@ def delete_post(post_id: int, db: Session = Depends(get_db)):
 @router.post("/{post_id}/approve", response_model=PostResponse)
 def approve_post(post_id: int, db: Session = Depends(get_db)):
     """Одобрить пост (review -> scheduled)"""
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    if post.status != PostStatus.REVIEW.value:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Cannot approve post with status '{post.status}'. Must be 'review'"
-        )
-
-    post.status = PostStatus.SCHEDULED.value
+    transition(db, post_id, PostStatus.SCHEDULED, expected=PostStatus.REVIEW)
     db.commit()
-    db.refresh(post)
+
+    post = db.query(Post).filter(Post.id == post_id).first()
     return PostResponse.model_validate(post)
 
 
 @router.post("/{post_id}/reject", response_model=PostResponse)
 def reject_post(post_id: int, db: Session = Depends(get_db)):
-    """Отклонить пост"""
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    post.status = PostStatus.REJECTED.value
+    """Отклонить пост (из любого статуса, кроме published)"""
+    transition(db, post_id, PostStatus.REJECTED)
     db.commit()
-    db.refresh(post)
+
+    post = db.query(Post).filter(Post.id == post_id).first()
     return PostResponse.model_validate(post)
 
 
 @router.get("/stats/by-status")
-def get_stats_by_status(db: Session = Depends(get_db)):
-    """Статистика постов по статусам"""
+def get_stats_by_status(db: Session = Depends(get_read_db)):
+    """Статистика постов по статусам (из агрегатов платформ)"""
     result = db.query(
-        Post.status,
-        func.count(Post.id).label("count")
-    ).group_by(Post.status).all()
+        PlatformStatusCount.status,
+        func.sum(PlatformStatusCount.count).label("count")
+    ).group_by(PlatformStatusCount.status).all()
 
-    return {row.status: row.count for row in result}
+    return {row.status: row.count for row in result if row.count}
 
 
 @router.get("/stats/by-platform")
-def get_stats_by_platform(db: Session = Depends(get_db)):
-    """Статистика постов по платформам"""
+def get_stats_by_platform(db: Session = Depends(get_read_db)):
+    """Статистика постов по платформам (из агрегатов платформ)"""
     result = db.query(
-        Post.platform,
-        func.count(Post.id).label("count")
-    ).group_by(Post.platform).all()
+        PlatformStatusCount.platform,
+        func.sum(PlatformStatusCount.count).label("count")
+    ).group_by(PlatformStatusCount.platform).all()
 
-    return {row.platform: row.count for row in result}
+    return {row.platform: row.count for row in result if row.count}
+
+
+@router.get("/stats/platforms")
+def get_platform_analytics(
+    days: int = Query(default=30, ge=1, le=365),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Аналитика по платформам: посты по статусам, последняя публикация,
+    средний интервал между публикациями, approval rate по feedback
+    и посты по дням. Читается из инкрементальных агрегатов.
+    """
+    platforms = cached(
+        platform_stats.CACHE_NAMESPACE, f"analytics:{days}",
+        lambda: platform_stats.platform_analytics(db, days)
+    )
+    return {"days": days, "platforms": platforms}
+
+
+@router.post("/stats/platforms/rebuild")
+def rebuild_platform_analytics(db: Session = Depends(get_db)):
+    """Пересчитать агрегаты платформ из posts и feedback"""
+    platform_stats.rebuild(db)
+    db.commit()
+    return {"status": "rebuilt"}
 
 
 # ═══════════════════════════════════════════════════
@@ -159,44 +353,45 @@ def get_stats_by_platform(db: Session = Depends(get_db)):
 def record_feedback(
     post_id: int,
     feedback_data: FeedbackCreate,
+    idempotency_key: Optional[str] = Depends(idempotency.idempotency_key),
     db: Session = Depends(get_db)
 ):
     """
     Записать feedback на сгенерированный контент.
     Используется агентом для обучения на основе человеческих решений.
+    С Idempotency-Key повтор возвращает тот же feedback.
 
     feedback_type: approved | rejected | edited
+    Пост переходит в scheduled (approved, edited) или rejected, если
+    такой переход разрешён из текущего статуса; иначе статус не меняется,
+    но feedback записывается. 400 — неизвестный статус поста.
     """
+    return idempotency.run(
+        "record_feedback", idempotency_key, (post_id, feedback_data), 201,
+        lambda: _record_feedback(db, post_id, feedback_data, idempotency_key)
+    )
+
+
+def _record_feedback(db: Session, post_id: int, feedback_data: FeedbackCreate, key: Optional[str]) -> FeedbackResponse:
+    existing = _by_idempotency_key(db, Feedback, key)
+    if existing is not None:
+        return FeedbackResponse.model_validate(existing)
+
     # Проверяем что пост существует
     post = db.query(Post).filter(Post.id == post_id).first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    # Создаём запись feedback
-    feedback = Feedback(
-        post_id=post_id,
-        feedback_type=feedback_data.feedback_type,
-        confidence_before=feedback_data.confidence_before,
-        original_content=feedback_data.original_content,
-        edited_content=feedback_data.edited_content,
-        rejection_reason=feedback_data.rejection_reason,
-        rejection_details=feedback_data.rejection_details,
-        user_id=feedback_data.user_id
-    )
-
-    db.add(feedback)
-
-    # Обновляем статус поста в зависимости от типа feedback
-    if feedback_data.feedback_type == "approved":
-        post.status = PostStatus.SCHEDULED.value
-    elif feedback_data.feedback_type == "rejected":
-        post.status = PostStatus.REJECTED.value
-    elif feedback_data.feedback_type == "edited":
-        # При редактировании обновляем контент и статус
-        if feedback_data.edited_content:
-            post.content = feedback_data.edited_content
-        post.status = PostStatus.SCHEDULED.value
-
+    try:
+        feedback = apply_feedback(db, post, feedback_data, idempotency_key=key)
+    except (HTTPException, IntegrityError):
+        # Параллельный повтор из другого воркера успел первым: статус
+        # поста уже сменён (409) или ключ занят
+        db.rollback()
+        existing = _by_idempotency_key(db, Feedback, key)
+        if existing is None:
+            raise
+        return FeedbackResponse.model_validate(existing)
     db.commit()
     db.refresh(feedback)
 
@@ -204,7 +399,7 @@ def record_feedback(
 
 
 @router.get("/{post_id}/feedback", response_model=FeedbackList)
-def get_post_feedback(post_id: int, db: Session = Depends(get_db)):
+def get_post_feedback(post_id: int, db: Session = Depends(get_read_db)):
     """Получить все feedback для поста"""
     post = db.query(Post).filter(Post.id == post_id).first()
     if not post:
@@ -224,7 +419,7 @@ def get_post_feedback(post_id: int, db: Session = Depends(get_db)):
 def get_recent_feedback(
     limit: int = Query(default=50, le=200),
     feedback_type: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получить последние feedback записи.
@@ -247,7 +442,7 @@ def get_recent_feedback(
 @router.get("/feedback/stats")
 def get_feedback_stats(
     days: int = Query(default=7, le=90),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Статистика feedback за период.
@@ -292,13 +487,34 @@ def get_feedback_stats(
 @router.post("/agent/decision", response_model=AgentDecisionResponse, status_code=201)
 def record_agent_decision(
     decision_data: AgentDecisionCreate,
+    durable: bool = Query(default=False, description="Дождаться записи в БД, минуя буфер"),
+    idempotency_key: Optional[str] = Depends(idempotency.idempotency_key),
     db: Session = Depends(get_db)
 ):
     """
     Записать решение агента для аудита.
+    Запись попадает в write-behind буфер и сбрасывается в БД пачкой;
+    durable=true — синхронная запись. С Idempotency-Key повтор
+    возвращает то же решение.
 
     decision_type: generate | publish | modify_prompt | rollback
     """
+    return idempotency.run(
+        "record_agent_decision", idempotency_key, decision_data, 201,
+        lambda: _record_agent_decision(db, decision_data, durable, idempotency_key)
+    )
+
+
+def _record_agent_decision(
+    db: Session, decision_data: AgentDecisionCreate, durable: bool, key: Optional[str]
+) -> AgentDecisionResponse:
+    if key is not None:
+        # Ещё в буфере или уже в БД
+        pending = audit_buffer.pending(AgentDecision, lambda d: d.idempotency_key == key)
+        existing = pending[0] if pending else _by_idempotency_key(db, AgentDecision, key)
+        if existing is not None:
+            return AgentDecisionResponse.model_validate(existing)
+
     decision = AgentDecision(
         decision_type=decision_data.decision_type,
         autonomy_level=decision_data.autonomy_level,
@@ -306,11 +522,14 @@ def record_agent_decision(
         action_taken=1 if decision_data.action_taken else 0,
         reason=decision_data.reason,
         outcome=decision_data.outcome,
-        outcome_details=decision_data.outcome_details
+        outcome_details=decision_data.outcome_details,
+        idempotency_key=key
     )
 
-    db.add(decision)
-    db.commit()
-    db.refresh(decision)
+    stored = audit_buffer.add(decision, durable=durable)
+    if stored is not decision:
+        # Тот же ключ уже записал другой воркер: решение учтено им
+        return AgentDecisionResponse.model_validate(stored)
+    circuit_breaker.record(decision.outcome)
 
     return AgentDecisionResponse.model_validate(decision)
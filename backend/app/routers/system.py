@@ -0,0 +1,60 @@
+"""
+Служебные эндпоинты: корень, проверка здоровья, метрики
+"""
+from datetime import datetime
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from .. import admission, content_plan
+from ..audit_buffer import audit_buffer
+from ..database import get_read_db
+from ..models import PlatformStatusCount
+from ..schemas import HealthMetrics
+
+router = APIRouter(tags=["system"])
+
+
+@router.get("/")
+def root():
+    """Корневой эндпоинт"""
+    return {
+        "name": "SMM Dashboard API",
+        "version": "1.0.0",
+        "status": "running"
+    }
+
+
+@router.get("/api/health")
+def health_check():
+    """Проверка здоровья API"""
+    return {"status": "ok"}
+
+
+@router.get("/api/metrics/health", response_model=HealthMetrics)
+def get_health_metrics(db: Session = Depends(get_read_db)):
+    """Метрики здоровья контент-плана и буфер журнала агента"""
+    now = datetime.utcnow()
+    week = content_plan.analyze(db, start=content_plan.week_start_utc(now), days=7)
+    ahead = content_plan.analyze(db, start=now)
+
+    by_status: dict = {}
+    by_platform: dict = {}
+    for row in db.query(PlatformStatusCount).filter(PlatformStatusCount.count > 0):
+        by_status[row.status] = by_status.get(row.status, 0) + row.count
+        by_platform[row.platform] = by_platform.get(row.platform, 0) + row.count
+
+    return HealthMetrics(
+        plan_completion=round(week["filled"] / week["slots_total"], 2) if week["slots_total"] else 1.0,
+        buffer_days=int(ahead["buffer_days"]),
+        empty_slots_week=sum(1 for slot in week["empty_slots"] if slot["at"] >= now.isoformat()),
+        posts_by_status=by_status,
+        posts_by_platform=by_platform,
+        audit_buffer=audit_buffer.snapshot(),
+    )
+
+
+@router.get("/api/metrics/admission")
+def get_admission_metrics():
+    """Лимиты процесса: rate limit по клиентам, очередь тяжёлых запросов, таймауты БД"""
+    return admission.snapshot()
@@ -0,0 +1,32 @@
+"""
+Вебхук Telegram: feedback ревьюеров пачками
+"""
+import secrets
+from typing import Optional, Union
+from fastapi import APIRouter, Body, Depends, Header, HTTPException
+from sqlalchemy.orm import Session
+
+from .. import telegram
+from ..config import get_settings
+from ..database import get_db
+from ..schemas import TelegramWebhookResult
+
+router = APIRouter(prefix="/api/telegram", tags=["telegram"])
+
+settings = get_settings()
+
+
+@router.post("/webhook", response_model=TelegramWebhookResult)
+def telegram_webhook(
+    payload: Union[list, dict] = Body(...),
+    x_telegram_bot_api_secret_token: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    """
+    Принять update'ы бота: один update, список или ответ getUpdates.
+    Повторная доставка того же update_id ничего не меняет.
+    """
+    secret = settings.TELEGRAM_WEBHOOK_SECRET
+    if secret and not secrets.compare_digest(x_telegram_bot_api_secret_token or "", secret):
+        raise HTTPException(status_code=401, detail="Invalid secret token")
+    return telegram.process_updates(db, payload)
@@ -2,8 +2,8 @@
 Pydantic схемы для API
 """
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, Field
+from typing import Dict, Optional, List
+from pydantic import BaseModel, Field, field_validator
 
 from .models import PostStatus, PostPlatform
 
@@ -44,6 +44,7 @@ class PostResponse(PostBase):
     image_prompt: Optional[str] = None
     ai_prompt: Optional[str] = None
     ai_model: Optional[str] = None
+    prompt_version: Optional[str] = None
     scheduled_at: Optional[datetime] = None
     published_at: Optional[datetime] = None
     created_at: datetime
@@ -61,6 +62,43 @@ class PostList(BaseModel):
     offset: int
 
 
+class BoardColumn(BaseModel):
+    """Колонка канбана: первые N постов статуса и точное число"""
+    status: str
+    total: int
+    items: List[PostResponse]
+
+
+class Board(BaseModel):
+    """Канбан-доска по всем статусам"""
+    columns: List[BoardColumn]
+
+
+class BoardDelta(BaseModel):
+    """Изменение доски после перехода поста между колонками"""
+    post: PostResponse
+    from_status: str
+    to_status: str
+    count_changes: dict = Field(default_factory=dict, description="status -> изменение total")
+
+
+class BulkPostIds(BaseModel):
+    """Массовая операция над постами"""
+    post_ids: List[int] = Field(..., min_length=1, max_length=10000)
+
+
+class BulkReschedule(BulkPostIds):
+    """Массовый перенос запланированных постов"""
+    scheduled_at: datetime
+
+
+class BulkTransitionResult(BaseModel):
+    """Результат массового перехода статусов"""
+    status: str
+    updated: List[int]
+    skipped: List[int] = Field(default_factory=list, description="Нет поста или переход недопустим")
+
+
 # ═══════════════════════════════════════════════════
 # GENERATE SCHEMAS
 # ═══════════════════════════════════════════════════
@@ -82,12 +120,27 @@ class GenerateTextResponse(BaseModel):
 class GenerateImageRequest(BaseModel):
     """Запрос на генерацию картинки"""
     topic: str = Field(..., min_length=1)
+    post_id: Optional[int] = None  # проставить картинку посту
 
 
 class GenerateImageResponse(BaseModel):
     """Ответ с URL картинки"""
     image_url: str
     prompt: str
+    content_hash: Optional[str] = None
+    thumbnails: Dict[int, str] = {}  # ширина -> URL WebP-варианта
+    cached: bool = False  # картинка для такого промпта уже была
+
+
+class MediaAssetResponse(BaseModel):
+    """Картинка из локального хранилища"""
+    content_hash: str
+    mime_type: str
+    width: int
+    height: int
+    size_bytes: int
+    image_url: str
+    thumbnails: Dict[int, str] = {}
 
 
 # ═══════════════════════════════════════════════════
@@ -101,6 +154,73 @@ class HealthMetrics(BaseModel):
     empty_slots_week: int = Field(..., ge=0, description="Пустых слотов на неделе")
     posts_by_status: dict = Field(default_factory=dict)
     posts_by_platform: dict = Field(default_factory=dict)
+    audit_buffer: dict = Field(default_factory=dict, description="Незаписанные строки журнала агента")
+
+
+class EmptySlot(BaseModel):
+    """Пустой слот контент-плана"""
+    platform: str
+    at: datetime
+
+
+class PlatformGaps(BaseModel):
+    """Пустые слоты и буфер платформы"""
+    platform: str
+    slots_total: int
+    filled: int
+    empty_slots: List[datetime]
+    next_empty_at: Optional[datetime] = None
+    buffer_days: float
+
+
+class GapAnalysis(BaseModel):
+    """Анализ пустых слотов на горизонте"""
+    start: datetime
+    end: datetime
+    slots_total: int
+    filled: int
+    buffer_days: float
+    empty_slots: List[EmptySlot]
+    platforms: List[PlatformGaps]
+
+
+class Cadences(BaseModel):
+    """Ритм публикаций: платформа -> слоты вида 'mon 10:00', 'weekdays 09:30'"""
+    cadences: Dict[str, List[str]]
+
+
+# ═══════════════════════════════════════════════════
+# TELEGRAM SCHEMAS
+# ═══════════════════════════════════════════════════
+
+class TelegramWebhookResult(BaseModel):
+    """Итог обработки пачки update'ов"""
+    received: int
+    applied: int
+    duplicates: int
+    ignored: int
+    failed: int
+
+
+# ═══════════════════════════════════════════════════
+# CHANGE FEED SCHEMAS
+# ═══════════════════════════════════════════════════
+
+class ChangeEntry(BaseModel):
+    """Изменение сущности"""
+    seq: int
+    entity: str
+    entity_id: str
+    op: str
+    data: Optional[dict] = None
+    created_at: datetime
+
+
+class ChangeFeed(BaseModel):
+    """Страница журнала изменений"""
+    changes: List[ChangeEntry]
+    last_seq: int = Field(..., description="since для следующего запроса")
+    has_more: bool
 
 
 # ═══════════════════════════════════════════════════
@@ -126,23 +246,52 @@ class CalendarWeek(BaseModel):
 # FEEDBACK & LEARNING SCHEMAS
 # ═══════════════════════════════════════════════════
 
+PROBABILITY_WORDS = {"high": 0.9, "medium": 0.6, "low": 0.3}
+
+
+def legacy_probability(value):
+    """
+    Уверенность в старом текстовом виде -> доля 0..1, как при миграции
+    колонок (migrations.PROBABILITY_SQL): high/medium/low, "85%",
+    числа больше 1 — проценты. Остальное проверяет сам Field.
+    """
+    if isinstance(value, str):
+        text = value.strip()
+        if text.lower() in PROBABILITY_WORDS:
+            return PROBABILITY_WORDS[text.lower()]
+        if text.endswith("%"):
+            try:
+                return float(text.rstrip("%")) / 100
+            except ValueError:
+                return value
+        try:
+            value = float(text)
+        except ValueError:
+            return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 1:
+        return value / 100
+    return value
+
+
 class FeedbackCreate(BaseModel):
     """Создание feedback на контент"""
     feedback_type: str = Field(..., description="approved, rejected, edited")
-    confidence_before: Optional[str] = None
+    confidence_before: Optional[float] = Field(default=None, ge=0, le=1)
     original_content: Optional[str] = None
     edited_content: Optional[str] = None
     rejection_reason: Optional[str] = None
     rejection_details: Optional[str] = None
     user_id: Optional[str] = None
 
+    _confidence_before = field_validator("confidence_before", mode="before")(legacy_probability)
+
 
 class FeedbackResponse(BaseModel):
     """Ответ с данными feedback"""
     id: int
     post_id: int
     feedback_type: str
-    confidence_before: Optional[str] = None
+    confidence_before: Optional[float] = None
     original_content: Optional[str] = None
     edited_content: Optional[str] = None
     rejection_reason: Optional[str] = None
@@ -164,19 +313,21 @@ class AgentDecisionCreate(BaseModel):
     """Создание записи о решении агента"""
     decision_type: str = Field(..., description="generate, publish, modify_prompt, rollback")
     autonomy_level: int = 2
-    confidence: Optional[str] = None
+    confidence: Optional[float] = Field(default=None, ge=0, le=1)
     action_taken: bool = False
     reason: Optional[str] = None
     outcome: Optional[str] = None
     outcome_details: Optional[str] = None
 
+    _confidence = field_validator("confidence", mode="before")(legacy_probability)
+
 
 class AgentDecisionResponse(BaseModel):
     """Ответ с данными решения агента"""
     id: int
     decision_type: str
     autonomy_level: int
-    confidence: Optional[str] = None
+    confidence: Optional[float] = None
     action_taken: int
     reason: Optional[str] = None
     outcome: Optional[str] = None
@@ -191,12 +342,46 @@ class LearningInsights(BaseModel):
     """Insights от Reflexion анализа"""
     approval_rate: float = Field(..., ge=0, le=1)
     total_feedback: int
-    common_rejection_reasons: dict = Field(default_factory=dict)
+    common_rejection_reasons: dict = Field(default_factory=dict)  # указанные + предсказанные
+    predicted_rejection_reasons: dict = Field(default_factory=dict)  # из них — по тексту
+    unclassified_rejections: int = 0  # без причины и без уверенного предсказания
     successful_patterns: List[str] = Field(default_factory=list)
     improvement_suggestions: List[str] = Field(default_factory=list)
     prompt_version: str
 
 
+class CalibrationBin(BaseModel):
+    """Корзина кривой надёжности"""
+    lower: float
+    upper: float
+    count: int
+    mean_confidence: Optional[float] = None
+    approval_rate: Optional[float] = None
+
+
+class CalibrationGroup(BaseModel):
+    """Калибровка по платформе или версии промпта"""
+    key: Optional[str] = None
+    count: int
+    mean_confidence: Optional[float] = None
+    approval_rate: Optional[float] = None
+    brier_score: Optional[float] = None
+    ece: Optional[float] = None
+
+
+class CalibrationReport(BaseModel):
+    """Насколько уверенность агента предсказывает одобрение"""
+    count: int
+    bins: int
+    mean_confidence: Optional[float] = None
+    approval_rate: Optional[float] = None
+    brier_score: Optional[float] = None
+    ece: Optional[float] = Field(default=None, description="Expected calibration error")
+    reliability: List[CalibrationBin]
+    by_platform: List[CalibrationGroup]
+    by_prompt_version: List[CalibrationGroup]
+
+
 class AgentStatus(BaseModel):
     """Статус агента"""
     autonomy_level: int
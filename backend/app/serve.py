@@ -0,0 +1,28 @@
+"""
+Запуск API с WORKERS процессами
+
+    python -m app.serve [--host 0.0.0.0] [--port 8000]
+
+Число процессов берётся из настройки WORKERS, поэтому приложение и
+сервер одинаково понимают, работают ли они в многопроцессном режиме.
+Для gunicorn: WORKERS=N gunicorn app.main:app -k uvicorn.workers.UvicornWorker -w N
+"""
+import argparse
+
+import uvicorn
+
+from .config import get_settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SMM Dashboard API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=settings.WORKERS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Feedback ревьюеров из Telegram
+
+Бот присылает update'ы (нажатия inline-кнопок и команды). Вебхук
+принимает один update, список или ответ getUpdates ({"result": [...]}).
+
+Идемпотентность по update_id:
+- в памяти процесса — ограниченное множество последних update_id
+  (быстрый отсев повторов без запроса к БД);
+- в БД — таблица telegram_updates: update_id «захватывается»
+  INSERT ... ON CONFLICT DO NOTHING RETURNING в той же транзакции, что и
+  feedback, поэтому повторная доставка или параллельный воркер не
+  применят update второй раз.
+
+Пачка применяется группами по TELEGRAM_BATCH_SIZE: посты группы читаются
+одним запросом, изменения — одним commit. Каждый update выполняется в
+своём SAVEPOINT: ошибка одного (битая команда, сбой записи) становится
+его outcome и не откатывает остальные — иначе Telegram повторял бы
+всю пачку бесконечно.
+
+Форматы:
+    callback_query.data: "approve:42", "reject:42[:reason]"
+    message.text:        "/approve 42", "/reject 42 [подробности]",
+                         "/edit 42" + новый текст со следующей строки
+"""
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .feedback import apply_feedback
+from .models import Post, TelegramUpdate
+from .schemas import FeedbackCreate
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+APPLIED = "applied"
+IGNORED = "ignored"
+
+ACTIONS = {
+    "approve": "approved",
+    "approved": "approved",
+    "reject": "rejected",
+    "rejected": "rejected",
+    "edit": "edited",
+    "edited": "edited",
+}
+
+
+# ───────────────────────────────────────────────
+# Отсев повторов в памяти
+# ───────────────────────────────────────────────
+
+class SeenUpdates:
+    """Последние max_size update_id (LRU)"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._ids: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, update_id: int) -> bool:
+        with self._lock:
+            if update_id in self._ids:
+                self._ids.move_to_end(update_id)
+                return True
+            return False
+
+    def add_many(self, update_ids: Iterable[int]) -> None:
+        with self._lock:
+            for update_id in update_ids:
+                self._ids[update_id] = None
+                self._ids.move_to_end(update_id)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+
+
+seen_updates = SeenUpdates(settings.TELEGRAM_SEEN_CACHE_SIZE)
+
+
+# ───────────────────────────────────────────────
+# Разбор update
+# ───────────────────────────────────────────────
+
+def unpack(payload) -> List[dict]:
+    """Один update, список или ответ getUpdates -> список update'ов"""
+    if isinstance(payload, dict):
+        if isinstance(payload.get("result"), list):
+            return payload["result"]
+        return [payload]
+    if isinstance(payload, list):
+        return payload
+    raise HTTPException(status_code=400, detail="Expected an update object or a list of updates")
+
+
+def parse_update(update: dict) -> Optional[dict]:
+    """update -> {"post_id", "feedback"} или None, если это не команда ревью"""
+    if "callback_query" in update:
+        query = update["callback_query"]
+        parts = str(query.get("data", "")).split(":", 2)
+        action, rest, text = parts[0], parts[1:], None
+        reason = rest[1] if len(rest) > 1 else None
+    elif "message" in update:
+        query = update["message"]
+        raw = str(query.get("text") or "")
+        if not raw.startswith("/"):
+            return None
+        first_line, _, text = raw.partition("\n")
+        parts = first_line[1:].split(maxsplit=2)
+        if not parts:
+            # "/" без команды — как неизвестная команда
+            return None
+        command, *args = parts
+        action, rest, reason = command.split("@")[0], args[:1], None
+        if action.lower() == "reject" and len(args) > 1:
+            text = args[1]
+    else:
+        return None
+
+    feedback_type = ACTIONS.get(action.lower())
+    if feedback_type is None or not rest or not rest[0].isdigit():
+        return None
+
+    user = query.get("from") or {}
+    data = FeedbackCreate(
+        feedback_type=feedback_type,
+        user_id=str(user["id"]) if "id" in user else None,
+    )
+    if feedback_type == "rejected":
+        data.rejection_reason = reason
+        data.rejection_details = text or None
+    elif feedback_type == "edited":
+        if not (text or "").strip():
+            return None
+        data.edited_content = text.strip()
+    return {"post_id": int(rest[0]), "feedback": data}
+
+
+# ───────────────────────────────────────────────
+# Применение
+# ───────────────────────────────────────────────
+
+def _claim(db: Session, update_ids: List[int]) -> set:
+    """Записать update_id; вернуть те, что ещё не обрабатывались"""
+    rows = db.execute(
+        insert(TelegramUpdate)
+        .values([{"update_id": update_id, "received_at": datetime.utcnow()} for update_id in update_ids])
+        .on_conflict_do_nothing()
+        .returning(TelegramUpdate.update_id)
+    )
+    return {row[0] for row in rows}
+
+
+def _apply_group(db: Session, updates: dict) -> dict:
+    """Одна транзакция: захват update_id, feedback, статусы, итоги"""
+    claimed = _claim(db, sorted(updates))
+    outcomes = {}
+    commands = {}
+    for update_id in sorted(claimed):
+        try:
+            commands[update_id] = parse_update(updates[update_id])
+        except Exception as exc:
+            outcomes[update_id] = _failure(update_id, exc)
+
+    post_ids = {command["post_id"] for command in commands.values() if command}
+    posts = {post.id: post for post in db.query(Post).filter(Post.id.in_(post_ids))} if post_ids else {}
+
+    for update_id, command in commands.items():
+        if command is None:
+            outcomes[update_id] = IGNORED
+            continue
+        post = posts.get(command["post_id"])
+        if post is None:
+            outcomes[update_id] = "post not found"
+            continue
+        savepoint = db.begin_nested()
+        try:
+            apply_feedback(db, post, command["feedback"])
+            savepoint.commit()
+            outcomes[update_id] = APPLIED
+        except HTTPException as exc:
+            # Переход статуса не прошёл — update отмечается, остальные применяются
+            savepoint.rollback()
+            outcomes[update_id] = str(exc.detail)[:100]
+        except Exception as exc:
+            savepoint.rollback()
+            outcomes[update_id] = _failure(update_id, exc)
+
+    if outcomes:
+        db.execute(
+            update(TelegramUpdate),
+            [{"update_id": update_id, "outcome": outcome} for update_id, outcome in outcomes.items()]
+        )
+    db.commit()
+    return {"claimed": len(claimed), "outcomes": outcomes}
+
+
+def _failure(update_id: int, exc: Exception) -> str:
+    logger.exception("Telegram update %s failed", update_id)
+    return f"error: {type(exc).__name__}: {exc}"[:100]
+
+
+def process_updates(db: Session, payload) -> dict:
+    """Применить пачку update'ов; повторы (в пачке, в памяти, в БД) пропускаются"""
+    updates = unpack(payload)
+    result = {"received": len(updates), "applied": 0, "duplicates": 0, "ignored": 0, "failed": 0}
+
+    fresh: dict = {}
+    for item in updates:
+        update_id = item.get("update_id") if isinstance(item, dict) else None
+        if not isinstance(update_id, int):
+            result["ignored"] += 1
+        elif update_id in fresh or update_id in seen_updates:
+            result["duplicates"] += 1
+        else:
+            fresh[update_id] = item
+
+    ids = sorted(fresh)
+    for start in range(0, len(ids), settings.TELEGRAM_BATCH_SIZE):
+        group = {update_id: fresh[update_id] for update_id in ids[start:start + settings.TELEGRAM_BATCH_SIZE]}
+        try:
+            applied = _apply_group(db, group)
+        except Exception:
+            db.rollback()
+            raise
+        seen_updates.add_many(group)
+
+        result["duplicates"] += len(group) - applied["claimed"]
+        for outcome in applied["outcomes"].values():
+            key = "applied" if outcome == APPLIED else "ignored" if outcome == IGNORED else "failed"
+            result[key] += 1
+    return result
+
+
+def prune(conn: Connection, now: Optional[datetime] = None) -> int:
+    """Удалить update_id старше TELEGRAM_UPDATE_RETENTION_DAYS (вызывается из retention)"""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=settings.TELEGRAM_UPDATE_RETENTION_DAYS)
+    return conn.execute(
+        delete(TelegramUpdate).where(TelegramUpdate.received_at < cutoff)
+    ).rowcount
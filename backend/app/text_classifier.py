@@ -0,0 +1,266 @@
+"""
+Классификатор коротких текстов: TF-IDF + логистическая регрессия на NumPy
+
+scikit-learn и scipy не нужны: матрица признаков — CSR из трёх массивов
+(indptr, indices, data), произведения с весами считаются через
+np.bincount по классам.
+
+Признаки — слова, пары соседних слов и символьные n-граммы 3–5 внутри
+слова (устойчивы к опечаткам и падежным окончаниям). В словарь попадают
+признаки, встретившиеся хотя бы в MIN_DF документах, не больше
+MAX_FEATURES самых частых. Вес — (1 + log tf) · idf, строка нормируется
+по L2.
+
+Модель — мультиклассовая (softmax) логистическая регрессия с L2,
+обучается мини-батчами Adam; веса классов обратно пропорциональны
+частоте, чтобы редкие причины не тонули в частых.
+"""
+import io
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+WORD = re.compile(r"\w+")
+CHAR_NGRAMS = (3, 4, 5)
+MIN_DF = 2
+MAX_FEATURES = 50_000
+
+
+@lru_cache(maxsize=100_000)
+def _word_features(word: str) -> Tuple[str, ...]:
+    """Слово и его символьные n-граммы (слова повторяются — считаются один раз)"""
+    padded = f" {word} "
+    return (f"w {word}",) + tuple(
+        f"c {padded[i:i + n]}" for n in CHAR_NGRAMS for i in range(len(padded) - n + 1)
+    )
+
+
+def features(text: str) -> List[str]:
+    """Признаки текста (с повторами — из них считается tf)"""
+    words = WORD.findall(text.lower())
+    result = [f"b {first} {second}" for first, second in zip(words, words[1:])]
+    for word in words:
+        result.extend(_word_features(word))
+    return result
+
+
+class Csr(NamedTuple):
+    """Разреженная матрица по строкам"""
+    indptr: np.ndarray   # int64, строк + 1
+    indices: np.ndarray  # int32, номера признаков
+    data: np.ndarray     # float64, веса
+
+    @property
+    def rows(self) -> int:
+        return len(self.indptr) - 1
+
+    def row_ids(self) -> np.ndarray:
+        """Номер строки для каждого ненулевого элемента"""
+        return np.repeat(np.arange(self.rows), np.diff(self.indptr))
+
+    def take(self, rows: np.ndarray) -> "Csr":
+        """Подматрица из строк rows (в их порядке)"""
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        positions = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return Csr(indptr, self.indices[positions], self.data[positions])
+
+
+class Vectorizer:
+    """Тексты -> строки TF-IDF по зафиксированному словарю"""
+
+    def __init__(self, vocabulary: Sequence[str], idf: np.ndarray):
+        self.vocabulary = list(vocabulary)
+        self.index = {feature: i for i, feature in enumerate(self.vocabulary)}
+        self.idf = idf
+
+    @classmethod
+    def fit_transform(cls, texts: Sequence[str]) -> Tuple["Vectorizer", Csr]:
+        documents = [Counter(features(text)) for text in texts]
+        df = Counter()
+        for document in documents:
+            df.update(document.keys())
+        kept = [feature for feature, count in df.items() if count >= MIN_DF]
+        if len(kept) > MAX_FEATURES:
+            kept = sorted(kept, key=lambda feature: (-df[feature], feature))[:MAX_FEATURES]
+        kept.sort()
+        n = len(documents)
+        idf = np.array([math.log((1 + n) / (1 + df[feature])) + 1 for feature in kept])
+        vectorizer = cls(kept, idf)
+        return vectorizer, vectorizer._matrix(documents)
+
+    def transform(self, texts: Sequence[str]) -> Csr:
+        return self._matrix([Counter(features(text)) for text in texts])
+
+    def _matrix(self, documents: List[Counter]) -> Csr:
+        indptr = [0]
+        indices = []
+        counts = []
+        for document in documents:
+            for feature, count in document.items():
+                column = self.index.get(feature)
+                if column is not None:
+                    indices.append(column)
+                    counts.append(count)
+            indptr.append(len(indices))
+        indices = np.array(indices, dtype=np.int32)
+        data = (1 + np.log(np.array(counts, dtype=np.float64))) * self.idf[indices]
+        matrix = Csr(np.array(indptr, dtype=np.int64), indices, data)
+        norms = np.sqrt(np.bincount(matrix.row_ids(), weights=data ** 2, minlength=matrix.rows))
+        data /= norms[matrix.row_ids()]
+        return matrix
+
+
+class SoftmaxRegression:
+    """Линейная модель: веса (признаки × классы) и смещения"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray):
+        self.weights = weights
+        self.bias = bias
+
+    def scores(self, x: Csr) -> np.ndarray:
+        # Строки CSR идут подряд: суммы по строкам — reduceat по началам непустых строк
+        out = np.tile(self.bias, (x.rows, 1))
+        filled = np.flatnonzero(np.diff(x.indptr))
+        if len(filled):
+            contrib = self.weights[x.indices] * x.data[:, None]
+            out[filled] += np.add.reduceat(contrib, x.indptr[filled], axis=0)
+        return out
+
+    def predict_proba(self, x: Csr) -> np.ndarray:
+        scores = self.scores(x)
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    @classmethod
+    def fit(
+        cls, x: Csr, y: np.ndarray, classes: int, n_features: int, l2: float = 1e-4, epochs: int = 5,
+        batch_size: int = 1024, learning_rate: float = 0.1, min_steps: int = 100, seed: int = 0
+    ) -> "SoftmaxRegression":
+        """
+        Мини-батчи Adam. Обновляются только признаки, встретившиеся в
+        батче (lazy Adam, L2 — к ним же): шаг стоит O(ненулевых
+        элементов), а не O(словаря). На малых выборках эпох больше —
+        не меньше min_steps шагов.
+        """
+        rng = np.random.default_rng(seed)
+        epochs = max(epochs, math.ceil(min_steps / math.ceil(x.rows / batch_size)))
+        model = cls(np.zeros((n_features, classes)), np.zeros(classes))
+        counts = np.bincount(y, minlength=classes)
+        sample_weight = (len(y) / (classes * np.maximum(counts, 1)))[y]
+        onehot = np.eye(classes)[y]
+
+        first, second = np.zeros_like(model.weights), np.zeros_like(model.weights)
+        bias_first, bias_second = np.zeros(classes), np.zeros(classes)
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        step = 0
+        for _ in range(epochs):
+            order = rng.permutation(x.rows)
+            for start in range(0, x.rows, batch_size):
+                batch = order[start:start + batch_size]
+                xb = x.take(batch)
+                residual = (model.predict_proba(xb) - onehot[batch]) * sample_weight[batch, None]
+                residual /= sample_weight[batch].sum()
+
+                touched, column = np.unique(xb.indices, return_inverse=True)
+                contrib = np.ascontiguousarray((residual[xb.row_ids()] * xb.data[:, None]).T)
+                grad = np.stack([
+                    np.bincount(column, weights=weights, minlength=len(touched)) for weights in contrib
+                ], axis=1) + l2 * model.weights[touched]
+
+                step += 1
+                scale = learning_rate * np.sqrt(1 - beta2 ** step) / (1 - beta1 ** step)
+                m = beta1 * first[touched] + (1 - beta1) * grad
+                v = beta2 * second[touched] + (1 - beta2) * grad ** 2
+                first[touched], second[touched] = m, v
+                model.weights[touched] -= scale * m / (np.sqrt(v) + eps)
+
+                bias_grad = residual.sum(axis=0)
+                bias_first = beta1 * bias_first + (1 - beta1) * bias_grad
+                bias_second = beta2 * bias_second + (1 - beta2) * bias_grad ** 2
+                model.bias -= scale * bias_first / (np.sqrt(bias_second) + eps)
+        return model
+
+
+class TextClassifier:
+    """Векторизатор + модель + названия классов"""
+
+    def __init__(self, labels: Sequence[str], vectorizer: Vectorizer, model: SoftmaxRegression):
+        self.labels = list(labels)
+        self.vectorizer = vectorizer
+        self.model = model
+
+    @classmethod
+    def train(
+        cls, texts: Sequence[str], labels: Sequence[str], holdout: float = 0.2, seed: int = 0
+    ) -> Tuple["TextClassifier", dict]:
+        """
+        Модель на всех строках и метрики отдельной модели, обученной без
+        доли holdout строк каждого класса (словарь и idf — общие).
+        """
+        classes = sorted(set(labels))
+        code = {label: i for i, label in enumerate(classes)}
+        vectorizer, x = Vectorizer.fit_transform(texts)
+        y = np.array([code[label] for label in labels], dtype=np.int64)
+        n_features = len(vectorizer.vocabulary)
+
+        rng = np.random.default_rng(seed)
+        test = np.zeros(len(y), dtype=bool)
+        for k in range(len(classes)):
+            rows = np.flatnonzero(y == k)
+            test[rng.choice(rows, size=int(len(rows) * holdout), replace=False)] = True
+        metrics = {"holdout_rows": int(test.sum())}
+        if 0 < test.sum() < len(y):
+            train_rows, test_rows = np.flatnonzero(~test), np.flatnonzero(test)
+            model = SoftmaxRegression.fit(x.take(train_rows), y[train_rows], len(classes), n_features, seed=seed)
+            metrics.update(_scores(model.predict_proba(x.take(test_rows)).argmax(axis=1), y[test_rows]))
+
+        model = SoftmaxRegression.fit(x, y, len(classes), n_features, seed=seed)
+        return cls(classes, vectorizer, model), metrics
+
+    def predict(self, texts: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+        """Класс и его вероятность для каждого текста"""
+        proba = self.model.predict_proba(self.vectorizer.transform(texts))
+        best = proba.argmax(axis=1)
+        return [self.labels[i] for i in best], proba[np.arange(len(best)), best]
+
+    def dumps(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            labels=np.array(self.labels, dtype=str),
+            vocabulary=np.array(self.vectorizer.vocabulary, dtype=str),
+            idf=self.vectorizer.idf,
+            weights=self.model.weights.astype(np.float32),
+            bias=self.model.bias,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def loads(cls, blob: bytes) -> "TextClassifier":
+        with np.load(io.BytesIO(blob), allow_pickle=False) as data:
+            return cls(
+                data["labels"].tolist(),
+                Vectorizer(data["vocabulary"].tolist(), data["idf"]),
+                SoftmaxRegression(data["weights"].astype(np.float64), data["bias"]),
+            )
+
+
+def _scores(predicted: np.ndarray, actual: np.ndarray) -> dict:
+    """Точность и macro-F1 по классам, встретившимся в actual"""
+    f1 = []
+    for k in np.unique(actual):
+        true_positive = np.sum((predicted == k) & (actual == k))
+        precision = true_positive / max(np.sum(predicted == k), 1)
+        recall = true_positive / np.sum(actual == k)
+        f1.append(0.0 if true_positive == 0 else 2 * precision * recall / (precision + recall))
+    return {
+        "accuracy": round(float(np.mean(predicted == actual)), 4),
+        "macro_f1": round(float(np.mean(f1)), 4),
+    }
@@ -0,0 +1,145 @@
+"""
+Запись трасс запросов для воспроизведения (benchmarks/soak.py)
+
+При заданном TRACE_PATH каждый HTTP-запрос пишется строкой JSON:
+ts (unix-время прихода), method, path, route (шаблон пути), query,
+body (форма тела), idempotency (был ли Idempotency-Key), status,
+duration_ms, bytes.
+
+Форма тела — тот же JSON, в котором свободный текст заменён на "x" той
+же длины. Короткие строки-токены (платформы, статусы, callback_data,
+даты) и числа сохраняются: без них повтор не пройдёт валидацию. Так
+же обрабатываются параметры query. Заголовки не пишутся. Тела не-JSON
+(загрузка картинок) и тела больше TRACE_MAX_BODY_BYTES не пишутся.
+
+Запись — в буфер файла из цикла событий, сброс раз в секунду и при
+остановке. При WORKERS > 1 у каждого процесса свой файл (<имя>.<pid>).
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import get_settings
+from .workers import multi_worker
+
+settings = get_settings()
+
+TOKEN = re.compile(r"[A-Za-z0-9_.:+\-]{1,40}")
+FLUSH_SECONDS = 1.0
+
+
+def shape(value: Any) -> Any:
+    """JSON без свободного текста: строки, кроме токенов, — "x" той же длины"""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [shape(item) for item in value]
+    if isinstance(value, str) and not TOKEN.fullmatch(value):
+        return "x" * len(value)
+    return value
+
+
+def shape_query(query: str) -> str:
+    return urlencode([(key, shape(value)) for key, value in parse_qsl(query, keep_blank_values=True)])
+
+
+class TraceRecorder:
+    """Строки трассы в файл; файл открывается при первой записи"""
+
+    def __init__(self, path: str):
+        if multi_worker():
+            root, ext = os.path.splitext(path)
+            path = f"{root}.{os.getpid()}{ext}"
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._flushed_at = time.monotonic()
+
+    def write(self, entry: dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            now = time.monotonic()
+            if now - self._flushed_at >= FLUSH_SECONDS:
+                self._file.flush()
+                self._flushed_at = now
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+recorder: Optional[TraceRecorder] = TraceRecorder(settings.TRACE_PATH) if settings.TRACE_PATH else None
+
+
+class TraceMiddleware:
+    """ASGI middleware: запрос и ответ -> строка трассы"""
+
+    def __init__(self, app: ASGIApp, recorder: TraceRecorder, max_body_bytes: int = 65536):
+        self.app = app
+        self.recorder = recorder
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        capture = headers.get("content-type", "").startswith("application/json")
+        chunks = []
+        size = 0
+        response = {"status": None, "bytes": 0}
+
+        async def traced_receive() -> Message:
+            nonlocal size
+            message = await receive()
+            if capture and message["type"] == "http.request":
+                size += len(message.get("body", b""))
+                if size <= self.max_body_bytes:
+                    chunks.append(message.get("body", b""))
+            return message
+
+        async def traced_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        ts = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, traced_receive, traced_send)
+        finally:
+            body = None
+            if chunks and size <= self.max_body_bytes:
+                try:
+                    body = shape(json.loads(b"".join(chunks)))
+                except ValueError:
+                    pass
+            route = scope.get("route")
+            self.recorder.write({
+                "ts": round(ts, 3),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "query": shape_query(scope.get("query_string", b"").decode("latin-1")),
+                "body": body,
+                "idempotency": "idempotency-key" in headers,
+                "status": response["status"] or 500,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "bytes": response["bytes"],
+            })
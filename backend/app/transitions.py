@@ -0,0 +1,203 @@
+"""
+Переходы статусов постов
+
+Все смены статуса идут через этот модуль:
+- таблица разрешённых переходов ALLOWED_TRANSITIONS;
+- compare-and-set: UPDATE ... WHERE status = :expected, поэтому два
+  ревьюера не могут одновременно перевести пост из одного состояния;
+- массовые переходы одним UPDATE на каждый исходный статус.
+
+Функции не делают commit — вызывающий код коммитит вместе с
+остальными изменениями (например, записью feedback). Агрегаты по
+платформам и журнал изменений обновляются в той же транзакции.
+"""
+from datetime import datetime
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from . import changes, platform_stats
+from .models import Post, PostStatus
+
+S = PostStatus
+
+ALLOWED_TRANSITIONS = {
+    S.IDEA: {S.DRAFT, S.REJECTED},
+    S.DRAFT: {S.IDEA, S.REVIEW, S.REJECTED},
+    S.REVIEW: {S.DRAFT, S.SCHEDULED, S.REJECTED},
+    S.SCHEDULED: {S.REVIEW, S.SCHEDULED, S.PUBLISHED, S.REJECTED},  # SCHEDULED -> SCHEDULED: перенос
+    S.PUBLISHED: set(),
+    S.REJECTED: {S.IDEA, S.DRAFT},
+}
+
+
+class TransitionError(HTTPException):
+    """Недопустимый переход (400), конфликт статуса (409) или нет поста (404)"""
+
+
+def parse_status(value: str) -> PostStatus:
+    try:
+        return PostStatus(value)
+    except ValueError:
+        raise TransitionError(status_code=400, detail=f"Unknown status '{value}'")
+
+
+def known_status(value: str) -> Optional[PostStatus]:
+    """Статус поста или None, если его нет в PostStatus (старые данные)"""
+    try:
+        return PostStatus(value)
+    except ValueError:
+        return None
+
+
+def can_transition(current: str, target: PostStatus) -> bool:
+    try:
+        return target in ALLOWED_TRANSITIONS[PostStatus(current)]
+    except ValueError:
+        return False
+
+
+def sources_for(target: PostStatus) -> list:
+    """Статусы, из которых разрешён переход в target"""
+    return [source for source, targets in ALLOWED_TRANSITIONS.items() if target in targets]
+
+
+def transition(
+    db: Session,
+    post_id: int,
+    target: PostStatus,
+    expected: Optional[PostStatus] = None,
+    values: Optional[dict] = None
+) -> str:
+    """
+    Перевести пост в target через compare-and-set.
+
+    expected — статус, в котором пост должен быть сейчас. Если не задан,
+    берётся текущий статус из БД. Возвращает предыдущий статус.
+    """
+    if expected is None:
+        current = _current_status(db, post_id)
+        if not can_transition(current, target):
+            raise _invalid(current, target)
+        expected = PostStatus(current)
+    elif target not in ALLOWED_TRANSITIONS[expected]:
+        raise _invalid(expected.value, target)
+
+    now = datetime.utcnow()
+    row = db.execute(
+        update(Post)
+        .where(Post.id == post_id, Post.status == expected.value)
+        .values(status=target.value, **_extra_values(target, values, now))
+        .returning(Post.platform)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is not None:
+        platform_stats.on_status_changed(db, [(row.platform, expected.value)], target.value, now)
+        changes.record(db, changes.POST, post_id, changes.UPDATED, _change_data(expected.value, target, values))
+        _expire(db, post_id)
+        return expected.value
+
+    # Строка не обновилась: поста нет, переход запрещён или статус уже сменили
+    current = _current_status(db, post_id)
+    if not can_transition(current, target):
+        raise _invalid(current, target)
+    raise TransitionError(
+        status_code=409,
+        detail=f"Post status is '{current}', expected '{expected.value}'"
+    )
+
+
+def bulk_transition(
+    db: Session,
+    post_ids: Iterable[int],
+    target: PostStatus,
+    sources: Optional[Iterable[PostStatus]] = None,
+    values: Optional[dict] = None
+) -> dict:
+    """
+    Массовый переход. Для каждого исходного статуса — один
+    UPDATE ... WHERE id IN (...) AND status = :expected RETURNING.
+
+    Возвращает {"updated": [{"id", "platform", "from_status"}], "skipped": [id]}.
+    """
+    ids = list(dict.fromkeys(post_ids))
+    allowed = set(sources_for(target))
+    # target -> target (перенос) идёт первым, чтобы не обновить строку дважды
+    sources = sorted(
+        (s for s in set(sources or allowed) if s in allowed),
+        key=lambda s: (s != target, s.value)
+    )
+    now = datetime.utcnow()
+    values = {"status": target.value, **_extra_values(target, values, now)}
+
+    updated = []
+    for source in sources:
+        rows = db.execute(
+            update(Post)
+            .where(Post.id.in_(ids), Post.status == source.value)
+            .values(**values)
+            .returning(Post.id, Post.platform)
+            .execution_options(synchronize_session=False)
+        ).all()
+        updated.extend(
+            {"id": row.id, "platform": row.platform, "from_status": source.value}
+            for row in rows
+        )
+
+    platform_stats.on_status_changed(
+        db, [(row["platform"], row["from_status"]) for row in updated], target.value, now
+    )
+    changes.record_many(db, [
+        changes.entry(
+            changes.POST, row["id"], changes.UPDATED,
+            _change_data(row["from_status"], target, values)
+        )
+        for row in updated
+    ])
+
+    done = {row["id"] for row in updated}
+    if done:
+        db.expire_all()
+
+    return {
+        "updated": updated,
+        "skipped": [post_id for post_id in ids if post_id not in done]
+    }
+
+
+def _extra_values(target: PostStatus, values: Optional[dict], now: datetime) -> dict:
+    """Дополнительные поля UPDATE; при публикации проставляется published_at"""
+    extra = dict(values or {})
+    if target == PostStatus.PUBLISHED:
+        extra.setdefault("published_at", now)
+    return extra
+
+
+def _change_data(from_status: str, target: PostStatus, values: Optional[dict]) -> dict:
+    data = {"from_status": from_status, "status": target.value}
+    if values:
+        data["fields"] = sorted(values)
+    return data
+
+
+def _current_status(db: Session, post_id: int) -> str:
+    status = db.query(Post.status).filter(Post.id == post_id).scalar()
+    if status is None:
+        raise TransitionError(status_code=404, detail="Post not found")
+    return status
+
+
+def _invalid(current: str, target: PostStatus) -> TransitionError:
+    return TransitionError(
+        status_code=400,
+        detail=f"Cannot change status from '{current}' to '{target.value}'"
+    )
+
+
+def _expire(db: Session, post_id: int) -> None:
+    """Сбросить закэшированный в сессии пост — UPDATE шёл мимо ORM"""
+    post = db.identity_map.get(db.identity_key(Post, post_id))
+    if post is not None:
+        db.expire(post)
@@ -0,0 +1,57 @@
+"""
+Многопроцессный режим (uvicorn --workers N / gunicorn)
+
+При WORKERS > 1 каждый процесс выполняет lifespan и держит свои
+объекты в памяти. Здесь — файловые блокировки для того, что должно
+выполняться одним процессом за раз: создание схемы при старте,
+выделение id в журнале агента, обновление circuit breaker, retention.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from .config import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: только один процесс
+    fcntl = None
+
+settings = get_settings()
+
+STARTUP_LOCK = "startup"
+
+_thread_locks: dict = {}
+_thread_locks_guard = threading.Lock()
+
+
+def multi_worker() -> bool:
+    return settings.WORKERS > 1
+
+
+def lock_path(name: str) -> str:
+    return os.path.join(settings.LOCK_DIR, f".smm_dashboard.{name}.lock")
+
+
+@contextmanager
+def file_lock(name: str) -> Iterator[None]:
+    """
+    Эксклюзивная блокировка между процессами (flock) и потоками.
+    flock привязан к открытому файлу, поэтому потоки одного процесса
+    дополнительно сериализуются обычным Lock.
+    """
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(name, threading.Lock())
+
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(settings.LOCK_DIR, exist_ok=True)
+        with open(lock_path(name), "a") as handle:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
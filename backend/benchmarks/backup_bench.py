@@ -0,0 +1,128 @@
+"""
+Бенчмарк резервного копирования (app.backup) под нагрузкой записи.
+
+Заполняет временную БД до --size-mb мегабайт постов и делает снимок,
+пока отдельный поток без пауз пишет feedback. Печатает время копирования,
+скорость, число шагов и перезапусков, время сжатия и самую долгую запись
+во время снимка и --tail секунд после него (там переносится WAL,
+накопленный за время копирования). Если запись ждала дольше --stall-budget мс или
+копирование перезапускалось, скрипт завершается с кодом 1.
+
+Многогигабайтная БД: --size-mb 4096 (нужно вдвое больше места в --workdir).
+
+Запуск из каталога backend:
+    python -m benchmarks.backup_bench [--size-mb 512] [--compress zstd] [--workdir /var/tmp]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+ROW_BYTES = 4096
+
+
+def setup(workdir: str) -> str:
+    path = os.path.join(workdir, "backup.db")
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{path}",
+        ARCHIVE_DATABASE_PATH="",
+        LOCK_DIR=workdir,
+        CACHE_PATH=os.path.join(workdir, "cache.db"),
+        BACKUP_DIR=os.path.join(workdir, "backups"),
+    )
+    from app.database import get_engine
+    from app.migrations import migrate
+
+    migrate()
+    get_engine().dispose()  # журнал WAL выставлен при подключении
+    return path
+
+
+def seed(path: str, size_mb: int) -> None:
+    rows = size_mb * 1024 * 1024 // ROW_BYTES
+    content = "x" * (ROW_BYTES - 200)
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO posts (title, content, platform, status) VALUES (?, ?, 'telegram', 'draft')",
+        ((f"post {i}", content) for i in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+class Writer(threading.Thread):
+    """Поток записи: отдельная транзакция на каждую строку feedback"""
+
+    def __init__(self, path: str):
+        super().__init__(daemon=True)
+        self.path = path
+        self.stop = threading.Event()
+        self.measure = threading.Event()
+        self.writes = 0
+        self.max_stall = 0.0
+
+    def run(self) -> None:
+        conn = sqlite3.connect(self.path, timeout=60)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        while not self.stop.is_set():
+            started = time.perf_counter()
+            conn.execute(
+                "INSERT INTO feedback (post_id, feedback_type, confidence_before) VALUES (1, 'approved', 0.8)"
+            )
+            conn.commit()
+            if self.measure.is_set():
+                self.writes += 1
+                self.max_stall = max(self.max_stall, time.perf_counter() - started)
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--compress", choices=("gzip", "zstd"), default=None)
+    parser.add_argument("--workdir", default=None, help="каталог для временных файлов")
+    parser.add_argument("--tail", type=float, default=2.0, help="с записи после снимка (checkpoint WAL)")
+    parser.add_argument("--stall-budget", type=float, default=250.0, help="мс на самую долгую запись")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        path = setup(workdir)
+        started = time.perf_counter()
+        seed(path, args.size_mb)
+        print(f"заполнение {os.path.getsize(path) / 1024 / 1024:.0f} МБ: {time.perf_counter() - started:.1f} с")
+
+        from app import backup
+
+        writer = Writer(path)
+        writer.start()
+        time.sleep(0.5)
+        writer.measure.set()
+        result = backup.take_snapshot(args.compress, keep=1)
+        time.sleep(args.tail)
+        writer.measure.clear()
+        writer.stop.set()
+        writer.join()
+
+    stats = result["databases"]["main"]
+    print(
+        f"копирование: {stats['seconds']:.1f} с, {stats['mb_per_second']} МБ/с, "
+        f"шагов {stats['steps']}, перезапусков {stats['restarts']}"
+    )
+    if args.compress:
+        print(
+            f"сжатие {args.compress}: {stats['compress_seconds']:.1f} с, "
+            f"{stats['bytes'] / 1024 / 1024:.0f} -> {stats['compressed_bytes'] / 1024 / 1024:.0f} МБ"
+        )
+    stall_ms = writer.max_stall * 1000
+    print(f"запись во время снимка и после: {writer.writes} транзакций, максимум {stall_ms:.1f} мс")
+
+    ok = stall_ms <= args.stall_budget and stats["restarts"] == 0
+    print("бюджет:", "OK" if ok else f"ПРЕВЫШЕН ({args.stall_budget:.0f} мс, без перезапусков)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
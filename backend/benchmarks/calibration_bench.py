@@ -0,0 +1,106 @@
+"""
+Бенчмарк калибровки уверенности (/api/agent/learning/calibration).
+
+Заполняет временную БД --rows строками feedback по --posts постам и
+меряет: первую загрузку истории в память, повторный отчёт (дочитывание
+пустое) и отчёт после --append новых строк. Если повторный отчёт
+медленнее --budget мс, скрипт завершается с кодом 1.
+
+Запуск из каталога backend:
+    python -m benchmarks.calibration_bench [--rows 1000000] [--budget 300]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+PLATFORMS = ("telegram", "linkedin", "vk", "twitter")
+VERSIONS = ("v1.0.0", "v1.1.0", "v1.2.0", "v2.0.0")
+
+
+def setup(workdir: str) -> str:
+    path = os.path.join(workdir, "calibration.db")
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{path}",
+        ARCHIVE_DATABASE_PATH="",
+        LOCK_DIR=workdir,
+        CACHE_PATH=os.path.join(workdir, "cache.db"),
+    )
+    from app.migrations import migrate
+
+    migrate()
+    return path
+
+
+def seed(path: str, rows: int, posts: int, first_id: int = 1) -> None:
+    """Посты и feedback напрямую через sqlite3: ORM здесь только мешает"""
+    rng = random.Random(first_id)
+    start = datetime.utcnow() - timedelta(days=365)
+    conn = sqlite3.connect(path)
+    if first_id == 1:
+        conn.executemany(
+            "INSERT INTO posts (id, title, content, platform, status, prompt_version)"
+            " VALUES (?, '', '', ?, 'scheduled', ?)",
+            ((i, PLATFORMS[i % 4], VERSIONS[i % 4]) for i in range(1, posts + 1))
+        )
+
+    def feedback():
+        for i in range(first_id, first_id + rows):
+            confidence = rng.random()
+            # Уверенность слегка завышена: одобрение с вероятностью 0.8 * confidence
+            approved = rng.random() < 0.8 * confidence
+            yield (
+                i, rng.randrange(1, posts + 1),
+                "approved" if approved else "rejected", confidence,
+                (start + timedelta(seconds=i * 30)).isoformat(sep=" "),
+            )
+
+    conn.executemany(
+        "INSERT INTO feedback (id, post_id, feedback_type, confidence_before, created_at)"
+        " VALUES (?, ?, ?, ?, ?)",
+        feedback()
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(label: str, **params) -> float:
+    from app import calibration
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        result = calibration.report(db, **params)
+        elapsed = (time.perf_counter() - started) * 1000
+    print(f"{label:<28} {elapsed:>8.1f} мс  n={result['count']:<8} brier={result['brier_score']} ece={result['ece']}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--posts", type=int, default=20_000)
+    parser.add_argument("--append", type=int, default=1_000)
+    parser.add_argument("--budget", type=float, default=300.0, help="мс на повторный отчёт")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = setup(workdir)
+        seed(path, args.rows, args.posts)
+
+        timed("первая загрузка")
+        warm = timed("повторный отчёт")
+        timed("окно 30 дней + платформа", days=30, platform="linkedin")
+        seed(path, args.append, args.posts, first_id=args.rows + 1)
+        timed(f"после +{args.append} строк")
+
+    print("бюджет:", "OK" if warm <= args.budget else f"ПРЕВЫШЕН ({args.budget:.0f} мс)")
+    sys.exit(0 if warm <= args.budget else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Бенчмарк сжатия ответов: байты на проводе и CPU на запрос.
+
+Запуск из каталога backend:
+    python -m benchmarks.compression_bench [--posts 100] [--repeat 200]
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+
+from app.compression import CompressionMiddleware, Compressor, available_encodings
+
+
+def build_post_list(count: int) -> bytes:
+    """Синтетический PostList, похожий на реальный ответ /api/posts"""
+    rng = random.Random(42)
+    words = (
+        "команда проект найм культура лидерство продукт рост метрики "
+        "доверие процесс клиент рынок стратегия опыт навыки онбординг"
+    ).split()
+    now = datetime.utcnow().isoformat()
+    items = [
+        {
+            "id": i,
+            "title": f"Как собрать команду мечты: выпуск {i}",
+            "content": " ".join(rng.choice(words) for _ in range(120)),
+            "platform": ("telegram", "linkedin", "vk", "twitter")[i % 4],
+            "author": "Кристина Жукова",
+            "status": ("idea", "draft", "review", "scheduled", "published")[i % 5],
+            "image_url": None,
+            "image_prompt": None,
+            "ai_prompt": "Напиши пост для LinkedIn о командной работе",
+            "ai_model": "llama-3.3-70b",
+            "scheduled_at": now,
+            "published_at": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+    payload = {"items": items, "total": count, "limit": count, "offset": 0}
+    return json.dumps(payload, ensure_ascii=False).encode()
+
+
+def measure(fn, repeat: int) -> float:
+    """Среднее время вызова в миллисекундах"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    body = build_post_list(args.posts)
+    compressor = Compressor()
+    middleware = CompressionMiddleware(app=None, compressor=compressor)
+
+    print(f"PostList из {args.posts} постов: {len(body)} байт без сжатия")
+    print(f"{'encoding':<10}{'bytes':>10}{'ratio':>8}{'compress ms':>14}{'cached ms':>12}")
+    for encoding in available_encodings():
+        compressed = compressor.compress(body, encoding)
+        cold = measure(lambda: compressor.compress(body, encoding), args.repeat)
+        middleware.encode(body, encoding, cacheable=True)
+        # Каждый ответ — новый объект bytes, поэтому копируем тело
+        warm = measure(
+            lambda: middleware.encode(bytes(bytearray(body)), encoding, cacheable=True),
+            args.repeat,
+        )
+        print(
+            f"{encoding:<10}{len(compressed):>10}{len(compressed) / len(body):>8.2f}"
+            f"{cold:>14.3f}{warm:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Бенчмарк разделения чтения и записи (database.get_read_db / очередь записи).
+
+Смешанная нагрузка на временной БД: --readers потоков выполняют
+аналитический запрос (агрегат feedback по платформам) через
+ReadSessionLocal, --writers потоков — короткие транзакции записи
+(feedback + commit) через SessionLocal. Два прогона в отдельных
+процессах (настройки читаются при импорте):
+- shared — DB_READ_POOL_SIZE=0: чтение и запись через один пул
+  (5 + 10 соединений), писатели ждут в busy handler SQLite; читателей
+  по умолчанию больше, чем соединений в пуле;
+- split  — read-only пул для чтения и очередь записи.
+Печатает операции в секунду, p50/p99 записи и ошибки. Если p99 записи
+в режиме split больше --budget мс, скрипт завершается с кодом 1.
+
+Запуск из каталога backend:
+    python -m benchmarks.db_split_bench [--readers 16] [--writers 4] [--duration 10] [--rows 50000]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PLATFORMS = ("telegram", "linkedin", "vk", "twitter")
+
+ANALYTIC_SQL = """
+    SELECT p.platform, f.feedback_type, COUNT(*), AVG(f.confidence_before)
+    FROM feedback f JOIN posts p ON p.id = f.post_id
+    WHERE f.created_at >= :since
+    GROUP BY p.platform, f.feedback_type
+"""
+
+
+def seed(path: str, rows: int, posts: int = 5000) -> None:
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO posts (id, title, content, platform, status) VALUES (?, '', '', ?, 'draft')",
+        ((i, PLATFORMS[i % 4]) for i in range(1, posts + 1))
+    )
+    rng = random.Random(1)
+    conn.executemany(
+        "INSERT INTO feedback (post_id, feedback_type, confidence_before, created_at)"
+        " VALUES (?, ?, ?, datetime('now', ?))",
+        (
+            (rng.randrange(1, posts + 1), rng.choice(("approved", "rejected")), rng.random(),
+             f"-{rng.randrange(0, 90 * 24)} hours")
+            for _ in range(rows)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+def run_mode(args) -> dict:
+    """Один прогон в текущем процессе (окружение уже выставлено)"""
+    from sqlalchemy import text
+
+    from app.database import ReadSessionLocal, SessionLocal, write_queue
+    from app.migrations import migrate
+
+    migrate()
+    stop_at = time.monotonic() + args.duration
+    reads = []
+    writes = []
+    errors = []
+
+    def reader() -> None:
+        while time.monotonic() < stop_at:
+            with ReadSessionLocal() as db:
+                started = time.perf_counter()
+                try:
+                    db.execute(text(ANALYTIC_SQL), {"since": "2000-01-01"}).fetchall()
+                except Exception as exc:
+                    errors.append(type(exc).__name__)
+                    continue
+                reads.append(time.perf_counter() - started)
+
+    def writer(index: int) -> None:
+        rng = random.Random(index)
+        while time.monotonic() < stop_at:
+            with SessionLocal() as db:
+                started = time.perf_counter()
+                try:
+                    db.execute(text(
+                        "INSERT INTO feedback (post_id, feedback_type, confidence_before)"
+                        " VALUES (:post_id, 'approved', 0.5)"
+                    ), {"post_id": rng.randrange(1, 5000)})
+                    db.commit()
+                except Exception as exc:
+                    errors.append(type(exc).__name__)
+                    continue
+                writes.append(time.perf_counter() - started)
+            time.sleep(args.write_pause)
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    writes.sort()
+    return {
+        "reads_per_second": len(reads) / args.duration,
+        "read_p50_ms": statistics.median(reads) * 1000 if reads else 0.0,
+        "writes_per_second": len(writes) / args.duration,
+        "write_p50_ms": statistics.median(writes) * 1000 if writes else 0.0,
+        "write_p99_ms": writes[int(len(writes) * 0.99)] * 1000 if writes else 0.0,
+        "errors": len(errors),
+        "write_queue": write_queue.snapshot(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--write-pause", type=float, default=0.005, help="с между транзакциями писателя")
+    parser.add_argument("--budget", type=float, default=250.0, help="мс на p99 записи в режиме split")
+    parser.add_argument("--mode", choices=("shared", "split"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args)))
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "split.db")
+        base_env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{path}",
+            ARCHIVE_DATABASE_PATH="",
+            LOCK_DIR=workdir,
+            CACHE_PATH=os.path.join(workdir, "cache.db"),
+        )
+        # Схема и WAL — миграциями приложения, данные — напрямую через sqlite3
+        subprocess.run(
+            [sys.executable, "-c", "from app.migrations import migrate; migrate()"],
+            env=base_env, check=True,
+        )
+        seed(path, args.rows)
+
+        results = {}
+        for mode, pool_size in (("shared", "0"), ("split", "8")):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.db_split_bench", "--mode", mode,
+                 "--readers", str(args.readers), "--writers", str(args.writers),
+                 "--duration", str(args.duration), "--write-pause", str(args.write_pause)],
+                env=dict(base_env, DB_READ_POOL_SIZE=pool_size),
+                check=True, capture_output=True, text=True,
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'режим':<8} {'чтений/с':>9} {'p50 чт.':>9} {'записей/с':>10} {'p50 зап.':>9} {'p99 зап.':>9} {'ошибок':>7}")
+    for mode, r in results.items():
+        print(
+            f"{mode:<8} {r['reads_per_second']:>9.1f} {r['read_p50_ms']:>7.1f}мс "
+            f"{r['writes_per_second']:>10.1f} {r['write_p50_ms']:>7.1f}мс {r['write_p99_ms']:>7.1f}мс {r['errors']:>7}"
+        )
+    print("очередь записи (split):", results["split"]["write_queue"])
+
+    split = results["split"]
+    ok = split["write_p99_ms"] <= args.budget and split["errors"] == 0
+    print("бюджет:", "OK" if ok else f"ПРЕВЫШЕН ({args.budget:.0f} мс, без ошибок)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
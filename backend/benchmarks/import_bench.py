@@ -0,0 +1,81 @@
+"""
+Бенчмарк холодного старта: время импорта модулей приложения.
+
+Каждая цель запускается в отдельном процессе с `python -X importtime`,
+берётся медиана по --repeat запускам. Если медиана превышает бюджет,
+скрипт завершается с кодом 1 — так регрессии видны в CI.
+
+Запуск из каталога backend:
+    python -m benchmarks.import_bench [--repeat 5] [--scale 1.0] [--top 10]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+# (описание, код, бюджет в мс)
+TARGETS = (
+    ("import app.config", "import app.config", 150),
+    ("import app.main (без сборки)", "import app.main", 200),
+    ("import app.migrations (CLI)", "import app.migrations", 350),
+    ("сборка приложения", "from app.main import app", 900),
+)
+
+
+def run_target(code: str) -> tuple:
+    """Один холодный запуск: (время в мс, строки importtime)"""
+    wrapped = (
+        "import time; _t = time.perf_counter()\n"
+        f"{code}\n"
+        "print((time.perf_counter() - _t) * 1000)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", wrapped],
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr.splitlines()
+
+
+def heaviest(lines: list, top: int) -> list:
+    """Модули с наибольшим собственным временем импорта"""
+    rows = []
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель бюджетов для медленных машин")
+    parser.add_argument("--top", type=int, default=0, help="показать самые тяжёлые модули сборки")
+    args = parser.parse_args()
+
+    print(f"{'цель':<32} {'медиана, мс':>12} {'бюджет, мс':>11}")
+    failed = False
+    last_lines = []
+    for title, code, budget in TARGETS:
+        timings = []
+        for _ in range(args.repeat):
+            elapsed, last_lines = run_target(code)
+            timings.append(elapsed)
+        median = statistics.median(timings)
+        limit = budget * args.scale
+        mark = "" if median <= limit else "  ПРЕВЫШЕН"
+        failed = failed or median > limit
+        print(f"{title:<32} {median:>12.1f} {limit:>11.0f}{mark}")
+
+    if args.top:
+        print(f"\nСамые тяжёлые модули ({TARGETS[-1][0]}):")
+        for self_us, name in heaviest(last_lines, args.top):
+            print(f"  {self_us / 1000:>7.1f} мс  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Нагрузочный тест: пропускная способность API в зависимости от числа воркеров.
+
+Для каждого N из --workers поднимает `uvicorn app.main:app --workers N`
+(с WORKERS=N, т.е. в многопроцессном режиме) на временной БД, гоняет
+смесь GET-запросов с --concurrency одновременными соединениями и
+печатает req/s, латентность и ускорение относительно первого N.
+
+Запуск из каталога backend:
+    python -m benchmarks.load_bench [--workers 1 2 4] [--duration 10] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+ENDPOINTS = (
+    "/api/posts?limit=50",
+    "/api/posts/board",
+    "/api/posts/stats/platforms",
+    "/api/agent/status",
+    "/api/agent/prompt/versions",
+)
+
+
+def start_server(workers: int, port: int, workdir: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        WORKERS=str(workers),
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        ARCHIVE_DATABASE_PATH=os.path.join(workdir, "bench_archive.db"),
+        CACHE_PATH=os.path.join(workdir, "bench_cache.db"),
+        LOCK_DIR=workdir,
+        MEDIA_ROOT=os.path.join(workdir, "media"),
+        # Вся нагрузка идёт с одного IP: меряется пропускная способность, а не лимиты
+        RATE_LIMIT_ENABLED="false",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+
+
+async def wait_ready(base: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{base}/api/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+
+async def seed(base: str, posts: int) -> None:
+    """Посты по всем платформам и статусам + версия промпта"""
+    platforms = ("telegram", "linkedin", "vk", "twitter")
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{base}/api/posts?limit=1") as response:
+            if (await response.json())["total"] >= posts:
+                return
+        await session.post(f"{base}/api/agent/prompt/create?version=v1.0.0",
+                           json={"content": "Пиши коротко и по делу"})
+        for i in range(posts):
+            await session.post(f"{base}/api/posts", json={
+                "title": f"Пост {i}",
+                "content": "Как собрать команду мечты. " * 20,
+                "platform": platforms[i % len(platforms)],
+            })
+
+
+async def run_load(base: str, duration: float, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    stop_at = time.monotonic() + duration
+
+    async def client(index: int) -> None:
+        nonlocal errors
+        i = index
+        async with aiohttp.ClientSession() as session:
+            while time.monotonic() < stop_at:
+                url = base + ENDPOINTS[i % len(ENDPOINTS)]
+                i += 1
+                start = time.perf_counter()
+                try:
+                    async with session.get(url, headers={"Accept-Encoding": "gzip"}) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                            continue
+                except aiohttp.ClientError:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.monotonic()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"CPU: {os.cpu_count()}, duration {args.duration}s, concurrency {args.concurrency}")
+    print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} {'speedup':>8}")
+
+    baseline = None
+    with tempfile.TemporaryDirectory() as workdir:
+        for workers in args.workers:
+            base = f"http://127.0.0.1:{args.port}"
+            server = start_server(workers, args.port, workdir)
+            try:
+                asyncio.run(wait_ready(base))
+                asyncio.run(seed(base, args.posts))
+                result = asyncio.run(run_load(base, args.duration, args.concurrency))
+            finally:
+                server.terminate()
+                server.wait()
+
+            baseline = baseline or result["rps"]
+            print(
+                f"{workers:>8} {result['rps']:>10.1f} {result['p50']:>8.1f} "
+                f"{result['p95']:>8.1f} {result['errors']:>7} {result['rps'] / baseline:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
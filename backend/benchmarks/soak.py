@@ -0,0 +1,501 @@
+"""
+Soak-тест: воспроизведение трассы запросов против локального экземпляра.
+
+Трасса — файлы, записанные TraceMiddleware (TRACE_PATH=traces/api.jsonl
+на проде, см. app/tracing.py); без --trace строится синтетическая смесь
+чтения и записи. Экземпляр — `uvicorn app.main:app` на копии БД из
+снимка app.backup (--snapshot: имя в BACKUP_DIR или путь к каталогу) или
+на пустой БД с --posts постами.
+
+Внешние вызовы бэкенда — только генерация картинок; она направлена на
+заглушку в этом же процессе (--stub-latency, --stub-error-rate). Агент,
+LLM и бот Telegram — клиенты API: их запросы и есть трасса.
+
+Трасса проигрывается по кругу до --duration секунд с ускорением
+--speedup (интервалы между запросами делятся на него). Замазанный текст
+тел ("xxxx") заменяется случайными буквами той же длины, Idempotency-Key —
+новый на каждый запрос. Каждые --window секунд печатается строка:
+запросы, ошибки (5xx и сетевые), 4xx, p50/p95 латентности, RSS сервера,
+ожидания очереди записи и таймауты запросов к БД (/api/metrics/admission),
+отставание расписания. В конце — дрейф p95 (последнее окно / первое),
+рост памяти в МБ/час (наклон RSS, на прогонах от 30 минут) и p95 по
+маршрутам в первом и последнем окне; первое окно — прогрев, база
+сравнения — следующее.
+Код выхода 1, если доля ошибок больше --max-error-rate, дрейф больше
+--max-drift или рост памяти больше --max-memory-growth МБ/час.
+
+Запуск из каталога backend:
+    python -m benchmarks.soak [--trace traces/api*.jsonl] [--snapshot 20261019T030000Z]
+                              [--duration 7200] [--speedup 10] [--workers 1] [--report soak.json]
+"""
+import argparse
+import asyncio
+import glob
+import io
+import json
+import os
+import random
+import re
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+import aiohttp
+from aiohttp import web
+
+from .load_bench import wait_ready
+
+PLATFORMS = ("telegram", "linkedin", "vk", "twitter")
+NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+MIN_MEMORY_SPAN_SECONDS = 1800  # рост памяти оценивается на прогонах не короче
+
+
+# ───────────────────────────────────────────────
+# Трасса
+# ───────────────────────────────────────────────
+
+def load_trace(patterns: list) -> list:
+    """Строки трасс всех файлов (процессов), по времени"""
+    entries = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, encoding="utf-8") as handle:
+                entries.extend(json.loads(line) for line in handle if line.strip())
+    if not entries:
+        raise SystemExit(f"No trace entries in {patterns}")
+    entries.sort(key=lambda entry: entry["ts"])
+    return entries
+
+
+def synthetic_trace(posts: int, rps: float, seconds: float = 60.0, seed: int = 1) -> list:
+    """Смесь чтения и записи в формате TraceMiddleware"""
+    rng = random.Random(seed)
+
+    def text(length: int) -> str:
+        return "x" * length  # как замазанный текст трассы
+    mix = (
+        (30, lambda: ("GET", "/api/posts", "limit=50", None, False)),
+        (10, lambda: ("GET", "/api/posts/board", "", None, False)),
+        (10, lambda: ("GET", f"/api/posts/{rng.randint(1, posts)}", "", None, False)),
+        (8, lambda: ("GET", "/api/posts/stats/platforms", "", None, False)),
+        (5, lambda: ("GET", "/api/agent/status", "", None, False)),
+        (5, lambda: ("GET", "/api/changes/head", "", None, False)),
+        (2, lambda: ("GET", "/api/agent/learning/insights", "", None, False)),
+        (12, lambda: ("POST", "/api/posts", "", {
+            "title": text(40), "content": text(600), "platform": rng.choice(PLATFORMS),
+        }, True)),
+        (15, lambda: ("POST", "/api/posts/agent/decision", "", {
+            "decision_type": "generate", "confidence": round(rng.random(), 2),
+            "action_taken": True, "outcome": rng.choice(("success", "success", "failure")),
+        }, True)),
+        (3, lambda: ("POST", "/api/images/generate", "", {"topic": text(30)}, False)),
+    )
+    weights = [weight for weight, _ in mix]
+    entries = []
+    ts = 0.0
+    while ts < seconds:
+        method, path, query, body, idempotency = rng.choices(mix, weights)[0][1]()
+        entries.append({
+            "ts": ts, "method": method, "path": path, "route": _route(path), "query": query,
+            "body": body, "idempotency": idempotency,
+        })
+        ts += rng.expovariate(rps)
+    return entries
+
+
+def _route(path: str) -> str:
+    """Шаблон пути для строк без route (синтетика, 404): id -> {id}"""
+    return NUMERIC_SEGMENT.sub("/{id}", path)
+
+
+def _fill(value, rng: random.Random):
+    """Замазанный текст -> случайные буквы той же длины (иначе всё совпадёт в кэшах)"""
+    if isinstance(value, dict):
+        return {key: _fill(item, rng) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill(item, rng) for item in value]
+    if isinstance(value, str) and len(value) > 1 and value == "x" * len(value):
+        return "".join(rng.choices(string.ascii_lowercase + " ", k=len(value)))
+    return value
+
+
+# ───────────────────────────────────────────────
+# Заглушка генерации картинок
+# ───────────────────────────────────────────────
+
+class StubImageProvider:
+    """GET /prompt/{prompt} -> PNG; задержка и доля ошибок настраиваются"""
+
+    def __init__(self, latency: float, error_rate: float):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.failures = 0
+        self._rng = random.Random(2)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        from PIL import Image
+
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self._rng.random() < self.error_rate:
+            self.failures += 1
+            return web.Response(status=503)
+        # Разный цвет — разный файл: хранилище дедуплицирует по содержимому
+        color = tuple(self._rng.randrange(256) for _ in range(3))
+        buffer = io.BytesIO()
+        Image.new("RGB", (256, 256), color).save(buffer, format="PNG")
+        return web.Response(body=buffer.getvalue(), content_type="image/png")
+
+    async def start(self, port: int) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_get("/prompt/{prompt}", self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        return runner
+
+
+# ───────────────────────────────────────────────
+# Сервер и его метрики
+# ───────────────────────────────────────────────
+
+def start_server(args, workdir: str, database: str, archive: str, stub_port: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        WORKERS=str(args.workers),
+        DATABASE_URL=f"sqlite:///{database}",
+        ARCHIVE_DATABASE_PATH=archive,
+        CACHE_PATH=os.path.join(workdir, "cache.db"),
+        LOCK_DIR=workdir,
+        MEDIA_ROOT=os.path.join(workdir, "media"),
+        BACKUP_DIR=os.path.join(workdir, "backups"),
+        IMAGE_GENERATION_URL=f"http://127.0.0.1:{stub_port}/prompt/{{prompt}}",
+        TELEGRAM_WEBHOOK_SECRET="",
+        TRACE_PATH="",
+        # Весь трафик идёт с одного IP: лимиты на клиента здесь не проверяются
+        RATE_LIMIT_ENABLED="false",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"],
+        env=env,
+    )
+
+
+def rss_mb(pid: int) -> float:
+    """RSS процесса и его потомков (воркеры uvicorn), МБ; только Linux"""
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/status") as handle:
+                for line in handle:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as handle:
+                    stack.extend(int(child) for child in handle.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total / 1024
+
+
+async def db_waits(session: aiohttp.ClientSession, base: str) -> dict:
+    """Накопительные счётчики ожиданий БД одного воркера"""
+    try:
+        async with session.get(f"{base}/api/metrics/admission") as response:
+            data = await response.json()
+    except (aiohttp.ClientError, ValueError):
+        return {}
+    queue = data.get("db_write_queue", {})
+    return {
+        "write_waits": queue.get("waited", 0),
+        "write_max_wait_ms": queue.get("max_wait_seconds", 0) * 1000,
+        "write_queue_timeouts": queue.get("timeouts", 0),
+        "statement_timeouts": data.get("db_statement_timeouts", 0),
+    }
+
+
+async def seed_posts(base: str, posts: int) -> None:
+    async with aiohttp.ClientSession() as session:
+        for i in range(posts):
+            async with session.post(f"{base}/api/posts", json={
+                "title": f"Пост {i}", "content": "Как собрать команду мечты. " * 20,
+                "platform": PLATFORMS[i % len(PLATFORMS)],
+            }) as response:
+                await response.read()
+
+
+# ───────────────────────────────────────────────
+# Воспроизведение
+# ───────────────────────────────────────────────
+
+class Window:
+    """Результаты запросов за одно окно отчёта"""
+
+    def __init__(self):
+        self.latencies = []
+        self.by_route = defaultdict(list)
+        self.errors = 0
+        self.client_errors = 0
+        self.max_lag = 0.0
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def replay(args, trace: list, base: str, server: subprocess.Popen, stub: StubImageProvider) -> dict:
+    rng = random.Random(3)
+    t0 = trace[0]["ts"]
+    span = (trace[-1]["ts"] - t0) / args.speedup + 1.0 / args.speedup
+    inflight = asyncio.Semaphore(args.max_inflight)
+    state = {"window": Window()}
+    windows = []
+    started = time.monotonic()
+    stop_at = started + args.duration
+    connector = aiohttp.TCPConnector(limit=args.max_inflight)
+    timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+
+    async def send(session: aiohttp.ClientSession, entry: dict, lag: float) -> None:
+        async with inflight:
+            window = state["window"]
+            window.max_lag = max(window.max_lag, lag)
+            headers = {}
+            if entry.get("idempotency"):
+                headers["Idempotency-Key"] = str(uuid.uuid4())
+            url = base + entry["path"] + (f"?{entry['query']}" if entry.get("query") else "")
+            body = _fill(entry.get("body"), rng)
+            request_started = time.perf_counter()
+            try:
+                async with session.request(
+                    entry["method"], url, json=body, headers=headers
+                ) as response:
+                    await response.read()
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = 0
+            elapsed = (time.perf_counter() - request_started) * 1000
+            if status == 0 or status >= 500:
+                window.errors += 1
+            elif status >= 400:
+                window.client_errors += 1
+            window.latencies.append(elapsed)
+            window.by_route[entry.get("route") or _route(entry["path"])].append(elapsed)
+
+    async def report_windows(session: aiohttp.ClientSession) -> None:
+        previous = await db_waits(session, base)
+        print(
+            f"{'мин':>6} {'запросов':>8} {'ошибок':>7} {'4xx':>5} {'p50 мс':>8} {'p95 мс':>8} "
+            f"{'RSS МБ':>7} {'ожид. БД':>8} {'макс мс':>8} {'отставание':>10}"
+        )
+        while time.monotonic() < stop_at:
+            await asyncio.sleep(min(args.window, max(0.0, stop_at - time.monotonic())))
+            window, state["window"] = state["window"], Window()
+            waits = await db_waits(session, base)
+            row = {
+                "elapsed_seconds": round(time.monotonic() - started, 1),
+                "requests": len(window.latencies),
+                "errors": window.errors,
+                "client_errors": window.client_errors,
+                "p50_ms": round(_percentile(window.latencies, 0.5), 1),
+                "p95_ms": round(_percentile(window.latencies, 0.95), 1),
+                "rss_mb": round(rss_mb(server.pid), 1),
+                "db_write_waits": waits.get("write_waits", 0) - previous.get("write_waits", 0),
+                "db_write_max_wait_ms": round(waits.get("write_max_wait_ms", 0.0), 1),
+                "db_write_queue_timeouts": waits.get("write_queue_timeouts", 0),
+                "db_statement_timeouts": waits.get("statement_timeouts", 0),
+                "max_lag_ms": round(window.max_lag * 1000, 1),
+                "by_route_p95_ms": {
+                    route: round(_percentile(values, 0.95), 1) for route, values in window.by_route.items()
+                },
+            }
+            previous = waits or previous
+            windows.append(row)
+            print(
+                f"{row['elapsed_seconds'] / 60:>6.1f} {row['requests']:>8} {row['errors']:>7} "
+                f"{row['client_errors']:>5} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['rss_mb']:>7.1f} "
+                f"{row['db_write_waits']:>8} {row['db_write_max_wait_ms']:>8.1f} {row['max_lag_ms']:>8.1f}мс",
+                flush=True,
+            )
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        reporter = asyncio.create_task(report_windows(session))
+        tasks = set()
+        loop_start = started
+        while time.monotonic() < stop_at:
+            for entry in trace:
+                scheduled = loop_start + (entry["ts"] - t0) / args.speedup
+                if scheduled >= stop_at:
+                    break
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                task = asyncio.create_task(send(session, entry, max(0.0, -delay)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            loop_start += span
+        if tasks:
+            await asyncio.wait(tasks, timeout=args.request_timeout)
+        await reporter
+
+    return summarize(args, windows, stub)
+
+
+def summarize(args, windows: list, stub: StubImageProvider) -> dict:
+    windows = [window for window in windows if window["requests"]]
+    if not windows:
+        return {"windows": []}
+    # Первое окно — прогрев (кэши, пулы, история калибровки): база — следующее
+    steady = windows[1:] if len(windows) > 2 else windows
+    first, last = steady[0], steady[-1]
+    requests = sum(window["requests"] for window in windows)
+    errors = sum(window["errors"] for window in windows)
+    drift = last["p95_ms"] / first["p95_ms"] if first["p95_ms"] else 1.0
+
+    # Рост памяти — наклон RSS по времени; на коротком прогоне это шум
+    memory_growth = 0.0
+    span = last["elapsed_seconds"] - first["elapsed_seconds"]
+    if len(steady) > 1:
+        memory_growth = statistics.linear_regression(
+            [window["elapsed_seconds"] / 3600 for window in steady],
+            [window["rss_mb"] for window in steady],
+        ).slope
+    memory_judged = span >= MIN_MEMORY_SPAN_SECONDS
+    error_rate = errors / requests if requests else 0.0
+
+    routes = sorted(
+        set(first["by_route_p95_ms"]) & set(last["by_route_p95_ms"]),
+        key=lambda route: -last["by_route_p95_ms"][route],
+    )
+    summary = {
+        "requests": requests,
+        "error_rate": round(error_rate, 4),
+        "client_error_rate": round(sum(w["client_errors"] for w in windows) / requests, 4),
+        "p95_first_ms": first["p95_ms"],
+        "p95_last_ms": last["p95_ms"],
+        "p95_drift": round(drift, 2),
+        "rss_first_mb": first["rss_mb"],
+        "rss_last_mb": last["rss_mb"],
+        "memory_growth_mb_per_hour": round(memory_growth, 1),
+        "memory_growth_judged": memory_judged,
+        "db_write_waits": sum(window["db_write_waits"] for window in windows),
+        "db_write_max_wait_ms": max(window["db_write_max_wait_ms"] for window in windows),
+        "db_timeouts": last["db_write_queue_timeouts"] + last["db_statement_timeouts"],
+        "stub_image_calls": stub.calls,
+        "stub_image_failures": stub.failures,
+        "routes_p95_ms": {
+            route: {"first": first["by_route_p95_ms"][route], "last": last["by_route_p95_ms"][route]}
+            for route in routes[:10]
+        },
+    }
+    summary["ok"] = (
+        error_rate <= args.max_error_rate
+        and drift <= args.max_drift
+        and (not memory_judged or memory_growth <= args.max_memory_growth)
+    )
+    return {"summary": summary, "windows": windows}
+
+
+def print_summary(result: dict, args) -> None:
+    summary = result.get("summary")
+    if summary is None:
+        print("нет завершённых запросов")
+        return
+    print()
+    print(f"запросов: {summary['requests']}, ошибок: {summary['error_rate']:.2%}, 4xx: {summary['client_error_rate']:.2%}")
+    print(f"p95: {summary['p95_first_ms']} -> {summary['p95_last_ms']} мс (дрейф x{summary['p95_drift']})")
+    print(
+        f"RSS: {summary['rss_first_mb']} -> {summary['rss_last_mb']} МБ "
+        f"({summary['memory_growth_mb_per_hour']:+.1f} МБ/час"
+        + ("" if summary["memory_growth_judged"] else ", прогон короче 30 мин — не оценивается") + ")"
+    )
+    print(
+        f"БД: ожиданий очереди записи {summary['db_write_waits']}, "
+        f"максимум {summary['db_write_max_wait_ms']} мс, таймаутов {summary['db_timeouts']}"
+    )
+    print(f"заглушка картинок: {summary['stub_image_calls']} вызовов, {summary['stub_image_failures']} ошибок")
+    if summary["routes_p95_ms"]:
+        print("p95 по маршрутам (первое -> последнее окно):")
+        for route, values in summary["routes_p95_ms"].items():
+            print(f"  {route:<45} {values['first']:>8.1f} -> {values['last']:>8.1f} мс")
+    print("бюджет:", "OK" if summary["ok"] else (
+        f"ПРЕВЫШЕН (ошибок <= {args.max_error_rate:.0%}, дрейф <= x{args.max_drift}, "
+        f"память <= {args.max_memory_growth} МБ/час)"
+    ))
+
+
+async def run(args, workdir: str) -> dict:
+    database = os.path.join(workdir, "main.db")
+    archive = os.path.join(workdir, "archive.db")
+    if args.snapshot:
+        from app import backup
+
+        extracted = backup.extract(args.snapshot, workdir)
+        archive = extracted.get("archive", archive)
+
+    stub = StubImageProvider(args.stub_latency, args.stub_error_rate)
+    runner = await stub.start(args.stub_port)
+    server = start_server(args, workdir, database, archive, args.stub_port)
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        await wait_ready(base, timeout=120)
+        if args.trace:
+            trace = load_trace(args.trace)
+        else:
+            if not args.snapshot:
+                await seed_posts(base, args.posts)
+            trace = synthetic_trace(args.posts, args.rps)
+        print(f"трасса: {len(trace)} запросов, {trace[-1]['ts'] - trace[0]['ts']:.0f} с, ускорение x{args.speedup}")
+        return await replay(args, trace, base, server, stub)
+    finally:
+        server.terminate()
+        server.wait()
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", nargs="*", help="файлы трасс (glob)")
+    parser.add_argument("--snapshot", help="снимок app.backup: имя в BACKUP_DIR или каталог")
+    parser.add_argument("--duration", type=float, default=600.0, help="секунд")
+    parser.add_argument("--speedup", type=float, default=1.0)
+    parser.add_argument("--window", type=float, default=60.0, help="секунд на строку отчёта")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--posts", type=int, default=200, help="постов в пустой БД")
+    parser.add_argument("--rps", type=float, default=50.0, help="запросов/с синтетической трассы")
+    parser.add_argument("--max-inflight", type=int, default=64)
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--stub-port", type=int, default=8766)
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="секунд на картинку")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--max-drift", type=float, default=1.5, help="p95 последнего окна / первого")
+    parser.add_argument("--max-memory-growth", type=float, default=50.0, help="МБ/час")
+    parser.add_argument("--workdir", default=None, help="каталог для копии БД")
+    parser.add_argument("--report", help="сохранить окна и итог в JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        result = asyncio.run(run(args, workdir))
+
+    print_summary(result, args)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as handle:
+            json.dump(result, handle, indent=2, ensure_ascii=False)
+    sys.exit(0 if result.get("summary", {}).get("ok") else 1)
+
+
+if __name__ == "__main__":
+    main()
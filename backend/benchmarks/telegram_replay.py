@@ -0,0 +1,156 @@
+"""
+Воспроизведение update'ов Telegram через вебхук-обработчик.
+
+Режим фикстуры (--fixture): применяет записанную сессию ревью, затем
+повторяет её дважды — с отсевом в памяти и после его сброса (только
+таблица telegram_updates) — и проверяет, что повторы ничего не меняют.
+
+Синтетический режим (по умолчанию): всплеск из --updates нажатий кнопок
+по --posts постам с долей повторной доставки --duplicates; печатает
+update/s для каждого размера группы из --batch-sizes.
+
+Запуск из каталога backend:
+    python -m benchmarks.telegram_replay --fixture fixtures/telegram/review_session.json
+    python -m benchmarks.telegram_replay [--updates 2000] [--batch-sizes 1 50 200]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def setup(workdir: str):
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'replay.db')}",
+        ARCHIVE_DATABASE_PATH="",
+        LOCK_DIR=workdir,
+        CACHE_PATH=os.path.join(workdir, "cache.db"),
+    )
+    from app.migrations import migrate
+
+    migrate()
+
+
+def seed_posts(n: int, first_id: int = 1) -> None:
+    """Посты в статусе review с id first_id..first_id + n - 1"""
+    from app import platform_stats
+    from app.database import SessionLocal
+    from app.models import Post, PostStatus
+
+    with SessionLocal() as db:
+        for i in range(n):
+            post = Post(
+                id=first_id + i, title=f"Пост {first_id + i}", content="Черновик",
+                platform=("telegram", "linkedin", "vk", "twitter")[i % 4],
+                status=PostStatus.REVIEW.value,
+            )
+            db.add(post)
+            platform_stats.on_post_created(db, post.platform, post.status)
+        db.commit()
+
+
+def counts() -> dict:
+    from app.database import SessionLocal
+    from app.models import Feedback, Post
+
+    with SessionLocal() as db:
+        statuses = {}
+        for (status,) in db.query(Post.status):
+            statuses[status] = statuses.get(status, 0) + 1
+        return {"feedback": db.query(Feedback).count(), "posts": statuses}
+
+
+def replay(payload) -> dict:
+    from app import telegram
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        return telegram.process_updates(db, payload)
+
+
+def run_fixture(path: str) -> int:
+    from app import telegram
+
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    seed_posts(4)
+
+    first = replay(payload)
+    state = counts()
+    print(f"первый проход:        {first}")
+    print(f"  состояние:          {state}")
+
+    again = replay(payload)
+    telegram.seen_updates.clear()
+    persisted = replay(payload)
+    print(f"повтор (память):      {again}")
+    print(f"повтор (только БД):   {persisted}")
+
+    ok = counts() == state and again["applied"] == persisted["applied"] == 0
+    print("идемпотентность:", "OK" if ok else "НАРУШЕНА")
+    return 0 if ok else 1
+
+
+def burst(n_updates: int, n_posts: int, duplicates: float, first_update_id: int, first_post_id: int) -> list:
+    """Нажатия кнопок ревью с повторной доставкой части update'ов"""
+    rng = random.Random(first_update_id)
+    updates = []
+    for i in range(n_updates):
+        post_id = first_post_id + rng.randrange(n_posts)
+        action = rng.choice(("approve", "approve", "reject"))
+        updates.append({
+            "update_id": first_update_id + i,
+            "callback_query": {
+                "id": str(i), "from": {"id": 1000 + i % 3},
+                "data": f"{action}:{post_id}",
+            },
+        })
+        if rng.random() < duplicates:
+            updates.append(updates[rng.randrange(len(updates))])
+    return updates
+
+
+def run_burst(args) -> int:
+    from app import telegram
+    from app.config import get_settings
+
+    settings = get_settings()
+    print(f"{'группа':>7} {'update/s':>10} {'applied':>8} {'dup':>6} {'failed':>7}")
+    for index, batch_size in enumerate(args.batch_sizes):
+        # Свои посты и update_id для каждого прогона
+        first_post_id = 1 + index * args.posts
+        seed_posts(args.posts, first_post_id)
+        updates = burst(args.updates, args.posts, args.duplicates, 10_000_000 * (index + 1), first_post_id)
+
+        settings.TELEGRAM_BATCH_SIZE = batch_size
+        telegram.seen_updates.clear()
+        started = time.perf_counter()
+        result = replay(updates)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{batch_size:>7} {len(updates) / elapsed:>10.0f} {result['applied']:>8} "
+            f"{result['duplicates']:>6} {result['failed']:>7}"
+        )
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", help="JSON: update, список или ответ getUpdates")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--duplicates", type=float, default=0.2, help="доля повторной доставки")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 50, 200])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup(workdir)
+        code = run_fixture(args.fixture) if args.fixture else run_burst(args)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,8 @@ import { Text, Loader, RadioButton, Card, Label } from '@gravity-ui/uikit';
 import { MainLayout } from '@/components/layout/MainLayout';
 import { Header } from '@/components/layout/Header';
 import { PostCard } from '@/components/posts/PostCard';
-import { getPosts, approvePost, rejectPost } from '@/lib/api';
-import type { Post } from '@/lib/types';
+import { getBoard, approvePostOnBoard, rejectPostOnBoard, applyBoardDelta } from '@/lib/api';
+import type { Board, Post } from '@/lib/types';
 import { STATUS_COLORS, STATUS_LABELS, PLATFORM_LABELS } from '@/lib/types';
 
 type ViewMode = 'calendar' | 'kanban';
@@ -20,30 +20,29 @@ const KANBAN_COLUMNS = [
 ];
 
 export default function ContentPlanPage() {
-  const [posts, setPosts] = useState<Post[]>([]);
+  const [board, setBoard] = useState<Board>({ columns: [] });
   const [loading, setLoading] = useState(true);
   const [viewMode, setViewMode] = useState<ViewMode>('kanban');
 
-  const loadPosts = async () => {
+  const loadBoard = async () => {
     setLoading(true);
     try {
-      const data = await getPosts({ limit: 100 });
-      setPosts(data.items);
+      setBoard(await getBoard({ limit: 50 }));
     } catch (error) {
-      console.error('Failed to load posts:', error);
+      console.error('Failed to load board:', error);
     } finally {
       setLoading(false);
     }
   };
 
   useEffect(() => {
-    loadPosts();
+    loadBoard();
   }, []);
 
   const handleApprove = async (id: number) => {
     try {
-      await approvePost(id);
-      loadPosts();
+      const delta = await approvePostOnBoard(id);
+      setBoard((current) => applyBoardDelta(current, delta));
     } catch (error) {
       console.error('Failed to approve:', error);
     }
@@ -51,14 +50,14 @@ export default function ContentPlanPage() {
 
   const handleReject = async (id: number) => {
     try {
-      await rejectPost(id);
-      loadPosts();
+      const delta = await rejectPostOnBoard(id);
+      setBoard((current) => applyBoardDelta(current, delta));
     } catch (error) {
       console.error('Failed to reject:', error);
     }
   };
 
-  const getPostsByStatus = (status: string) => posts.filter((p) => p.status === status);
+  const posts = board.columns.flatMap((column) => column.items);
 
   return (
     <MainLayout>
@@ -67,7 +66,7 @@ export default function ContentPlanPage() {
         showAddButton
         onAdd={() => console.log('Add post')}
         showRefresh
-        onRefresh={loadPosts}
+        onRefresh={loadBoard}
       />
 
       <div className="dashboard-content">
@@ -89,7 +88,7 @@ export default function ContentPlanPage() {
           </div>
         ) : viewMode === 'kanban' ? (
           <KanbanView
-            posts={posts}
+            board={board}
             onApprove={handleApprove}
             onReject={handleReject}
           />
@@ -102,20 +101,21 @@ export default function ContentPlanPage() {
 }
 
 function KanbanView({
-  posts,
+  board,
   onApprove,
   onReject,
 }: {
-  posts: Post[];
+  board: Board;
   onApprove: (id: number) => void;
   onReject: (id: number) => void;
 }) {
-  const getPostsByStatus = (status: string) => posts.filter((p) => p.status === status);
+  const getColumn = (status: string) => board.columns.find((column) => column.status === status);
 
   return (
     <div className="kanban-board">
       {KANBAN_COLUMNS.map((column) => {
-        const columnPosts = getPostsByStatus(column.status);
+        const boardColumn = getColumn(column.status);
+        const columnPosts = boardColumn?.items ?? [];
         const isReviewColumn = column.status === 'review';
 
         return (
@@ -123,7 +123,7 @@ function KanbanView({
             <div className="kanban-column-header">
               <Text variant="subheader-1">{column.title}</Text>
               <Label size="xs" theme="info">
-                {columnPosts.length}
+                {boardColumn?.total ?? 0}
               </Label>
             </div>
 
@@ -1,9 +1,12 @@
 'use client';
 
+import { useEffect, useState } from 'react';
 import { Card, Text, Label, Button, Icon } from '@gravity-ui/uikit';
 import { Link as LinkIcon, TrashBin } from '@gravity-ui/icons';
 import { MainLayout } from '@/components/layout/MainLayout';
 import { Header } from '@/components/layout/Header';
+import { getPlatformAnalytics } from '@/lib/api';
+import type { PlatformAnalytics } from '@/lib/types';
 
 const platforms = [
   {
@@ -11,8 +14,6 @@ const platforms = [
     name: 'Telegram',
     icon: '📱',
     connected: true,
-    postsCount: 12,
-    lastPost: '2 часа назад',
     color: '#0088cc',
   },
   {
@@ -20,8 +21,6 @@ const platforms = [
     name: 'LinkedIn',
     icon: '💼',
     connected: true,
-    postsCount: 8,
-    lastPost: '1 день назад',
     color: '#0077b5',
   },
   {
@@ -29,8 +28,6 @@ const platforms = [
     name: 'ВКонтакте',
     icon: '🔵',
     connected: false,
-    postsCount: 0,
-    lastPost: null,
     color: '#4c75a3',
   },
   {
@@ -38,13 +35,30 @@ const platforms = [
     name: 'Twitter / X',
     icon: '🐦',
     connected: false,
-    postsCount: 0,
-    lastPost: null,
     color: '#1da1f2',
   },
 ];
 
+// «2 часа назад» по ISO-времени
+function formatAgo(iso: string | null): string {
+  if (!iso) return '—';
+  const hours = Math.floor((Date.now() - new Date(iso + 'Z').getTime()) / 3_600_000);
+  if (hours < 1) return 'меньше часа назад';
+  if (hours < 24) return `${hours} ч назад`;
+  return `${Math.floor(hours / 24)} дн назад`;
+}
+
 export default function PlatformsPage() {
+  const [analytics, setAnalytics] = useState<Record<string, PlatformAnalytics>>({});
+
+  useEffect(() => {
+    getPlatformAnalytics()
+      .then((data) => {
+        setAnalytics(Object.fromEntries(data.platforms.map((item) => [item.platform, item])));
+      })
+      .catch((error) => console.error('Failed to load platform analytics:', error));
+  }, []);
+
   return (
     <MainLayout>
       <Header title="Соцсети" subtitle="Подключённые платформы" />
@@ -83,12 +97,18 @@ export default function PlatformsPage() {
                 <>
                   <div style={{ display: 'flex', justifyContent: 'space-between', marginBottom: '8px' }}>
                     <Text variant="body-1" color="secondary">Публикаций</Text>
-                    <Text variant="body-1">{platform.postsCount}</Text>
+                    <Text variant="body-1">{analytics[platform.id]?.published_total ?? 0}</Text>
                   </div>
                   <div style={{ display: 'flex', justifyContent: 'space-between', marginBottom: '16px' }}>
                     <Text variant="body-1" color="secondary">Последний пост</Text>
-                    <Text variant="body-1">{platform.lastPost}</Text>
+                    <Text variant="body-1">{formatAgo(analytics[platform.id]?.last_published_at ?? null)}</Text>
                   </div>
+                  {analytics[platform.id]?.approval_rate != null && (
+                    <div style={{ display: 'flex', justifyContent: 'space-between', marginBottom: '16px' }}>
+                      <Text variant="body-1" color="secondary">Одобрено</Text>
+                      <Text variant="body-1">{Math.round((analytics[platform.id].approval_rate ?? 0) * 100)}%</Text>
+                    </div>
+                  )}
                   <Button view="flat-danger" width="max">
                     <Icon data={TrashBin} />
                     Отключить
@@ -5,8 +5,8 @@ import { Text, Loader, Card, Label, Button, Icon } from '@gravity-ui/uikit';
 import { Check, Xmark, ArrowRight } from '@gravity-ui/icons';
 import { MainLayout } from '@/components/layout/MainLayout';
 import { Header } from '@/components/layout/Header';
-import { getPosts, approvePost, rejectPost } from '@/lib/api';
-import type { Post } from '@/lib/types';
+import { getBoard, approvePostOnBoard, rejectPostOnBoard, applyBoardDelta } from '@/lib/api';
+import type { Board, Post } from '@/lib/types';
 import { PLATFORM_LABELS } from '@/lib/types';
 
 const PIPELINE_STAGES = [
@@ -18,29 +18,28 @@ const PIPELINE_STAGES = [
 ];
 
 export default function TasksPage() {
-  const [posts, setPosts] = useState<Post[]>([]);
+  const [board, setBoard] = useState<Board>({ columns: [] });
   const [loading, setLoading] = useState(true);
 
-  const loadPosts = async () => {
+  const loadBoard = async () => {
     setLoading(true);
     try {
-      const data = await getPosts({ limit: 100 });
-      setPosts(data.items);
+      setBoard(await getBoard({ limit: 30, limits: { review: 100 } }));
     } catch (error) {
-      console.error('Failed to load posts:', error);
+      console.error('Failed to load board:', error);
     } finally {
       setLoading(false);
     }
   };
 
   useEffect(() => {
-    loadPosts();
+    loadBoard();
   }, []);
 
   const handleApprove = async (id: number) => {
     try {
-      await approvePost(id);
-      loadPosts();
+      const delta = await approvePostOnBoard(id);
+      setBoard((current) => applyBoardDelta(current, delta));
     } catch (error) {
       console.error('Failed to approve:', error);
     }
@@ -48,17 +47,21 @@ export default function TasksPage() {
 
   const handleReject = async (id: number) => {
     try {
-      await rejectPost(id);
-      loadPosts();
+      const delta = await rejectPostOnBoard(id);
+      setBoard((current) => applyBoardDelta(current, delta));
     } catch (error) {
       console.error('Failed to reject:', error);
     }
   };
 
-  // Считаем посты на ревью
-  const reviewPosts = posts.filter((p) => p.status === 'review');
-  const ideaPosts = posts.filter((p) => p.status === 'idea');
-  const draftPosts = posts.filter((p) => p.status === 'draft');
+  // Колонки доски: первые N постов и точное число
+  const getColumn = (status: string) => board.columns.find((column) => column.status === status);
+  const reviewPosts: Post[] = getColumn('review')?.items ?? [];
+  const ideaPosts: Post[] = getColumn('idea')?.items ?? [];
+  const draftPosts: Post[] = getColumn('draft')?.items ?? [];
+  const reviewTotal = getColumn('review')?.total ?? 0;
+  const ideaTotal = getColumn('idea')?.total ?? 0;
+  const draftTotal = getColumn('draft')?.total ?? 0;
 
   return (
     <MainLayout>
@@ -66,7 +69,7 @@ export default function TasksPage() {
         title="Задачи"
         subtitle="Пайплайн публикаций"
         showRefresh
-        onRefresh={loadPosts}
+        onRefresh={loadBoard}
       />
 
       <div className="dashboard-content">
@@ -110,7 +113,7 @@ export default function TasksPage() {
               <div style={{ marginBottom: '32px' }}>
                 <div style={{ display: 'flex', alignItems: 'center', gap: '12px', marginBottom: '16px' }}>
                   <Text variant="header-1">⏸ На ревью</Text>
-                  <Label theme="warning">{reviewPosts.length}</Label>
+                  <Label theme="warning">{reviewTotal}</Label>
                 </div>
 
                 <div style={{ display: 'grid', gap: '16px', gridTemplateColumns: 'repeat(auto-fill, minmax(400px, 1fr))' }}>
@@ -160,7 +163,7 @@ export default function TasksPage() {
               <div style={{ marginBottom: '32px' }}>
                 <div style={{ display: 'flex', alignItems: 'center', gap: '12px', marginBottom: '16px' }}>
                   <Text variant="header-1">💡 Идеи</Text>
-                  <Label theme="info">{ideaPosts.length}</Label>
+                  <Label theme="info">{ideaTotal}</Label>
                 </div>
 
                 <div style={{ display: 'flex', flexWrap: 'wrap', gap: '8px' }}>
@@ -178,7 +181,7 @@ export default function TasksPage() {
               <div>
                 <div style={{ display: 'flex', alignItems: 'center', gap: '12px', marginBottom: '16px' }}>
                   <Text variant="header-1">✏️ Черновики</Text>
-                  <Label theme="utility">{draftPosts.length}</Label>
+                  <Label theme="utility">{draftTotal}</Label>
                 </div>
 
                 <div style={{ display: 'flex', flexWrap: 'wrap', gap: '8px' }}>
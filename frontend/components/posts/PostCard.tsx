@@ -3,6 +3,7 @@
 import { Card, Text, Label, Button, Icon } from '@gravity-ui/uikit';
 import { Check, Xmark, Pencil } from '@gravity-ui/icons';
 import type { Post } from '@/lib/types';
+import { imageUrl, isLocalImage } from '@/lib/api';
 import { STATUS_COLORS, STATUS_LABELS, PLATFORM_LABELS } from '@/lib/types';
 
 interface PostCardProps {
@@ -89,7 +90,15 @@ export function PostCard({ post, onApprove, onReject, onEdit, compact = false }:
           }}
         >
           <img
-            src={post.image_url}
+            src={imageUrl(post.image_url, 640)}
+            srcSet={
+              isLocalImage(post.image_url)
+                ? `${imageUrl(post.image_url, 320)} 320w, ${imageUrl(post.image_url, 640)} 640w`
+                : undefined
+            }
+            sizes="(max-width: 640px) 100vw, 640px"
+            loading="lazy"
+            decoding="async"
             alt={post.title}
             style={{ width: '100%', height: 'auto', objectFit: 'cover' }}
           />
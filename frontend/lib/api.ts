@@ -1,7 +1,10 @@
 /**
  * API клиент для SMM Dashboard
  */
-import type { Post, PostList, PostCreate, PostUpdate, HealthMetrics } from './types';
+import type {
+  Post, PostList, PostCreate, PostUpdate, HealthMetrics, Board, BoardDelta,
+  PlatformAnalyticsResponse, GenerateImageResponse,
+} from './types';
 
 const API_BASE = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
@@ -92,6 +95,57 @@ export async function rejectPost(id: number): Promise<Post> {
   });
 }
 
+// ═══════════════════════════════════════════════════
+// BOARD API (канбан)
+// ═══════════════════════════════════════════════════
+
+export async function getBoard(params?: {
+  limit?: number;
+  limits?: Partial<Record<string, number>>;
+  platform?: string;
+}): Promise<Board> {
+  const searchParams = new URLSearchParams();
+  if (params?.limit) searchParams.set('limit', String(params.limit));
+  if (params?.limits) {
+    const limits = Object.entries(params.limits)
+      .map(([status, limit]) => `${status}:${limit}`)
+      .join(',');
+    if (limits) searchParams.set('limits', limits);
+  }
+  if (params?.platform) searchParams.set('platform', params.platform);
+
+  const query = searchParams.toString();
+  return fetchAPI<Board>(`/api/posts/board${query ? `?${query}` : ''}`);
+}
+
+export async function approvePostOnBoard(id: number): Promise<BoardDelta> {
+  return fetchAPI<BoardDelta>(`/api/posts/board/${id}/approve`, {
+    method: 'POST',
+  });
+}
+
+export async function rejectPostOnBoard(id: number): Promise<BoardDelta> {
+  return fetchAPI<BoardDelta>(`/api/posts/board/${id}/reject`, {
+    method: 'POST',
+  });
+}
+
+/**
+ * Применить BoardDelta к доске без повторной загрузки.
+ */
+export function applyBoardDelta(board: Board, delta: BoardDelta): Board {
+  return {
+    columns: board.columns.map((column) => {
+      const change = delta.count_changes[column.status] ?? 0;
+      let items = column.items.filter((post) => post.id !== delta.post.id);
+      if (column.status === delta.to_status) {
+        items = [delta.post, ...items];
+      }
+      return { ...column, items, total: column.total + change };
+    }),
+  };
+}
+
 // ═══════════════════════════════════════════════════
 // METRICS API
 // ═══════════════════════════════════════════════════
@@ -100,6 +154,39 @@ export async function getHealthMetrics(): Promise<HealthMetrics> {
   return fetchAPI<HealthMetrics>('/api/metrics/health');
 }
 
+export async function getPlatformAnalytics(days = 30): Promise<PlatformAnalyticsResponse> {
+  return fetchAPI<PlatformAnalyticsResponse>(`/api/posts/stats/platforms?days=${days}`);
+}
+
+// ═══════════════════════════════════════════════════
+// IMAGES API
+// ═══════════════════════════════════════════════════
+
+const LOCAL_IMAGE_PREFIX = '/api/images/';
+
+export async function generateImage(topic: string, postId?: number): Promise<GenerateImageResponse> {
+  return fetchAPI<GenerateImageResponse>('/api/images/generate', {
+    method: 'POST',
+    body: JSON.stringify({ topic, post_id: postId ?? null }),
+  });
+}
+
+/**
+ * URL картинки поста. Для картинок из локального хранилища можно
+ * запросить WebP-вариант ширины width (320 или 640); внешние URL
+ * возвращаются как есть.
+ */
+export function imageUrl(url: string, width?: number): string {
+  if (!url.startsWith(LOCAL_IMAGE_PREFIX)) {
+    return url;
+  }
+  return width ? `${API_BASE}${url}/w${width}.webp` : `${API_BASE}${url}`;
+}
+
+export function isLocalImage(url: string): boolean {
+  return url.startsWith(LOCAL_IMAGE_PREFIX);
+}
+
 // ═══════════════════════════════════════════════════
 // SWR FETCHERS
 // ═══════════════════════════════════════════════════
@@ -20,6 +20,7 @@ export interface Post {
   image_prompt: string | null;
   ai_prompt: string | null;
   ai_model: string | null;
+  prompt_version: string | null;
   scheduled_at: string | null;
   published_at: string | null;
   created_at: string;
@@ -33,6 +34,23 @@ export interface PostList {
   offset: number;
 }
 
+export interface BoardColumn {
+  status: PostStatus;
+  total: number;
+  items: Post[];
+}
+
+export interface Board {
+  columns: BoardColumn[];
+}
+
+export interface BoardDelta {
+  post: Post;
+  from_status: PostStatus;
+  to_status: PostStatus;
+  count_changes: Partial<Record<PostStatus, number>>;
+}
+
 export interface PostCreate {
   title: string;
   content?: string;
@@ -62,6 +80,41 @@ export interface HealthMetrics {
   posts_by_platform: Record<PostPlatform, number>;
 }
 
+export interface PlatformDailyPoint {
+  day: string;
+  created: number;
+  published: number;
+}
+
+export interface PlatformAnalytics {
+  platform: PostPlatform;
+  posts_total: number;
+  by_status: Partial<Record<PostStatus, number>>;
+  published_total: number;
+  last_published_at: string | null;
+  cadence_days: number | null;
+  approval_rate: number | null;
+  feedback_total: number;
+  daily: PlatformDailyPoint[];
+}
+
+export interface PlatformAnalyticsResponse {
+  days: number;
+  platforms: PlatformAnalytics[];
+}
+
+// ═══════════════════════════════════════════════════
+// IMAGE TYPES
+// ═══════════════════════════════════════════════════
+
+export interface GenerateImageResponse {
+  image_url: string;
+  prompt: string;
+  content_hash: string | null;
+  thumbnails: Record<number, string>;  // ширина -> URL WebP
+  cached: boolean;
+}
+
 // ═══════════════════════════════════════════════════
 // UI TYPES
 // ═══════════════════════════════════════════════════